@@ -0,0 +1,84 @@
+"""
+Compares a full decode of an upload with the reduced-scale JPEG decode of the image loader.
+
+Usage (from the backend folder):
+    python -m benchmarks.decode_benchmark                  # synthetic 12 MP and 40 MP photos
+    python -m benchmarks.decode_benchmark photo1.jpg [photo2.png ...]
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from PIL import Image, ImageOps
+
+from src.config import config
+from src.IdMaker.image_loader import load_image
+
+SYNTHETIC_SIZES = ((4000, 3000), (7296, 5472))
+
+
+def synthetic_photo(path: str, size, image_format: str):
+    """Smooth gradient with noise, saved like a phone photo."""
+    width, height = size
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([xx / width, yy / height, 0.5 + 0.5 * np.sin(xx / 97.0)], axis=2) * 200
+    pixels = np.clip(base + rng.normal(0, 8, size=(height, width, 3)), 0, 255).astype(np.uint8)
+    Image.fromarray(pixels).save(path, image_format, quality=90)
+
+
+def full_decode(path: str) -> Image.Image:
+    image = ImageOps.exif_transpose(Image.open(path))
+    image.load()
+    return image
+
+
+def measure(fn, repeat: int):
+    """Result and best wall time of fn."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def pixel_memory(image: Image.Image) -> float:
+    """Size of the decoded pixel buffer in MB (the decoder's own buffers are not counted)."""
+    return image.width * image.height * len(image.getbands()) / 1024 / 1024
+
+
+def report(path: str, min_long_side: int, repeat: int):
+    full, full_time = measure(lambda: full_decode(path), repeat)
+    loaded, reduced_time = measure(lambda: load_image(path, min_long_side), repeat)
+    print(f"{os.path.basename(path)} ({full.size[0]}x{full.size[1]}, {Image.open(path).format})")
+    print(f"  full decode:    {full_time * 1000:8.1f} ms, pixels {pixel_memory(full):6.1f} MB")
+    print(f"  loader decode:  {reduced_time * 1000:8.1f} ms, pixels {pixel_memory(loaded.image):6.1f} MB "
+          f"-> {loaded.image.size[0]}x{loaded.image.size[1]} ({full_time / reduced_time:.1f}x faster)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Photos to decode (defaults to synthetic JPEG and PNG photos)")
+    parser.add_argument("--long-side", type=int, default=config.DETECTION_MAX_SIZE,
+                        help="Minimum long side requested from the loader")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.images:
+        for path in args.images:
+            report(path, args.long_side, args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="idmaker-decode-") as folder:
+        for size in SYNTHETIC_SIZES:
+            for image_format, extension in (("JPEG", "jpg"), ("PNG", "png")):
+                path = os.path.join(folder, f"synthetic_{size[0]}x{size[1]}.{extension}")
+                synthetic_photo(path, size, image_format)
+                report(path, args.long_side, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Throughput of the image processing pipeline with the thread and the process executor backends.
+
+Usage (from the backend folder):
+    python -m benchmarks.executor_benchmark photo1.jpg [photo2.jpg ...] --tasks 16 --workers 4
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import wait
+
+from src.config import config
+from src.services.image_service import ImageProcessingService, EXECUTOR_THREAD, EXECUTOR_PROCESS
+from src.services.task_service import task_service
+
+
+def run(backend: str, images: list, tasks: int, workers: int) -> float:
+    """Runs `tasks` uploads through a fresh service and returns the throughput in tasks per second."""
+    service = ImageProcessingService(backend=backend, max_workers=workers)
+    service.start()
+    try:
+        # Wait until the workers have loaded their models
+        warmup_session = f"bench-{uuid.uuid4()}"
+        warmup_task = task_service.create_task(warmup_session, os.path.basename(images[0]), "passport")
+        service.process_image_async(warmup_task, images[0], config.DOCUMENT_TYPES["passport"]).result()
+
+        session_id = f"bench-{uuid.uuid4()}"
+        futures = []
+        start = time.perf_counter()
+        for i in range(tasks):
+            image = images[i % len(images)]
+            task = task_service.create_task(session_id, os.path.basename(image), "passport")
+            futures.append(service.process_image_async(task, image, config.DOCUMENT_TYPES["passport"]))
+        wait(futures)
+        elapsed = time.perf_counter() - start
+    finally:
+        service.shutdown()
+
+    stats = [task_service.get_task(t.id) for t in task_service.get_session_tasks(session_id)]
+    failed = sum(1 for task in stats if task.status.value == "failed")
+    print(f"{backend:7s}: {tasks} tasks in {elapsed:6.2f} s -> {tasks / elapsed:5.2f} tasks/s ({failed} failed)")
+    return tasks / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="+", help="Portrait photos used as uploads")
+    parser.add_argument("--tasks", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=config.MAX_WORKERS)
+    args = parser.parse_args()
+
+    # Outputs go to a throw-away data folder
+    data_folder = tempfile.mkdtemp(prefix="idmaker-bench-")
+    config.DATA_FOLDER = data_folder
+    try:
+        uploads = []
+        for image in args.images:
+            upload = os.path.join(data_folder, os.path.basename(image))
+            shutil.copy(image, upload)
+            uploads.append(upload)
+
+        thread = run(EXECUTOR_THREAD, uploads, args.tasks, args.workers)
+        process = run(EXECUTOR_PROCESS, uploads, args.tasks, args.workers)
+        print(f"process / thread speedup: {process / thread:.2f}x")
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Compares full-frame alpha matting (rembg/PyMatting) with band matting.
+
+Usage (from the backend folder):
+    python -m benchmarks.matting_benchmark                 # synthetic portrait with known alpha
+    python -m benchmarks.matting_benchmark --image a.jpg   # real photo, mask from rembg (U2Net)
+"""
+import argparse
+import time
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+from rembg.bg import alpha_matting_cutout
+
+from src.IdMaker.matting import band_matting_cutout, build_trimap
+
+FOREGROUND_THRESHOLD = 250
+BACKGROUND_THRESHOLD = 5
+ERODE_SIZE = 5
+
+
+def synthetic_portrait(width: int, height: int, seed: int = 0):
+    """Textured head-and-shoulders silhouette with a soft (hair-like) edge, its ground truth alpha and foreground."""
+    rng = np.random.default_rng(seed)
+    silhouette = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(silhouette)
+    draw.ellipse((width * 0.28, height * 0.12, width * 0.72, height * 0.62), fill=255)
+    draw.ellipse((width * 0.02, height * 0.68, width * 0.98, height * 1.4), fill=255)
+    alpha = np.asarray(silhouette.filter(ImageFilter.GaussianBlur(6)), dtype=np.float64) / 255.0
+
+    yy, xx = np.mgrid[0:height, 0:width]
+    background = np.stack([
+        0.55 + 0.25 * np.sin(xx / 37.0),
+        0.60 + 0.20 * np.cos(yy / 53.0),
+        0.70 + 0.10 * np.sin((xx + yy) / 71.0),
+    ], axis=2)
+    foreground = np.stack([
+        0.35 + 0.15 * np.sin(yy / 11.0),
+        0.22 + 0.10 * np.cos(xx / 13.0),
+        0.15 + 0.05 * np.sin((xx - yy) / 7.0),
+    ], axis=2)
+    noise = rng.normal(0, 0.02, size=(height, width, 3))
+    composite = np.clip(alpha[..., None] * foreground + (1 - alpha[..., None]) * background + noise, 0, 1)
+
+    image = Image.fromarray((composite * 255).astype(np.uint8))
+    # Simulated segmentation mask: hard edge, slightly misplaced, like a U2Net output
+    mask = Image.fromarray(((alpha > 0.45) * 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(2))
+    return image, mask, alpha, foreground
+
+
+def u2net_mask(image: Image.Image) -> Image.Image:
+    from rembg import new_session, remove
+    return remove(image, session=new_session("u2net"), only_mask=True)
+
+
+def timed(fn, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Photo to benchmark (defaults to a synthetic portrait)")
+    parser.add_argument("--width", type=int, default=768)
+    parser.add_argument("--height", type=int, default=1004)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    truth = None
+    if args.image:
+        image = Image.open(args.image).convert("RGB")
+        mask = u2net_mask(image)
+    else:
+        image, mask, truth, truth_foreground = synthetic_portrait(args.width, args.height)
+
+    # Warm up the numba JIT of PyMatting so that compilation is not measured
+    warm_image, warm_mask, _, _ = synthetic_portrait(64, 64)
+    alpha_matting_cutout(warm_image, warm_mask, FOREGROUND_THRESHOLD, BACKGROUND_THRESHOLD, ERODE_SIZE)
+    band_matting_cutout(warm_image, warm_mask, FOREGROUND_THRESHOLD, BACKGROUND_THRESHOLD, ERODE_SIZE)
+
+    full, full_time = timed(lambda: alpha_matting_cutout(
+        image, mask, FOREGROUND_THRESHOLD, BACKGROUND_THRESHOLD, ERODE_SIZE), args.repeat)
+    band, band_time = timed(lambda: band_matting_cutout(
+        image, mask, FOREGROUND_THRESHOLD, BACKGROUND_THRESHOLD, ERODE_SIZE), args.repeat)
+
+    trimap = build_trimap(np.asarray(mask.convert("L")), FOREGROUND_THRESHOLD, BACKGROUND_THRESHOLD, ERODE_SIZE)
+    in_band = trimap == 128
+    full_alpha = np.asarray(full)[..., 3] / 255.0
+    band_alpha = np.asarray(band.cutout)[..., 3] / 255.0
+
+    print(f"image: {image.size[0]}x{image.size[1]}, band: {band.band_pixels} px "
+          f"({100.0 * band.band_pixels / in_band.size:.1f}%)")
+    print(f"full-frame matting: {full_time * 1000:8.1f} ms")
+    print(f"band matting:       {band_time * 1000:8.1f} ms  ({full_time / band_time:.1f}x faster)")
+    print(f"band vs full alpha, mean abs diff in band: {np.abs(band_alpha - full_alpha)[in_band].mean():.4f}")
+    if truth is not None:
+        # Edge quality of the final output: composite on white against the ground truth composite
+        truth_white = truth[..., None] * truth_foreground + (1 - truth[..., None])
+        for name, cutout in (("full", np.asarray(full)), ("band", np.asarray(band.cutout))):
+            rgba = cutout / 255.0
+            white = rgba[..., 3:] * rgba[..., :3] + (1 - rgba[..., 3:])
+            sad = np.abs(rgba[..., 3] - truth)
+            composite_error = np.abs(white - truth_white).mean(axis=2)
+            print(f"{name:4s} vs ground truth: alpha SAD {sad.sum():9.1f}, "
+                  f"alpha MSE in band {(sad[in_band] ** 2).mean():.5f}, "
+                  f"white composite MAE in band {composite_error[in_band].mean():.4f}")
+
+
+if __name__ == "__main__":
+    main()
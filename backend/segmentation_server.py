@@ -0,0 +1,4 @@
+from src.services.segmentation_server import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import cv2
+import logging
+import os
+import threading
+import numpy as np
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from . import variable
+
+logger = logging.getLogger(__name__)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+prototxt_path = os.path.join(script_dir, "deploy.prototxt.txt")
+model_path = os.path.join(script_dir, "res10_300x300_ssd_iter_140000.caffemodel")
+
+_net = None
+_net_loaded = False
+_net_lock = threading.Lock()
+# cv2.dnn.Net is not safe to share between threads during forward()
+_forward_lock = threading.Lock()
+
+
+@dataclass
+class FaceDetection:
+    # (startX, startY, endX, endY) of the most confident face big enough for a crop
+    box: Optional[Tuple[int, int, int, int]]
+    confidence: float
+    index: int
+
+    @property
+    def is_usable(self) -> bool:
+        return self.box is not None and self.confidence >= variable.confidence_level
+
+
+def get_face_detector():
+    """Loads the SSD face detector once per process. Returns None if the model files are missing."""
+    global _net, _net_loaded
+    if _net_loaded:
+        return _net
+
+    with _net_lock:
+        if not _net_loaded:
+            if os.path.exists(prototxt_path) and os.path.exists(model_path):
+                _net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+                logger.info("SSD face detector loaded")
+            else:
+                logger.warning(f"SSD face detector model not found ({model_path}), face pre-filter disabled")
+            _net_loaded = True
+    return _net
+
+
+def detect_best_face(image: np.ndarray, net=None, scale: float = 1.0) -> FaceDetection:
+    """
+    Finds the face with highest confidence whose box is at least min_face_res_x x min_face_res_y.
+    image is a BGR array as returned by cv2.imread. For a downscaled copy of the upload, scale is
+    the original / copy size ratio and the box is returned in the coordinates of the original.
+    """
+    net = net or get_face_detector()
+    blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+    with _forward_lock:
+        net.setInput(blob)
+        detections = net.forward()
+
+    highest_confidence = 0
+    best_detection = None
+    best_detection_index = -1
+
+    for i in range(detections.shape[2]):
+        confidence = detections[0, 0, i, 2]
+        if confidence > highest_confidence:
+            box = detections[0, 0, i, 3:7] * np.array([image.shape[1], image.shape[0], image.shape[1], image.shape[0]]) * scale
+            (startX, startY, endX, endY) = box.astype(int)
+            width = endX - startX
+            height = endY - startY
+            if width >= variable.min_face_res_x and height >= variable.min_face_res_y:
+                highest_confidence = confidence
+                best_detection = (startX, startY, endX, endY)
+                best_detection_index = i
+
+    return FaceDetection(box=best_detection, confidence=float(highest_confidence), index=best_detection_index)
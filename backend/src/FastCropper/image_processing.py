@@ -4,6 +4,7 @@ from tqdm import tqdm
 from datetime import datetime
 import numpy as np
 from . import variable
+from .face_detector import get_face_detector, detect_best_face
 
 """
 DEPRECATED - Use id_maker.py instead
@@ -40,10 +41,7 @@ def process_image(image_path,
             "extension": "Bez zmian"
         }
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    prototxt_path = os.path.join(script_dir, "deploy.prototxt.txt")
-    model_path = os.path.join(script_dir, "res10_300x300_ssd_iter_140000.caffemodel")
-    net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+    net = get_face_detector()
     
     is_error = False
     original_filename, original_extension = os.path.splitext(os.path.basename(image_path))
@@ -60,27 +58,11 @@ def process_image(image_path,
         error_count += 1
         return error_count
     
-    blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
-    net.setInput(blob)
-    detections = net.forward()
-
     # Find face with highest confidence
-    highest_confidence = 0
-    best_detection = None
-    best_detection_index = -1
-
-    # First pass - find the face with highest confidence
-    for i in range(detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        if confidence > highest_confidence:
-            box = detections[0, 0, i, 3:7] * np.array([image.shape[1], image.shape[0], image.shape[1], image.shape[0]])
-            (startX, startY, endX, endY) = box.astype(int)
-            width = endX - startX
-            height = endY - startY
-            if width >= variable.min_face_res_x and height >= variable.min_face_res_y:
-                highest_confidence = confidence
-                best_detection = (startX, startY, endX, endY)
-                best_detection_index = i
+    detection = detect_best_face(image, net)
+    highest_confidence = detection.confidence
+    best_detection = detection.box
+    best_detection_index = detection.index
 
 
     # Process the best detection
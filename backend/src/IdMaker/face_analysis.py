@@ -0,0 +1,276 @@
+import logging
+import math
+import numpy
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from PIL import Image
+from majormode.photoidmagick import (
+    BiometricPassportPhoto,
+    FaceFeature,
+    NoFaceDetectedException
+)
+from ..config import config
+from ..FastCropper.face_detector import FaceDetection, get_face_detector, detect_best_face
+from .image_loader import load_image
+
+
+logger = logging.getLogger(__name__)
+
+# The photo classes below override private (name-mangled) methods of photoidmagick. Fail at import
+# if an upgrade renames them - the overrides would be silently ignored and detection would run again.
+for _hook in ("_BiometricPassportPhoto__detect_face_features", "_BiometricPassportPhoto__assert_front_full_face"):
+    if not hasattr(BiometricPassportPhoto, _hook):
+        raise ImportError(f"photoidmagick.BiometricPassportPhoto has no {_hook}; face_analysis requires photoidmagick 1.1.11")
+
+
+class _PrecomputedFacePhoto(BiometricPassportPhoto):
+    """
+    BiometricPassportPhoto built from face landmarks that were already detected,
+    so the strict and the lenient variant of the same upload share one detection pass.
+    Overrides the name-mangled detection hook of photoidmagick (pinned to 1.1.11).
+    """
+    def __init__(self, image: Image.Image, face_features: dict, **options):
+        self._face_features = face_features
+        super().__init__(image, **options)
+
+    def _BiometricPassportPhoto__detect_face_features(self, image_array):
+        return self._face_features
+
+
+class _CropOnlyFacePhoto(_PrecomputedFacePhoto):
+    """
+    Photo used only to build the crop from landmarks that already passed the checks on the
+    detection proxy; the pose assertion is skipped so rounding of the remapped landmarks
+    cannot reject a photo that was accepted.
+    """
+    @classmethod
+    def _BiometricPassportPhoto__assert_front_full_face(cls, face_features, **options):
+        pass
+
+
+@dataclass
+class FaceAnalysis:
+    """Result of a single face analysis pass over an uploaded image."""
+    image_path: Optional[str] = None
+    # Upload as decoded for the detection, possibly at a reduced JPEG scale
+    image: Optional[Image.Image] = None
+    # Full resolution / image size ratio
+    image_scale: float = 1.0
+    # Face landmarks in the coordinates of the full resolution image
+    face_features: Optional[dict] = None
+    # Photo object built on the detection proxy, None if the face could not be analysed at all
+    photo: Optional[BiometricPassportPhoto] = None
+    # Exception raised by the strict biometric checks, None if all checks passed
+    error: Optional[Exception] = None
+    # Result of the SSD pre-filter, None if it did not run
+    prefilter: Optional[FaceDetection] = None
+    # Full resolution / detection proxy size ratio
+    scale: float = 1.0
+
+    @property
+    def face_box(self) -> Optional[Tuple[int, int, int, int]]:
+        """Bounding box (left, top, right, bottom) of all detected landmarks."""
+        if not self.face_features:
+            return None
+        points = [point for feature in self.face_features.values() for point in feature]
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    @property
+    def passed(self) -> bool:
+        return self.photo is not None and self.error is None
+
+    def build_image(self, size: Tuple[int, int], horizontal_padding: float, vertical_padding: float) -> Image.Image:
+        """
+        Builds the cropped photo from the upload pixels. The upload is decoded again only if the
+        detection decode is too small for the requested size, and at the smallest JPEG scale that
+        still covers it. Only the region that can end up in the crop is cut out, so the rotation
+        in photoidmagick does not touch the whole upload.
+        """
+        if self.photo is None:
+            raise self.error
+        image, image_scale = self._image_for_crop(size)
+        features = _scale_features(self.face_features, 1 / image_scale)
+        left, top, right, bottom = _crop_region(
+            features, image.size, size, horizontal_padding, vertical_padding
+        )
+        region_features = {
+            feature: [(x - left, y - top) for x, y in points]
+            for feature, points in features.items()
+        }
+        photo = _CropOnlyFacePhoto(
+            image.crop((left, top, right, bottom)),
+            region_features,
+            forbid_abnormally_open_eyelid=False,
+            forbid_closed_eye=False,
+            forbid_oblique_face=False,
+            forbid_open_mouth=False,
+            forbid_unevenly_open_eye=False
+        )
+        return photo.build_image(
+            size=size,
+            horizontal_padding=horizontal_padding,
+            vertical_padding=vertical_padding
+        )
+
+    def _image_for_crop(self, size: Tuple[int, int]) -> Tuple[Image.Image, float]:
+        """Decoded upload with at least size[1] pixels across the crop frame, and its scale."""
+        frame_height = _min_frame_height(self.face_features)
+        full_long_side = max(self.image.size) * self.image_scale
+        # Long side for which the frame is at least as tall as the output
+        needed = math.ceil(full_long_side * size[1] / frame_height) if frame_height > 0 else math.inf
+        if max(self.image.size) >= needed or self.image_path is None:
+            return self.image, self.image_scale
+
+        loaded = load_image(self.image_path, needed if needed < full_long_side else None)
+        logger.debug(f"Decoded {self.image_path} again at {loaded.image.size} for the crop")
+        return loaded.image, loaded.scale
+
+
+def _min_frame_height(face_features: dict) -> float:
+    """
+    Lower bound of the crop frame height of BiometricPassportPhoto.build_image: the head spans
+    twice the distance from the ear line down to the chin tip, before padding.
+    """
+    chin = face_features[FaceFeature.chin]
+    (left_x, left_y), (right_x, right_y) = chin[0], chin[-1]
+    ear_length = math.hypot(right_x - left_x, right_y - left_y)
+    if ear_length == 0:
+        return 0
+    center_x, center_y = (left_x + right_x) / 2, (left_y + right_y) / 2
+    chin_tip_x, chin_tip_y = max(chin, key=lambda point: point[1])
+    # Distance of the chin tip from the ear line
+    depth = abs((right_x - left_x) * (chin_tip_y - center_y) - (right_y - left_y) * (chin_tip_x - center_x)) / ear_length
+    return 2 * depth
+
+
+def _crop_region(face_features: dict, image_size: Tuple[int, int], size: Tuple[int, int],
+                 horizontal_padding: float, vertical_padding: float) -> Tuple[int, int, int, int]:
+    """
+    Upper bound of the area of the image used by BiometricPassportPhoto.build_image.
+    The frame is built from the chin line rotated around the face center, so every point of it
+    lies within a radius derived from the farthest chin point; rotation keeps that radius.
+    """
+    chin = face_features[FaceFeature.chin]
+    center_x = round((chin[0][0] + chin[-1][0]) / 2)
+    center_y = round((chin[0][1] + chin[-1][1]) / 2)
+    reach = max(math.hypot(x - center_x, y - center_y) for x, y in chin) + 1
+
+    # Head: ear-to-ear width up to 2 * reach, top-to-chin height up to 4 * reach
+    frame_width = 2 * reach + 2 * round(4 * reach * horizontal_padding)
+    frame_height = 4 * reach + 2 * round(2 * reach * vertical_padding)
+    aspect_ratio = size[0] / size[1]
+    frame_width, frame_height = max(frame_width, frame_height * aspect_ratio), max(frame_height, frame_width / aspect_ratio)
+    radius = math.ceil(math.hypot(frame_width, frame_height)) + 2
+
+    # Even offsets keep round() of the shifted face center identical (banker's rounding)
+    width, height = image_size
+    left = max(0, center_x - radius)
+    top = max(0, center_y - radius)
+    return (
+        left - left % 2,
+        top - top % 2,
+        min(width, center_x + radius + 1),
+        min(height, center_y + radius + 1)
+    )
+
+
+def _scale_features(face_features: dict, scale: float) -> dict:
+    """Maps landmarks between the full resolution and a scaled copy of the upload."""
+    if scale == 1.0:
+        return face_features
+    return {
+        feature: [(round(x * scale), round(y * scale)) for x, y in points]
+        for feature, points in face_features.items()
+    }
+
+
+def detection_proxy(image: Image.Image) -> Tuple[Image.Image, float]:
+    """
+    Downscaled copy of the upload used for face detection and landmarking, bounded by
+    config.DETECTION_MAX_SIZE on the long side. Returns the proxy and the full / proxy size ratio.
+    """
+    max_size = config.DETECTION_MAX_SIZE
+    if not max_size or max(image.size) <= max_size:
+        return image, 1.0
+    scale = max(image.size) / max_size
+    proxy_size = (max(1, round(image.width / scale)), max(1, round(image.height / scale)))
+    proxy = image.resize(proxy_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return proxy, image.width / proxy_size[0]
+
+
+def prefilter_face(image: Image.Image, scale: float = 1.0) -> Optional[FaceDetection]:
+    """
+    Cheap SSD face detection run before the dlib landmarks. Returns None when the
+    pre-filter is disabled or its model is not available.
+    """
+    if not config.FACE_PREFILTER:
+        return None
+    net = get_face_detector()
+    if net is None:
+        return None
+    # SSD expects BGR like cv2.imread
+    bgr = numpy.asarray(image.convert("RGB"))[:, :, ::-1]
+    return detect_best_face(bgr, net, scale=scale)
+
+
+def analyze_face(image_path: str) -> FaceAnalysis:
+    """
+    Decodes the image and detects face landmarks once, then evaluates the strict
+    biometric checks and builds the lenient photo used for cropping from the same landmarks.
+    Detection runs on a downscaled proxy of large uploads; the landmarks are mapped back
+    to the full resolution image.
+    Uploads rejected by the SSD pre-filter skip the landmark detection.
+    Never raises - failures are stored in FaceAnalysis.error.
+    """
+    analysis = FaceAnalysis(image_path=image_path)
+    try:
+        # Large JPEGs are decoded directly at a reduced scale, no smaller than the detection proxy
+        loaded = load_image(image_path, config.DETECTION_MAX_SIZE)
+        analysis.image, analysis.image_scale = loaded.image, loaded.scale
+        proxy, proxy_scale = detection_proxy(analysis.image)
+        analysis.scale = analysis.image_scale * proxy_scale
+        analysis.prefilter = prefilter_face(proxy, analysis.scale)
+        if analysis.prefilter is not None and not analysis.prefilter.is_usable:
+            logger.info(f"No usable face found by the pre-filter in {image_path} "
+                        f"(confidence {analysis.prefilter.confidence:.2f})")
+            raise NoFaceDetectedException("No usable face has been detected in the photo")
+        proxy_features = BiometricPassportPhoto._BiometricPassportPhoto__detect_face_features(
+            numpy.array(proxy)
+        )
+        analysis.face_features = _scale_features(proxy_features, analysis.scale)
+    except Exception as e:
+        analysis.error = e
+        return analysis
+
+    try:
+        analysis.photo = _PrecomputedFacePhoto(
+            proxy,
+            proxy_features,
+            forbid_abnormally_open_eyelid=True,
+            forbid_closed_eye=True,
+            forbid_oblique_face=True,
+            forbid_open_mouth=True,
+            forbid_unevenly_open_eye=True
+        )
+        return analysis
+    except Exception as e:
+        analysis.error = e
+
+    # Strict checks failed - biometric validations are disabled for cropping
+    # to allow processing even with minor quality issues
+    try:
+        analysis.photo = _PrecomputedFacePhoto(
+            proxy,
+            proxy_features,
+            forbid_abnormally_open_eyelid=False,
+            forbid_closed_eye=False,
+            forbid_oblique_face=False,
+            forbid_open_mouth=False,
+            forbid_unevenly_open_eye=False
+        )
+    except Exception as e:
+        logger.warning(f"Face analysis failed for {image_path}: {e}")
+
+    return analysis
@@ -11,16 +11,21 @@ from majormode.photoidmagick import (
     AbnormalEyelidOpeningStateException,
     UnevenlyOpenEyelidException
 )
+from contextlib import contextmanager
 from typing import Dict, Any
 from PIL import Image
 from rembg import remove
 from ..utils.helpers import get_filename_from_path
+from ..utils.exceptions import TaskCancelledException
+from .face_analysis import FaceAnalysis, analyze_face
+from .matting import MATTING_FULL, MATTING_BAND, band_matting_cutout
+from .stage_timing import measure_stage
 
 
 logger = logging.getLogger(__name__)
 
 class id_maker:
-    def __init__(self,upload_path : str,error_folder : str,output_folder : str,params: Dict[str, Any]):
+    def __init__(self,upload_path : str,error_folder : str,output_folder : str,params: Dict[str, Any],session=None,cancel_token=None):
         self.upload_path = upload_path
         self.error_folder = error_folder
         self.output_folder = output_folder
@@ -29,45 +34,85 @@ class id_maker:
         self.params = params
         self.biometric_info = ""
         self.cropping_successful = False
+        self.analysis: FaceAnalysis = None
+        # Preloaded rembg session borrowed from the pool; rembg loads the model itself if None
+        self.session = session
+        # Image passed in memory between the stages, encoded once in save_image
+        self.processed_image: Image.Image = None
+        self.save_options: Dict[str, Any] = {}
+        # False when rembg / the segmentation server failed and the output kept its original background
+        self.background_removed = False
+        # Size of the uncertainty band solved by band matting (None for other matting modes)
+        self.matting_band_pixels = None
+        # Checked between the stages; a cancelled task stops before the next one starts
+        self.cancel_token = cancel_token
+        # Wall time, thread CPU time and peak RSS growth of every stage that ran
+        self.stage_timings: Dict[str, Dict[str, float]] = {}
 
     def process_image(self):
         """
         Main method to process the image through all steps: cropping, checking, background change, and DPI adjustment.
+        The image stays in memory between the steps and is written to disk only once at the end.
+        Raises TaskCancelledException at the first checkpoint after the task was cancelled.
         """
-        self.crop_image()
+        with self.stage("analyze"):
+            self.analyze()
+        with self.stage("crop"):
+            self.crop_image()
         
         # Only proceed with further processing if cropping was successful
         if self.cropping_successful:
-            self.check_image()
-            self.change_background()
-            self.change_dpi()
+            with self.stage("check"):
+                self.check_image()
+            with self.stage("background"):
+                self.change_background()
+            with self.stage("dpi"):
+                self.change_dpi()
+            with self.stage("save"):
+                self.save_image()
         else:
             # Still run check_image to get biometric info even if cropping failed
-            self.check_image()
+            with self.stage("check"):
+                self.check_image()
 
 
+    @contextmanager
+    def stage(self, name: str):
+        """Cancellation checkpoint followed by the timed stage (recorded in stage_timings)"""
+        self.checkpoint(name)
+        with measure_stage(self.stage_timings, name):
+            yield
+
+    def checkpoint(self, stage: str):
+        """Stops the pipeline before the given stage if the task was cancelled"""
+        if self.cancel_token is not None and self.cancel_token.is_cancelled():
+            logger.info(f"Processing of {self.image_name} cancelled before stage '{stage}'")
+            raise TaskCancelledException(f"Task cancelled before stage '{stage}'")
+
+    def analyze(self) -> FaceAnalysis:
+        """
+        Decodes the upload and detects the face once. The result is shared by crop_image and check_image.
+        """
+        if self.analysis is None:
+            self.analysis = analyze_face(self.upload_path)
+        return self.analysis
+
     def crop_image(self):
         """
-        Crops the image to the specified dimensions and saves it to the processed_image_path
+        Crops the image to the specified dimensions and keeps it in processed_image
         Biometric validations are disabled to allow processing even with minor quality issues.
         """
         try:
-            biometric_photo = BiometricPassportPhoto.from_file(
-                self.upload_path,
-                forbid_abnormally_open_eyelid=False,
-                forbid_closed_eye=False,
-                forbid_oblique_face=False,
-                forbid_open_mouth=False,
-                forbid_unevenly_open_eye=False
-            )
-            cropped_photo = biometric_photo.build_image(
+            analysis = self.analyze()
+            # Crop from the original pixels, landmarks come from the detection proxy
+            cropped_photo = analysis.build_image(
                 size=(self.params['res_x'], self.params['res_y']),
                 horizontal_padding=self.params['horizontal_padding'],
                 vertical_padding=self.params['vertical_padding']
             )
-            cropped_photo.save(self.processed_image_path)
+            self.processed_image = cropped_photo
             self.cropping_successful = True
-            logger.info(f"Image successfully cropped and saved to {self.processed_image_path}")
+            logger.info(f"Image successfully cropped to {cropped_photo.size}")
         except Exception as e:
             self.cropping_successful = False
             logger.error(f"Error processing image: {e}")
@@ -78,16 +123,12 @@ class id_maker:
         Check image for biometric compliance and log warnings for any issues.
         This function performs validation but doesn't stop processing.
         Sets self.biometric_info for frontend display.
+        Strict checks are evaluated against the landmarks from analyze, without re-detecting the face.
         """
         try:
-            biometric_photo = BiometricPassportPhoto.from_file(
-                self.upload_path,
-                forbid_abnormally_open_eyelid=True,
-                forbid_closed_eye=True,
-                forbid_oblique_face=True,
-                forbid_open_mouth=True,
-                forbid_unevenly_open_eye=True
-            )
+            analysis = self.analyze()
+            if analysis.error is not None:
+                raise analysis.error
             logger.info("Image passed all biometric validation checks")
             self.biometric_info = "Zdjęcie przeszło wszystkie kontrole biometryczne"
         except NoFaceDetectedException as e:
@@ -132,41 +173,72 @@ class id_maker:
 
     def change_background(self):
         """Change background to white using rembg"""
-        if not os.path.exists(self.processed_image_path):
-            logger.warning(f"Cannot change background: file {self.processed_image_path} does not exist")
+        if self.processed_image is None:
+            logger.warning(f"Cannot change background: no cropped image for {self.image_name}")
             return
             
         try:
-            processed_image = Image.open(self.processed_image_path)
+            processed_image = self.processed_image
 
-            # Change background to white with rembg force CPU
-            no_bg_image = remove(
-                processed_image,
-                providers=['CPUExecutionProvider'],
-                alpha_matting=True,
-                alpha_matting_foreground_threshold=250,
-                alpha_matting_background_threshold=5,
-                alpha_matting_erode_size=5
-            )
+            matting_mode = self.params.get('alpha_matting', MATTING_FULL)
+            if matting_mode == MATTING_BAND:
+                # Solve alpha only in the uncertainty band around the mask edge
+                mask = remove(
+                    processed_image,
+                    session=self.session,
+                    providers=['CPUExecutionProvider'],
+                    only_mask=True
+                )
+                result = band_matting_cutout(
+                    processed_image,
+                    mask,
+                    foreground_threshold=250,
+                    background_threshold=5,
+                    erode_structure_size=5
+                )
+                no_bg_image = result.cutout
+                self.matting_band_pixels = result.band_pixels
+                logger.info(f"Band matting solved {result.band_pixels} px for {self.image_name}")
+            else:
+                # Change background to white with rembg force CPU
+                no_bg_image = remove(
+                    processed_image,
+                    session=self.session,
+                    providers=['CPUExecutionProvider'],
+                    alpha_matting=matting_mode == MATTING_FULL,
+                    alpha_matting_foreground_threshold=250,
+                    alpha_matting_background_threshold=5,
+                    alpha_matting_erode_size=5
+                )
             # Change transparent background to white
             white_bg = Image.new("RGB", no_bg_image.size, (255, 255, 255))
             white_bg.paste(no_bg_image, mask=no_bg_image.split()[3] if len(no_bg_image.split()) > 3 else None)
 
-            # Save final image
-            white_bg.save(self.processed_image_path)
-            logger.info(f"Background changed to white and saved to {self.processed_image_path}")
+            self.processed_image = white_bg
+            self.background_removed = True
+            logger.info(f"Background changed to white for {self.image_name}")
         except Exception as e:
             logger.error(f"Error changing background: {e}")
 
     def change_dpi(self):
-        """Change the DPI of the processed image"""
-        if not os.path.exists(self.processed_image_path):
-            logger.warning(f"Cannot change DPI: file {self.processed_image_path} does not exist")
+        """Change the DPI of the processed image. The metadata is written by save_image."""
+        if self.processed_image is None:
+            logger.warning(f"Cannot change DPI: no cropped image for {self.image_name}")
+            return
+            
+        self.save_options['dpi'] = self.params['dpi']
+        self.processed_image.info['dpi'] = self.params['dpi']
+        logger.info(f"DPI set to {self.params['dpi']} for {self.image_name}")
+
+    def save_image(self):
+        """Encode the processed image and write it to processed_image_path (the only disk write of the pipeline)"""
+        if self.processed_image is None:
+            logger.warning(f"Cannot save image: no cropped image for {self.image_name}")
             return
             
         try:
-            with Image.open(self.processed_image_path) as img:
-                img.save(self.processed_image_path, dpi=self.params['dpi'])
-            logger.info(f"DPI changed to {self.params['dpi']} and saved to {self.processed_image_path}")
+            self.processed_image.save(self.processed_image_path, **self.save_options)
+            logger.info(f"Processed image saved to {self.processed_image_path}")
         except Exception as e:
-            logger.error(f"Error changing DPI: {e}")
\ No newline at end of file
+            self.cropping_successful = False
+            logger.error(f"Error saving processed image: {e}")
\ No newline at end of file
@@ -0,0 +1,50 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+# Formats whose decoder can scale in the DCT domain (1/2, 1/4, 1/8) through Image.draft
+DRAFT_FORMATS = ("JPEG", "MPO")
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+@dataclass
+class LoadedImage:
+    """Decoded upload with the EXIF orientation applied."""
+    image: Image.Image
+    # Size of the full resolution image after the EXIF orientation
+    full_size: Tuple[int, int]
+
+    @property
+    def scale(self) -> float:
+        """Full resolution / decoded size ratio (1.0 for a full decode)."""
+        return self.full_size[0] / self.image.width
+
+
+def load_image(image_path: str, min_long_side: Optional[int] = None) -> LoadedImage:
+    """
+    Decodes an upload and corrects its orientation like photoidmagick's
+    load_image_and_correct_orientation.
+    If min_long_side is given, JPEG files are decoded at the smallest DCT scale that keeps the
+    long side of the image at least min_long_side. Other formats (PNG, WebP) are decoded at full size.
+    """
+    image = Image.open(image_path)
+    width, height = image.size
+    orientation = image.getexif().get(0x0112, 1)
+    full_size = (height, width) if orientation in _TRANSPOSED_ORIENTATIONS else (width, height)
+
+    if min_long_side and image.format in DRAFT_FORMATS and max(width, height) > min_long_side:
+        ratio = min_long_side / max(width, height)
+        # draft picks the largest reduction that keeps the image at least as big as requested
+        image.draft(image.mode, (max(1, int(width * ratio + 0.5)), max(1, int(height * ratio + 0.5))))
+        if image.size != (width, height):
+            logger.debug(f"Decoding {image_path} at {image.size} instead of {(width, height)}")
+
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    return LoadedImage(image=image, full_size=full_size)
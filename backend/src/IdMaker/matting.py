@@ -0,0 +1,135 @@
+import logging
+import numpy as np
+import scipy.sparse
+from dataclasses import dataclass
+from PIL import Image
+from scipy.ndimage import binary_dilation, binary_erosion, distance_transform_edt
+from pymatting import cg, ichol
+
+
+logger = logging.getLogger(__name__)
+
+# Matting modes selectable per document type (config.DOCUMENT_TYPES[...]["alpha_matting"])
+MATTING_NONE = "none"
+MATTING_FULL = "full"
+MATTING_BAND = "band"
+
+# Same regularization as the closed-form matting of PyMatting used by rembg
+DEFAULT_EPSILON = 1e-7
+
+
+@dataclass
+class BandMattingResult:
+    cutout: Image.Image
+    # Number of pixels in the uncertainty band, the only pixels for which alpha is solved
+    band_pixels: int
+
+
+def build_trimap(mask: np.ndarray, foreground_threshold: int, background_threshold: int,
+                 erode_structure_size: int) -> np.ndarray:
+    """
+    Builds the trimap the same way rembg does for full-frame matting:
+    255 for sure foreground, 0 for sure background and 128 for the uncertainty band.
+    """
+    is_foreground = mask > foreground_threshold
+    is_background = mask < background_threshold
+
+    structure = None
+    if erode_structure_size > 0:
+        structure = np.ones((erode_structure_size, erode_structure_size), dtype=np.uint8)
+
+    is_foreground = binary_erosion(is_foreground, structure=structure)
+    is_background = binary_erosion(is_background, structure=structure, border_value=1)
+
+    trimap = np.full(mask.shape, dtype=np.uint8, fill_value=128)
+    trimap[is_foreground] = 255
+    trimap[is_background] = 0
+    return trimap
+
+
+def _band_laplacian(image: np.ndarray, band: np.ndarray, epsilon: float) -> scipy.sparse.csr_matrix:
+    """
+    Rows of the closed-form matting Laplacian (3x3 windows) for the band pixels, built only from
+    the windows that touch the band. PyMatting builds it for every pixel of the frame, which
+    dominates the cost when the band is small. Returns a (band pixels x all pixels) matrix.
+    """
+    height, width = band.shape
+    centers = binary_dilation(band, structure=np.ones((3, 3), dtype=bool))
+    centers[0, :] = centers[-1, :] = centers[:, 0] = centers[:, -1] = False
+    center_y, center_x = np.nonzero(centers)
+
+    offset_y, offset_x = np.mgrid[-1:2, -1:2]
+    window_y = center_y[:, None] + offset_y.ravel()[None, :]
+    window_x = center_x[:, None] + offset_x.ravel()[None, :]
+    window_area = window_y.shape[1]
+
+    colors = image[window_y, window_x]
+    centered = colors - colors.mean(axis=1, keepdims=True)
+    centered_t = centered.transpose(0, 2, 1)
+    covariance = (centered_t @ centered + epsilon * np.eye(3)) / window_area
+    inverse = np.linalg.inv(covariance)
+
+    values = np.eye(window_area) - (1 + (centered @ inverse) @ centered_t) / window_area
+
+    # Keep only the entries whose row is a band pixel
+    band_index = np.full(height * width, -1, dtype=np.int64)
+    band_index[np.flatnonzero(band)] = np.arange(int(band.sum()))
+    indices = window_y * width + window_x
+    rows = np.broadcast_to(band_index[indices][:, :, None], values.shape)
+    cols = np.broadcast_to(indices[:, None, :], values.shape)
+    in_band = rows >= 0
+
+    return scipy.sparse.csr_matrix(
+        (values[in_band], (rows[in_band], cols[in_band])),
+        shape=(int(band.sum()), height * width)
+    )
+
+
+def band_matting_cutout(img: Image.Image, mask: Image.Image, foreground_threshold: int,
+                        background_threshold: int, erode_structure_size: int,
+                        epsilon: float = DEFAULT_EPSILON) -> BandMattingResult:
+    """
+    Alpha matting restricted to the uncertainty band around the segmentation mask edge.
+    Alpha outside of the band is taken directly from the trimap. Inside the band it is solved
+    with closed-form matting (as in full-frame mode), and the foreground color is recovered by
+    removing the nearest sure-background color, so the cost follows the band size, not the frame size.
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    image = np.asarray(img) / 255.0
+    mask_array = np.asarray(mask.convert("L"))
+    trimap = build_trimap(mask_array, foreground_threshold, background_threshold, erode_structure_size)
+
+    band = trimap == 128
+    is_background = trimap == 0
+    known_alpha = (trimap == 255).astype(np.float64)
+    alpha = known_alpha.copy()
+    # Fallback if the band cannot be solved (e.g. no sure background in the crop)
+    alpha[band] = mask_array[band] / 255.0
+    foreground = image.copy()
+
+    band_pixels = int(band.sum())
+    if band_pixels and is_background.any():
+        unknown = np.flatnonzero(band)
+        try:
+            laplacian = _band_laplacian(image, band, epsilon)
+            laplacian_unknown = laplacian[:, unknown]
+            rhs = -laplacian.dot(known_alpha.ravel())
+            solved = cg(laplacian_unknown, rhs, M=ichol(laplacian_unknown))
+            alpha.ravel()[unknown] = np.clip(solved, 0, 1)
+        except Exception as e:
+            logger.warning(f"Band matting solver failed, using the mask as alpha: {e}")
+
+        # F = (I - (1 - alpha) * B) / alpha, with B taken from the nearest sure-background pixel
+        _, (nearest_y, nearest_x) = distance_transform_edt(~is_background, return_indices=True)
+        band_alpha = alpha[band][:, None]
+        background = image[nearest_y[band], nearest_x[band]]
+        foreground[band] = np.clip(
+            (image[band] - (1 - band_alpha) * background) / np.maximum(band_alpha, 1e-3), 0, 1
+        )
+
+    cutout = np.dstack([foreground, alpha])
+    cutout = np.clip(cutout * 255, 0, 255).astype(np.uint8)
+
+    return BandMattingResult(cutout=Image.fromarray(cutout), band_pixels=band_pixels)
@@ -0,0 +1,43 @@
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:
+    # Windows - no getrusage, peak RSS is not reported
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of the process so far (MB), None where getrusage is unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@contextmanager
+def measure_stage(timings: Dict[str, Dict[str, float]], stage: str):
+    """
+    Records wall time, CPU time of the calling thread and the growth of the process peak RSS
+    for the wrapped stage in timings[stage]. Peak RSS is process-wide, so with several worker
+    threads the delta is attributed to whichever stage raised the high-water mark.
+    """
+    rss_before = peak_rss_mb()
+    start_unix_nano = time.time_ns()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        rss_after = peak_rss_mb()
+        timings[stage] = {
+            "wall_seconds": round(time.perf_counter() - wall_start, 4),
+            "cpu_seconds": round(time.thread_time() - cpu_start, 4),
+            "rss_peak_delta_mb": round(rss_after - rss_before, 2) if rss_after is not None else None,
+            # Wall-clock start, so the stage can be placed on a trace timeline by another process
+            "start_unix_nano": start_unix_nano
+        }
@@ -1,4 +1,4 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, g
 from flask_cors import CORS
 import logging
 from logging.handlers import RotatingFileHandler
@@ -13,6 +13,8 @@ from .config import config
 from .routes import register_routes
 from .services.image_service import image_service
 from .services.task_service import task_service
+from .services.result_cache import result_cache
+from .services.tracing import tracer, new_trace_id, parse_trace_id, parse_traceparent, SPAN_KIND_SERVER
 from .utils.helpers import cleanup_filesystem
 
 
@@ -28,10 +30,12 @@ def create_app():
     
     # CORS - bardziej restrykcyjne w produkcji
     origins = os.getenv('CORS_ORIGIN')
+    # Nagłówki trace muszą być widoczne dla frontendu
+    trace_headers = ['X-Trace-Id', 'traceparent']
     if config.DEBUG:
-        CORS(app)
+        CORS(app, expose_headers=trace_headers)
     else:
-        CORS(app, origins=[origins])
+        CORS(app, origins=[origins], expose_headers=trace_headers)
 
     # Logging
     setup_logging(app)
@@ -39,12 +43,19 @@ def create_app():
     # Rejestracja routes
     register_routes(app)
     
+    # Tracing requestów
+    register_tracing(app)
+    
     # Error handlers
     register_error_handlers(app)
     
     # Background tasks
     start_background_tasks()
     
+    # Preload modeli
+    if config.PRELOAD_MODELS:
+        preload_models()
+    
     # Cleanup on exit
     atexit.register(cleanup_on_exit)
     
@@ -87,6 +98,39 @@ def setup_logging(app):
     app.logger.addHandler(stream_handler)
     app.logger.setLevel(logging.INFO)
 
+def register_tracing(app):
+    """
+    Span każdego requestu. Trace ID pochodzi z nagłówka traceparent/X-Trace-Id albo parametru
+    trace_id (np. link do pliku wynikowego), inaczej jest generowany; wraca w nagłówkach odpowiedzi.
+    """
+    
+    @app.before_request
+    def start_request_span():
+        trace_id, parent_id = parse_traceparent(request.headers.get('traceparent'))
+        trace_id = (trace_id or parse_trace_id(request.headers.get('X-Trace-Id'))
+                    or parse_trace_id(request.args.get('trace_id')) or new_trace_id())
+        g.trace_id = trace_id
+        g.request_span = None
+        if tracer.enabled:
+            route = request.url_rule.rule if request.url_rule is not None else request.path
+            g.request_span = tracer.start_span(
+                f"{request.method} {route}", trace_id, parent_id, SPAN_KIND_SERVER,
+                **{"http.method": request.method, "http.route": route}
+            )
+    
+    @app.after_request
+    def end_request_span(response):
+        trace_id = g.get('trace_id')
+        if trace_id is None:
+            return response
+        response.headers['X-Trace-Id'] = trace_id
+        span = g.get('request_span')
+        if span is not None:
+            response.headers['traceparent'] = f"00-{trace_id}-{span.span_id}-01"
+            span.set_attribute("http.status_code", response.status_code)
+            tracer.end_span(span, RuntimeError(response.status) if response.status_code >= 500 else None)
+        return response
+
 def register_error_handlers(app):
     """Rejestruje error handlers"""
     
@@ -122,6 +166,9 @@ def cleanup_old_files():
             cleanup_filesystem(config.UPLOAD_FOLDER, config.MAX_FILE_AGE_HOURS)
             cleanup_filesystem(config.OUTPUT_FOLDER, config.MAX_FILE_AGE_HOURS)
             cleanup_filesystem(config.ERROR_FOLDER, config.MAX_FILE_AGE_HOURS)
+            result_cache.expire(config.MAX_FILE_AGE_HOURS)
+            # Pliki cache procesów, których już nie ma (każdy proces ma własny folder)
+            cleanup_filesystem(config.cache_folder, config.MAX_FILE_AGE_HOURS)
 
             # Sleep for 1 hour
             time.sleep(3600)
@@ -130,6 +177,14 @@ def cleanup_old_files():
             logging.error(f"Error in cleanup task: {e}")
             time.sleep(300)  # Sleep 5 minutes on error
 
+def preload_models():
+    """Startuje workery i ładuje sesje rembg przy starcie, żeby taski nie płaciły za ładowanie modelu"""
+    try:
+        image_service.start()
+    except Exception as e:
+        # Sesje zostaną utworzone leniwie przy pierwszym tasku
+        logging.error(f"Failed to preload rembg sessions: {e}")
+
 def start_background_tasks():
     """Startuje background tasks"""
     cleanup_thread = threading.Thread(target=cleanup_old_files, daemon=True)
@@ -139,6 +194,7 @@ def cleanup_on_exit():
     """Cleanup na wyjściu z aplikacji"""
     try:
         image_service.shutdown()
+        task_service.close()
         logging.info("Application shutdown completed")
     except Exception as e:
         logging.error(f"Error during shutdown: {e}")
\ No newline at end of file
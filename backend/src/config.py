@@ -18,11 +18,83 @@ class Config:
     # Limity
     MAX_CONTENT_LENGTH: int = 25 * 1024 * 1024  # 25MB
     MAX_FILES_PER_SESSION: int = 10
+    # Upload wielu plików naraz (/api/batch/upload)
+    MAX_FILES_PER_BATCH: int = int(os.getenv('MAX_FILES_PER_BATCH', '50'))
+    MAX_BATCH_CONTENT_LENGTH: int = int(os.getenv('MAX_BATCH_CONTENT_LENGTH_MB', '250')) * 1024 * 1024
+    # Archiwa ZIP (/api/bulk)
+    MAX_FILES_PER_ARCHIVE: int = int(os.getenv('MAX_FILES_PER_ARCHIVE', '500'))
+    MAX_ARCHIVE_CONTENT_LENGTH: int = int(os.getenv('MAX_ARCHIVE_CONTENT_LENGTH_MB', '2048')) * 1024 * 1024
+    # Long-poll (?wait=) i SSE statusu tasków - górne limity czasu trzymania połączenia
+    STATUS_LONG_POLL_MAX_SECONDS: float = float(os.getenv('STATUS_LONG_POLL_MAX_SECONDS', '30'))
+    STATUS_STREAM_MAX_SECONDS: float = float(os.getenv('STATUS_STREAM_MAX_SECONDS', '300'))
+    STATUS_STREAM_KEEPALIVE_SECONDS: float = float(os.getenv('STATUS_STREAM_KEEPALIVE_SECONDS', '15'))
+    # Maksymalna liczba ID w jednym zapytaniu /api/status/bulk
+    STATUS_BULK_MAX_TASKS: int = int(os.getenv('STATUS_BULK_MAX_TASKS', '500'))
     SESSION_TIMEOUT_HOURS: int = 24
+    
+    # Magazyn tasków: "memory" (domyślnie), "sqlite" (trwały, wspólny dla procesów gunicorna)
+    # albo "redis" (wspólny dla wielu hostów)
+    TASK_STORE: str = os.getenv('TASK_STORE', 'memory')
+    # Pusty = Data/tasks.db
+    TASK_STORE_PATH: str = os.getenv('TASK_STORE_PATH', '')
+    # Zmiany pośrednie tasków (np. PROCESSING) w SQLite są grupowane: flush co TASK_STORE_FLUSH_MS
+    # albo po TASK_STORE_BATCH_SIZE zmianach; nowe taski i zakończenia są zapisywane od razu
+    TASK_STORE_FLUSH_MS: float = float(os.getenv('TASK_STORE_FLUSH_MS', '50'))
+    TASK_STORE_BATCH_SIZE: int = int(os.getenv('TASK_STORE_BATCH_SIZE', '200'))
+    # SQLite nie powiadamia o zmianach innych procesów - long-poll/SSE sprawdza bazę co TASK_STORE_POLL_MS
+    TASK_STORE_POLL_MS: float = float(os.getenv('TASK_STORE_POLL_MS', '250'))
     MAX_FILE_AGE_HOURS: int = 12
     
     # Threading
     MAX_WORKERS: int = int(os.getenv('MAX_WORKERS', '4'))
+    # "thread", "process" (osobne procesy z załadowanymi modelami, bez GIL)
+    # albo "redis" (wspólna kolejka jobów w Redis, pliki w DATA_FOLDER muszą być wspólne dla hostów)
+    EXECUTOR_BACKEND: str = os.getenv('EXECUTOR_BACKEND', 'thread')
+    PROCESS_START_METHOD: str = os.getenv('PROCESS_START_METHOD', 'spawn')
+    # Maksymalna liczba jobów czekających na workera - powyżej upload dostaje 503 z Retry-After (0 = bez limitu)
+    MAX_QUEUE_DEPTH: int = int(os.getenv('MAX_QUEUE_DEPTH', '100'))
+    # Początkowe oszacowanie czasu przetwarzania jednego zdjęcia (potem średnia krocząca)
+    SERVICE_TIME_INITIAL_SECONDS: float = float(os.getenv('SERVICE_TIME_INITIAL_SECONDS', '8'))
+    
+    # Models
+    REMBG_MODEL: str = os.getenv('REMBG_MODEL', 'u2net')
+    PRELOAD_MODELS: bool = os.getenv('PRELOAD_MODELS', 'true').lower() == 'true'
+    # Szybki detektor SSD (FastCropper) odrzucający zdjęcia bez twarzy przed dlib i rembg
+    FACE_PREFILTER: bool = os.getenv('FACE_PREFILTER', 'true').lower() == 'true'
+    # Dłuższy bok kopii zdjęcia, na której wykrywana jest twarz (0 = pełna rozdzielczość)
+    DETECTION_MAX_SIZE: int = int(os.getenv('DETECTION_MAX_SIZE', 1600))
+    
+    # Wspólny serwer segmentacji (pusty = każdy worker ma własną sesję rembg)
+    SEGMENTATION_SOCKET: str = os.getenv('SEGMENTATION_SOCKET', '')
+    SEGMENTATION_BATCH_WINDOW_MS: float = float(os.getenv('SEGMENTATION_BATCH_WINDOW_MS', '5'))
+    SEGMENTATION_MAX_BATCH: int = int(os.getenv('SEGMENTATION_MAX_BATCH', '8'))
+    
+    # Redis (TASK_STORE=redis, EXECUTOR_BACKEND=redis)
+    REDIS_URL: str = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_PREFIX: str = os.getenv('REDIS_PREFIX', 'idmaker:')
+    # Procesy API tylko kolejkują joby; przetwarzają je osobne workery (python worker.py, wymagają TASK_STORE=redis).
+    # true = wątki workera także w procesie API (jedna maszyna, bez osobnego procesu)
+    EMBEDDED_QUEUE_WORKER: bool = os.getenv('EMBEDDED_QUEUE_WORKER', 'false').lower() == 'true'
+    # Worker bez heartbeatu dłużej niż tyle sekund jest martwy - jego joby wracają do kolejki
+    WORKER_HEARTBEAT_TIMEOUT: float = float(os.getenv('WORKER_HEARTBEAT_TIMEOUT', '30'))
+    
+    # Cache wyników (0 wpisów = wyłączony)
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '256'))
+    RESULT_CACHE_MAX_MB: int = int(os.getenv('RESULT_CACHE_MAX_MB', '200'))
+    
+    # Tracing: spany (format OTLP JSON, jedna linia na span) w TRACE_FILE, domyślnie DATA_FOLDER/traces.jsonl
+    TRACING_ENABLED: bool = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+    TRACE_FILE: str = os.getenv('TRACE_FILE', '')
+    TRACE_FILE_MAX_MB: int = int(os.getenv('TRACE_FILE_MAX_MB', '50'))
+    
+    # Endpointy administracyjne (/api/admin/*) wymagają nagłówka X-Admin-Token; pusty = wyłączone
+    ADMIN_TOKEN: str = os.getenv('ADMIN_TOKEN', '')
+    
+    # Profilowanie na żądanie: maksymalna liczba tasków na jedno włączenie, minimalny odstęp
+    # między profilowanymi taskami i interwał próbkowania stosu
+    PROFILE_MAX_TASKS: int = int(os.getenv('PROFILE_MAX_TASKS', '20'))
+    PROFILE_MIN_INTERVAL_SECONDS: float = float(os.getenv('PROFILE_MIN_INTERVAL_SECONDS', '5'))
+    PROFILE_SAMPLE_INTERVAL_MS: float = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
     
     # Rate limiting
     RATE_LIMIT_PER_MINUTE: int = int(os.getenv('RATE_LIMIT', '30'))
@@ -47,6 +119,9 @@ class Config:
             "horizontal_padding": 0.25,
             "vertical_padding": 0.25,
             "dpi": (600, 600),
+            # Tryb alpha mattingu: "full" (domyślny), "band" (tylko pas krawędzi maski - szybszy,
+            # włączany przez ALPHA_MATTING=band) lub "none"
+            "alpha_matting": os.getenv('ALPHA_MATTING', 'full'),
         },
         "id_card": {
             "res_x": 492,
@@ -57,6 +132,7 @@ class Config:
             "horizontal_padding": 0.25,
             "vertical_padding": 0.25,
             "dpi": (600, 600),
+            "alpha_matting": os.getenv('ALPHA_MATTING', 'full'),
         }
     })
     
@@ -77,5 +153,37 @@ class Config:
         path = os.path.join(self.DATA_FOLDER, 'errors')
         os.makedirs(path, exist_ok=True)
         return path
+    
+    @property
+    def task_store_path(self) -> str:
+        if self.TASK_STORE_PATH:
+            return self.TASK_STORE_PATH
+        os.makedirs(self.DATA_FOLDER, exist_ok=True)
+        return os.path.join(self.DATA_FOLDER, 'tasks.db')
+    
+    @property
+    def trace_file(self) -> str:
+        if self.TRACE_FILE:
+            return self.TRACE_FILE
+        os.makedirs(self.DATA_FOLDER, exist_ok=True)
+        return os.path.join(self.DATA_FOLDER, 'traces.jsonl')
+    
+    @property
+    def profiles_folder(self) -> str:
+        path = os.path.join(self.DATA_FOLDER, 'profiles')
+        os.makedirs(path, exist_ok=True)
+        return path
+    
+    @property
+    def cache_folder(self) -> str:
+        path = os.path.join(self.DATA_FOLDER, 'cache')
+        os.makedirs(path, exist_ok=True)
+        return path
+    
+    @property
+    def cancelled_folder(self) -> str:
+        path = os.path.join(self.DATA_FOLDER, 'cancelled')
+        os.makedirs(path, exist_ok=True)
+        return path
 
 config = Config()
\ No newline at end of file
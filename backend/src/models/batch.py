@@ -0,0 +1,90 @@
+import math
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from .task import Task, TaskStatus
+
+class Batch:
+    """Grupa tasków z jednego uploadu wielu plików"""
+
+    def __init__(self, session_id: str, document_type: str = "id_card"):
+        self.id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.document_type = document_type
+        self.task_ids: List[str] = []
+        # Pliki odrzucone przy walidacji: [{"filename": ..., "error": ...}]
+        self.rejected_files: List[Dict[str, str]] = []
+        self.created_at = datetime.now()
+
+    def to_dict(self, tasks: List[Task], workers: int = 1) -> Dict[str, Any]:
+        """Konwertuje batch do dict ze zbiorczym statusem jego tasków"""
+        counts = {status.value: 0 for status in TaskStatus}
+        for task in tasks:
+            counts[task.status.value] += 1
+
+        cancelled = counts[TaskStatus.CANCELLED.value]
+        done = counts[TaskStatus.COMPLETED.value] + counts[TaskStatus.FAILED.value] + cancelled
+        remaining = len(tasks) - done
+
+        if remaining == 0:
+            if tasks and cancelled == len(tasks):
+                status = "cancelled"
+            else:
+                status = "completed" if counts[TaskStatus.FAILED.value] + cancelled == 0 else "finished_with_errors"
+        elif done == 0 and counts[TaskStatus.PROCESSING.value] == 0:
+            status = "pending"
+        else:
+            status = "processing"
+
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "document_type": self.document_type,
+            "status": status,
+            "created_at": self.created_at.isoformat(),
+            "total": len(tasks),
+            "done": done,
+            "completed": counts[TaskStatus.COMPLETED.value],
+            "failed": counts[TaskStatus.FAILED.value],
+            "cancelled": cancelled,
+            "processing": counts[TaskStatus.PROCESSING.value],
+            "pending": counts[TaskStatus.PENDING.value],
+            "eta_seconds": self.estimate_remaining_time(tasks, remaining, workers),
+            "rejected_files": self.rejected_files
+        }
+
+    def to_record(self) -> Dict[str, Any]:
+        """Pola batcha do zapisu w magazynie tasków"""
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "document_type": self.document_type,
+            "task_ids": self.task_ids,
+            "rejected_files": self.rejected_files,
+            "created_at": self.created_at.isoformat()
+        }
+
+    @classmethod
+    def from_record(cls, data: Dict[str, Any]) -> "Batch":
+        """Odtwarza batch z to_record()"""
+        batch = cls(session_id=data["session_id"], document_type=data.get("document_type", "id_card"))
+        batch.id = data["id"]
+        batch.task_ids = list(data.get("task_ids", []))
+        batch.rejected_files = list(data.get("rejected_files", []))
+        batch.created_at = datetime.fromisoformat(data["created_at"])
+        return batch
+
+    @staticmethod
+    def estimate_remaining_time(tasks: List[Task], remaining: int, workers: int) -> Optional[float]:
+        """ETA ze średniego czasu przetwarzania zakończonych tasków batcha (None, dopóki żaden się nie zakończył)"""
+        if remaining == 0:
+            return 0.0
+        times = [task.processing_time for task in tasks if task.processing_time is not None]
+        if not times:
+            return None
+        average = sum(times) / len(times)
+        return round(average * math.ceil(remaining / max(workers, 1)), 1)
+
+    def __repr__(self):
+        return f"<Batch {self.id} - {len(self.task_ids)} tasks>"
@@ -8,13 +8,16 @@ class TaskStatus(Enum):
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 class Task:
-    def __init__(self, session_id: str, filename: str, document_type: str = "id_card"):
+    def __init__(self, session_id: str, filename: str, document_type: str = "id_card", batch_id: Optional[str] = None,
+                 trace_id: Optional[str] = None, trace_parent_id: Optional[str] = None):
         self.id = str(uuid.uuid4())
         self.session_id = session_id
         self.filename = filename
         self.document_type = document_type
+        self.batch_id = batch_id
         self.status = TaskStatus.PENDING
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
@@ -25,6 +28,19 @@ class Task:
         self.completed_at: Optional[datetime] = None
         self.biometric_warnings: Optional[list] = None
         self.biometric_errors: Optional[list] = None
+        # Zwiększana przy każdej zmianie - klienci long-poll/SSE czekają na inną wersję
+        self.version = 0
+        # Czas oczekiwania w kolejce (created_at -> started_at) i czasy etapów pipeline:
+        # etap -> {"wall_seconds", "cpu_seconds", "rss_peak_delta_mb"}
+        self.queue_wait: Optional[float] = None
+        self.stage_timings: Optional[Dict[str, Dict[str, float]]] = None
+        # Trace requestu, który utworzył task, i span tego requestu (rodzic spanów taska)
+        self.trace_id = trace_id
+        self.trace_parent_id = trace_parent_id
+    
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
     
     def update_status(self, status: TaskStatus, error_message: Optional[str] = None, 
                      biometric_warnings: Optional[list] = None, biometric_errors: Optional[list] = None):
@@ -32,6 +48,7 @@ class Task:
         old_status = self.status
         self.status = status
         self.updated_at = datetime.now()
+        self.version += 1
         
         if error_message:
             self.error_message = error_message
@@ -45,18 +62,23 @@ class Task:
         # Śledzenie czasów
         if status == TaskStatus.PROCESSING and old_status == TaskStatus.PENDING:
             self.started_at = datetime.now()
-        elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED] and self.started_at:
+            self.queue_wait = (self.started_at - self.created_at).total_seconds()
+        elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED] and self.started_at:
             self.completed_at = datetime.now()
             self.processing_time = (self.completed_at - self.started_at).total_seconds()
     
-    def to_dict(self) -> Dict[str, Any]:
-        """Konwertuje task do dict"""
-        return {
+    def to_dict(self, include_timings: bool = False) -> Dict[str, Any]:
+        """Konwertuje task do dict (z include_timings - z czasem w kolejce i czasami etapów)"""
+        data = {
             "id": self.id,
             "session_id": self.session_id,
             "filename": self.filename,
             "document_type": self.document_type,
+            "batch_id": self.batch_id,
+            "trace_id": self.trace_id,
+            "trace_parent_id": self.trace_parent_id,
             "status": self.status.value,
+            "version": self.version,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
             "started_at": self.started_at.isoformat() if self.started_at else None,
@@ -67,6 +89,40 @@ class Task:
             "biometric_warnings": self.biometric_warnings,
             "biometric_errors": self.biometric_errors
         }
+        if include_timings:
+            data["queue_wait"] = self.queue_wait
+            data["stage_timings"] = self.stage_timings
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Task":
+        """Odtwarza task z to_dict(include_timings=True) (np. z trwałego magazynu tasków)"""
+        task = cls(
+            session_id=data["session_id"],
+            filename=data["filename"],
+            document_type=data.get("document_type", "id_card"),
+            batch_id=data.get("batch_id"),
+            trace_id=data.get("trace_id"),
+            trace_parent_id=data.get("trace_parent_id")
+        )
+        task.id = data["id"]
+        task.status = TaskStatus(data["status"])
+        task.version = data.get("version", 0)
+        task.created_at = datetime.fromisoformat(data["created_at"])
+        task.updated_at = datetime.fromisoformat(data["updated_at"])
+        task.started_at = _parse_datetime(data.get("started_at"))
+        task.completed_at = _parse_datetime(data.get("completed_at"))
+        task.processing_time = data.get("processing_time")
+        task.result_file = data.get("result_file")
+        task.error_message = data.get("error_message")
+        task.biometric_warnings = data.get("biometric_warnings")
+        task.biometric_errors = data.get("biometric_errors")
+        task.queue_wait = data.get("queue_wait")
+        task.stage_timings = data.get("stage_timings")
+        return task
     
     def __repr__(self):
-        return f"<Task {self.id} - {self.status.value} - {self.filename}>"
\ No newline at end of file
+        return f"<Task {self.id} - {self.status.value} - {self.filename}>"
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
@@ -6,8 +6,16 @@ def register_routes(app):
     from .status import status_bp
     from .files import files_bp
     from .health import health_bp
+    from .batch import batch_bp
+    from .bulk import bulk_bp
+    from .cancel import cancel_bp
+    from .admin import admin_bp
     
     app.register_blueprint(upload_bp, url_prefix='/api')
     app.register_blueprint(status_bp, url_prefix='/api')
     app.register_blueprint(files_bp, url_prefix='/api')
-    app.register_blueprint(health_bp, url_prefix='/api')
\ No newline at end of file
+    app.register_blueprint(health_bp, url_prefix='/api')
+    app.register_blueprint(batch_bp, url_prefix='/api')
+    app.register_blueprint(bulk_bp, url_prefix='/api')
+    app.register_blueprint(cancel_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api')
\ No newline at end of file
@@ -0,0 +1,47 @@
+from flask import Blueprint, request, jsonify
+import logging
+
+from ..utils.decorators import rate_limit, log_request, handle_errors, require_admin
+from ..services.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/admin/profile', methods=['GET'])
+@rate_limit(max_requests=30, window_minutes=1)
+@log_request
+@handle_errors
+@require_admin
+def profile_status():
+    """Stan profilowania i lista zapisanych profili"""
+    return jsonify(profiler.get_status())
+
+@admin_bp.route('/admin/profile', methods=['POST'])
+@rate_limit(max_requests=5, window_minutes=1)
+@log_request
+@handle_errors
+@require_admin
+def enable_profiling():
+    """Włącza profilowanie kolejnych N tasków. Body JSON: {"tasks": N}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        tasks = int(data.get("tasks", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "tasks must be an integer"}), 400
+    if tasks < 1:
+        return jsonify({"error": "tasks must be at least 1"}), 400
+
+    enabled = profiler.enable(tasks)
+    logger.warning(f"Pipeline profiling enabled for {enabled} tasks")
+    return jsonify(profiler.get_status())
+
+@admin_bp.route('/admin/profile', methods=['DELETE'])
+@rate_limit(max_requests=30, window_minutes=1)
+@log_request
+@handle_errors
+@require_admin
+def disable_profiling():
+    """Wyłącza profilowanie (pozostałe taski nie będą profilowane)"""
+    profiler.disable()
+    return jsonify(profiler.get_status())
@@ -0,0 +1,138 @@
+from flask import Blueprint, request, jsonify, send_file
+import logging
+import os
+import tempfile
+import uuid
+import zipfile
+
+from ..config import config
+from ..utils.decorators import rate_limit, log_request, handle_errors, admission_control, queue_full_response
+from ..utils.validators import validate_document_type
+from ..services.file_service import file_service
+from ..services.image_service import image_service
+from ..services.task_service import task_service
+from ..services.tracing import current_trace
+from ..utils.exceptions import ValidationException
+from .status import serialize_task
+
+logger = logging.getLogger(__name__)
+
+batch_bp = Blueprint('batch', __name__)
+
+@batch_bp.route('/batch/upload', methods=['POST'])
+@rate_limit(max_requests=5, window_minutes=1)
+@log_request
+@handle_errors
+@admission_control
+def upload_batch():
+    """Upload wielu plików w jednym requeście - jeden batch, jeden task na plik"""
+    # Limit rozmiaru całego requestu jest większy niż dla pojedynczego pliku
+    request.max_content_length = config.MAX_BATCH_CONTENT_LENGTH
+
+    session_id = request.form.get("session_id")
+    if not session_id:
+        session_id = str(uuid.uuid4())
+
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({"error": "No selected files"}), 400
+    if len(files) > config.MAX_FILES_PER_BATCH:
+        return jsonify({"error": f"Za dużo plików. Maksymalnie: {config.MAX_FILES_PER_BATCH}"}), 400
+
+    document_type = request.form.get("document_type", "id_card")
+    if not validate_document_type(document_type):
+        return jsonify({"error": f"Nieznany typ dokumentu: {document_type}"}), 400
+    params = config.DOCUMENT_TYPES.get(document_type, {})
+
+    # Cały batch musi zmieścić się w kolejce - miejsce jest rezerwowane przed zapisem plików
+    retry_after = image_service.reserve(len(files))
+    if retry_after is not None:
+        return queue_full_response(retry_after)
+
+    try:
+        try:
+            saved_files, rejected_files = file_service.save_uploaded_files(
+                files,
+                session_id,
+                max_files_override=max(config.MAX_FILES_PER_SESSION, config.MAX_FILES_PER_BATCH)
+            )
+        except ValidationException as e:
+            logger.warning(f"Batch validation error: {str(e)}")
+            return jsonify({"error": str(e)}), 400
+
+        if not saved_files:
+            return jsonify({"error": "Żaden plik nie przeszedł walidacji", "rejected_files": rejected_files}), 400
+
+        trace_id, request_span_id = current_trace()
+        batch, tasks = task_service.create_batch(
+            session_id=session_id,
+            filenames=[file.filename for file, _ in saved_files],
+            document_type=document_type,
+            rejected_files=rejected_files,
+            trace_id=trace_id,
+            trace_parent_id=request_span_id
+        )
+
+        for task, (_, filepath) in zip(tasks, saved_files):
+            image_service.process_image_async(task, filepath, params)
+    finally:
+        image_service.release(len(files))
+
+    logger.info(f"Batch {batch.id} created with {len(tasks)} tasks ({len(rejected_files)} rejected)")
+
+    return jsonify({
+        "message": "Rozpoczęto przetwarzanie",
+        "batch_id": batch.id,
+        "session_id": session_id,
+        "task_ids": batch.task_ids,
+        "rejected_files": rejected_files
+    })
+
+@batch_bp.route('/batch/<batch_id>')
+@rate_limit(max_requests=120, window_minutes=1)
+@log_request
+@handle_errors
+def batch_status(batch_id):
+    """Zbiorczy status batcha i statusy jego tasków"""
+    status = task_service.get_batch_status(batch_id)
+    if status is None:
+        return jsonify({"error": "Invalid batch_id", "status": "error"}), 404
+
+    status["tasks"] = [serialize_task(task) for task in task_service.get_batch_tasks(batch_id)]
+    if status["completed"]:
+        status["download_url"] = f"/api/batch/{batch_id}/download"
+    return jsonify(status)
+
+@batch_bp.route('/batch/<batch_id>/download')
+@rate_limit(max_requests=30, window_minutes=1)
+@log_request
+@handle_errors
+def download_batch(batch_id):
+    """Wszystkie gotowe pliki wyjściowe batcha w jednym archiwum ZIP"""
+    batch = task_service.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Invalid batch_id"}), 404
+
+    _, output_folder, _ = file_service.get_user_folders(batch.session_id)
+    result_files = [
+        task.result_file for task in task_service.get_batch_tasks(batch_id)
+        if task.result_file and file_service.file_exists(batch.session_id, task.result_file, 'output')
+    ]
+    if not result_files:
+        return jsonify({"error": "Brak gotowych plików"}), 404
+
+    # Archiwum w pliku tymczasowym (JPEG/PNG są już skompresowane - bez ponownej kompresji)
+    archive = tempfile.TemporaryFile()
+    with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for filename in result_files:
+            zf.write(os.path.join(output_folder, filename), arcname=filename)
+    archive.seek(0)
+
+    logger.info(f"Serving {len(result_files)} files of batch {batch_id}")
+
+    return send_file(
+        archive,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f"batch_{batch_id}.zip"
+    )
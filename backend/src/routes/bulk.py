@@ -0,0 +1,197 @@
+from flask import Blueprint, Response, request, jsonify
+from concurrent.futures import as_completed
+import io
+import json
+import logging
+import os
+import uuid
+import zipfile
+from werkzeug.datastructures import FileStorage
+
+from ..config import config
+from ..utils.decorators import rate_limit, log_request, handle_errors, admission_control, queue_full_response
+from ..utils.validators import validate_document_type
+from ..utils.zip_stream import ZipStreamError, iter_zip_entries, entry_filename
+from ..services.file_service import file_service
+from ..services.image_service import image_service
+from ..services.task_service import task_service
+from ..services.tracing import current_trace
+from ..services.prometheus import prometheus_metrics
+from ..utils.exceptions import ValidationException
+
+logger = logging.getLogger(__name__)
+
+bulk_bp = Blueprint('bulk', __name__)
+
+REPORT_NAME = "report.json"
+QUEUE_FULL_ERROR = "Kolejka przetwarzania pełna - plik nie został przetworzony"
+
+class _ChunkWriter(io.RawIOBase):
+    """Strumień bez seek dla zipfile - zapisane bajty są oddawane do odpowiedzi HTTP"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+@bulk_bp.route('/bulk', methods=['POST'])
+@rate_limit(max_requests=5, window_minutes=1)
+@log_request
+@handle_errors
+@admission_control
+def bulk_process():
+    """
+    Przyjmuje archiwum ZIP w ciele requestu (Content-Type: application/zip) i zwraca
+    strumieniowo ZIP z wynikami oraz raportem report.json.
+    Wpisy trafiają do przetwarzania zaraz po odczytaniu, wyniki do odpowiedzi zaraz po zakończeniu.
+    Każdy wpis rezerwuje miejsce w kolejce; po jej zapełnieniu reszta archiwum jest tylko
+    wymieniana w raporcie jako odrzucona.
+    """
+    request.max_content_length = config.MAX_ARCHIVE_CONTENT_LENGTH
+
+    if request.mimetype not in ('application/zip', 'application/x-zip-compressed', 'application/octet-stream'):
+        return jsonify({"error": "Oczekiwano archiwum ZIP (Content-Type: application/zip)"}), 415
+
+    session_id = request.args.get("session_id") or str(uuid.uuid4())
+    document_type = request.args.get("document_type", "id_card")
+    if not validate_document_type(document_type):
+        return jsonify({"error": f"Nieznany typ dokumentu: {document_type}"}), 400
+    params = config.DOCUMENT_TYPES.get(document_type, {})
+
+    trace_id, request_span_id = current_trace()
+    batch, _ = task_service.create_batch(session_id=session_id, filenames=[], document_type=document_type,
+                                         trace_id=trace_id, trace_parent_id=request_span_id)
+    futures = {}
+    report = []
+    archive_error = None
+    # Po zapełnieniu kolejki kolejne wpisy nie są zapisywane ani kolejkowane - trafiają do raportu jako odrzucone
+    queue_full = False
+
+    try:
+        for entry in iter_zip_entries(request.stream, config.MAX_CONTENT_LENGTH, skip=lambda: queue_full):
+            filename = entry_filename(entry.name)
+            # Pliki systemowe (np. __MACOSX/._photo.jpg)
+            if not filename or filename.startswith('.') or entry.name.startswith('__MACOSX/'):
+                continue
+
+            if entry.skipped:
+                report.append(_rejected(entry.name, QUEUE_FULL_ERROR))
+                continue
+            if entry.error:
+                report.append(_rejected(entry.name, entry.error))
+                continue
+
+            retry_after = image_service.reserve(1)
+            if retry_after is not None:
+                queue_full = True
+                entry.file.close()
+                report.append(_rejected(entry.name, QUEUE_FULL_ERROR))
+                continue
+
+            try:
+                try:
+                    with entry.file:
+                        filepath = file_service.save_uploaded_file(
+                            FileStorage(stream=entry.file, filename=filename),
+                            session_id,
+                            max_files_override=config.MAX_FILES_PER_ARCHIVE
+                        )
+                except ValidationException as e:
+                    report.append(_rejected(entry.name, str(e)))
+                    continue
+
+                task = task_service.create_task(session_id, filename, document_type, batch_id=batch.id,
+                                                trace_id=trace_id, trace_parent_id=request_span_id)
+                futures[image_service.process_image_async(task, filepath, params)] = (entry.name, task.id)
+            finally:
+                image_service.release(1)
+    except ZipStreamError as e:
+        logger.warning(f"Bulk archive error: {str(e)}")
+        archive_error = str(e)
+
+    if not futures and archive_error:
+        return jsonify({"error": f"Niepoprawne archiwum ZIP: {archive_error}"}), 400
+
+    if not futures and queue_full:
+        return queue_full_response(retry_after)
+    if queue_full:
+        prometheus_metrics.admission_rejected.inc(route=request.url_rule.rule)
+    logger.info(f"Bulk batch {batch.id}: {len(futures)} files queued, {len(report)} rejected")
+
+    def generate():
+        writer = _ChunkWriter()
+        # Wyniki to już skompresowane JPEG/PNG - bez ponownej kompresji
+        with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for future in as_completed(futures):
+                entry_name, task_id = futures[future]
+                task = task_service.get_task(task_id)
+                item = _task_report(entry_name, task)
+                if task and task.result_file and file_service.file_exists(session_id, task.result_file, 'output'):
+                    _, output_folder, _ = file_service.get_user_folders(session_id)
+                    archive.write(os.path.join(output_folder, task.result_file), arcname=task.result_file)
+                    item["output"] = task.result_file
+                report.append(item)
+                yield writer.drain()
+
+            archive.writestr(REPORT_NAME, json.dumps({
+                "batch_id": batch.id,
+                "session_id": session_id,
+                "document_type": document_type,
+                "archive_error": archive_error,
+                "files": report
+            }, ensure_ascii=False, indent=2))
+        yield writer.drain()
+
+    def cancel_unfinished():
+        # Zamknięcie odpowiedzi przed zakończeniem wszystkich jobów = klient się rozłączył
+        unfinished = [task_service.get_task(task_id) for future, (_, task_id) in futures.items() if not future.done()]
+        unfinished = [task for task in unfinished if task is not None]
+        if unfinished:
+            logger.info(f"Bulk batch {batch.id}: client disconnected, cancelling {len(unfinished)} tasks")
+            image_service.cancel_tasks(unfinished)
+
+    response = Response(
+        generate(),
+        mimetype='application/zip',
+        headers={
+            "Content-Disposition": f"attachment; filename=results_{batch.id}.zip",
+            "X-Batch-Id": batch.id,
+            "X-Session-Id": session_id
+        }
+    )
+    response.call_on_close(cancel_unfinished)
+    return response
+
+def _rejected(entry_name: str, error: str) -> dict:
+    return {
+        "entry": entry_name,
+        "task_id": None,
+        "status": "rejected",
+        "output": None,
+        "error": error,
+        "biometric_warnings": None,
+        "biometric_errors": None
+    }
+
+def _task_report(entry_name: str, task) -> dict:
+    if task is None:
+        return _rejected(entry_name, "Task usunięty przed zakończeniem")
+    return {
+        "entry": entry_name,
+        "task_id": task.id,
+        "status": task.status.value,
+        "output": None,
+        "error": task.error_message,
+        "biometric_warnings": task.biometric_warnings,
+        "biometric_errors": task.biometric_errors
+    }
@@ -0,0 +1,36 @@
+from flask import Blueprint, jsonify
+import logging
+
+from ..utils.decorators import rate_limit, log_request, handle_errors
+from ..utils.validators import sanitize_filename
+from ..services.task_service import task_service
+from ..services.image_service import image_service
+
+logger = logging.getLogger(__name__)
+
+cancel_bp = Blueprint('cancel', __name__)
+
+@cancel_bp.route('/cancel/<task_id>', methods=['POST'])
+@rate_limit(max_requests=60, window_minutes=1)
+@log_request
+@handle_errors
+def cancel_task(task_id):
+    """Anuluje task: czekający job jest usuwany z kolejki, przetwarzany zatrzymuje się między etapami"""
+    task = task_service.get_task(task_id)
+    if not task:
+        return jsonify({"error": "Invalid task_id", "status": "error"}), 404
+
+    cancelled = image_service.cancel_tasks([task]) > 0
+    task = task_service.get_task(task_id) or task
+    return jsonify({"task_id": task_id, "cancelled": cancelled, "status": task.status.value})
+
+@cancel_bp.route('/cancel/session/<session_id>', methods=['POST'])
+@rate_limit(max_requests=30, window_minutes=1)
+@log_request
+@handle_errors
+def cancel_session(session_id):
+    """Anuluje wszystkie niezakończone taski sesji"""
+    session_id = sanitize_filename(session_id)
+    cancelled = image_service.cancel_session(session_id)
+    logger.info(f"Cancelled {cancelled} tasks of session {session_id}")
+    return jsonify({"session_id": session_id, "cancelled": cancelled})
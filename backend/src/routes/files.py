@@ -8,6 +8,7 @@ from ..utils.decorators import rate_limit, log_request, handle_errors
 from ..utils.helpers import clear_client_data
 from ..services.file_service import file_service
 from ..services.task_service import task_service
+from ..services.image_service import image_service
 from ..utils.validators import sanitize_filename
 
 logger = logging.getLogger(__name__)
@@ -61,6 +62,9 @@ def clear_data():
     if not session_id:
         return jsonify({"error": "No session_id provided"}), 400
 
+    # Najpierw zatrzymaj przetwarzanie - workery nie zajmują się już plikami usuwanej sesji
+    image_service.cancel_session(session_id)
+
     # Czyszczenie folderów uploads, output, errors
     user_upload_folder = os.path.join(config.UPLOAD_FOLDER, session_id)
     user_output_folder = os.path.join(config.OUTPUT_FOLDER, session_id)
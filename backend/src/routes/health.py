@@ -1,10 +1,14 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify
 import os
 import psutil
 from datetime import datetime
 
 from ..config import config
 from ..services.task_service import task_service
+from ..services.result_cache import result_cache
+from ..services.image_service import image_service
+from ..services.stage_metrics import stage_metrics
+from ..services.prometheus import prometheus_metrics, CONTENT_TYPE
 from ..utils.decorators import rate_limit, log_request, handle_errors
 
 health_bp = Blueprint('health', __name__)
@@ -24,7 +28,8 @@ def health_check():
             "checks": {
                 "folders": check_folders(),
                 "memory": check_memory(),
-                "tasks": check_tasks()
+                "tasks": check_tasks(),
+                "queue": check_queue()
             }
         }
         
@@ -51,16 +56,29 @@ def health_check():
 def metrics():
     """Endpoint z metrykami"""
     try:
+        task_stats = task_service.get_tasks_stats()
         return jsonify({
-            "active_tasks": len([t for t in task_service.tasks.values() if t.status.value == "processing"]),
-            "total_tasks": len(task_service.tasks),
+            "active_tasks": task_stats["processing"],
+            "total_tasks": task_stats["total"],
             "memory_usage": psutil.virtual_memory().percent,
             "disk_usage": psutil.disk_usage('/').percent,
-            "uptime": get_uptime()
+            "uptime": get_uptime(),
+            "result_cache": result_cache.get_stats(),
+            "job_queue": image_service.get_queue_stats(),
+            "cancellations": image_service.get_cancellation_stats(),
+            "processing_stages": stage_metrics.get_stats()
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@health_bp.route('/metrics/prometheus')
+@rate_limit(max_requests=60, window_minutes=1)
+@log_request
+@handle_errors
+def prometheus_metrics_endpoint():
+    """Metryki w formacie tekstowym Prometheus (histogramy i liczniki aktualizowane na bieżąco)"""
+    return Response(prometheus_metrics.render(), content_type=CONTENT_TYPE)
+
 def check_folders():
     """Sprawdza czy foldery są dostępne"""
     try:
@@ -87,13 +105,26 @@ def check_memory():
 def check_tasks():
     """Sprawdza status tasków"""
     try:
-        total_tasks = len(task_service.tasks)
-        processing_tasks = len([t for t in task_service.tasks.values() if t.status.value == "processing"])
+        task_stats = task_service.get_tasks_stats()
         
         return {
             "status": "ok",
-            "total": total_tasks,
-            "processing": processing_tasks
+            "total": task_stats["total"],
+            "processing": task_stats["processing"]
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def check_queue():
+    """Głębokość kolejki przetwarzania i szacowany czas oczekiwania (pełna kolejka nie oznacza awarii)"""
+    try:
+        stats = image_service.get_queue_stats()
+        return {
+            "status": "ok",
+            "depth": stats["depth"],
+            "max_depth": stats["max_depth"],
+            "full": stats["full"],
+            "estimated_wait_seconds": stats["estimated_wait_seconds"]
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
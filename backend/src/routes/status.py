@@ -1,5 +1,9 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from datetime import datetime
+import json
+import time
 
+from ..config import config
 from ..utils.decorators import rate_limit, log_request, handle_errors
 from ..services.task_service import task_service
 
@@ -10,50 +14,188 @@ status_bp = Blueprint('status', __name__)
 @log_request
 @handle_errors
 def check_status(task_id):
-    task = task_service.get_task(task_id)
+    """
+    Status taska. Z ?wait=<s>&version=<n> działa jako long-poll: odpowiedź wraca,
+    gdy wersja taska różni się od podanej (albo po wait sekundach). Z ?timings=1 zawiera
+    czas oczekiwania w kolejce i czasy etapów przetwarzania.
+    """
+    wait = _wait_seconds()
+    if wait:
+        task = task_service.wait_for_task_change(task_id, _version(), wait)
+    else:
+        task = task_service.get_task(task_id)
 
     if not task:
         return jsonify({"error": "Invalid task_id", "status": "error"}), 404
-    
-    response_data = task.to_dict()
-    # Add URL to the file if ready
-    if task.result_file:
-        response_data['cropped_file_url'] = f"/api/output/{task.session_id}/{task.result_file}"
-        response_data['status'] = "completed"  # Changed from "done" to match frontend expectation
-    elif task.status.value == "failed":
-        response_data['status'] = "failed"
-    else:
-        response_data['status'] = "processing"
 
-    return jsonify(response_data)
+    return jsonify(serialize_task(task, _include_timings()))
+
+@status_bp.route('/status/bulk', methods=['POST'])
+@rate_limit(max_requests=120, window_minutes=1)
+@log_request
+@handle_errors
+def bulk_status():
+    """
+    Statusy wielu tasków w jednym requeście. Body JSON:
+    {"task_ids": ["id", ...], "since": "<ISO>"} albo {"task_ids": {"id": "<ISO>" | null, ...}}.
+    Zwraca tylko taski, których updated_at jest późniejszy niż podany czas (bez czasu - wszystkie).
+    """
+    data = request.get_json(silent=True) or {}
+    task_ids = data.get("task_ids")
+
+    try:
+        if isinstance(task_ids, list):
+            since = _parse_timestamp(data.get("since"))
+            since_by_id = {str(task_id): since for task_id in task_ids}
+        elif isinstance(task_ids, dict):
+            since_by_id = {str(task_id): _parse_timestamp(value) for task_id, value in task_ids.items()}
+        else:
+            return jsonify({"error": "task_ids must be a list or an object"}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Invalid timestamp: {str(e)}"}), 400
+
+    if len(since_by_id) > config.STATUS_BULK_MAX_TASKS:
+        return jsonify({"error": f"Za dużo tasków. Maksymalnie: {config.STATUS_BULK_MAX_TASKS}"}), 400
+
+    # Czas serwera sprzed odczytu - klient podaje go jako "since" w kolejnym zapytaniu
+    server_time = datetime.now()
+    changed, missing = task_service.get_changed_tasks(since_by_id)
+
+    return jsonify({
+        "server_time": server_time.isoformat(),
+        "tasks": [serialize_task(task, _include_timings()) for task in changed],
+        "missing": missing
+    })
+
+@status_bp.route('/status/<task_id>/stream')
+@rate_limit(max_requests=60, window_minutes=1)
+@log_request
+@handle_errors
+def stream_status(task_id):
+    """SSE: zdarzenie 'status' przy każdej zmianie taska, strumień kończy się po completed/failed"""
+    if task_service.get_task(task_id) is None:
+        return jsonify({"error": "Invalid task_id", "status": "error"}), 404
+
+    def generate():
+        version = None
+        deadline = time.monotonic() + config.STATUS_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            task = task_service.wait_for_task_change(task_id, version, config.STATUS_STREAM_KEEPALIVE_SECONDS)
+            if task is None:
+                yield _sse_event("error", {"error": "Invalid task_id", "status": "error"})
+                return
+            if task.version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = task.version
+            yield _sse_event("status", serialize_task(task), version)
+            if task.is_finished:
+                return
+
+    return _sse_response(generate())
 
 @status_bp.route('/status/session/<session_id>')
 @rate_limit(max_requests=60, window_minutes=1)
 @log_request
 @handle_errors
 def get_session_tasks(session_id):
-    """Endpoint to fetch all tasks in a session"""
+    """Endpoint to fetch all tasks in a session (z ?wait=&version= jako long-poll zmian w sesji)"""
 
     try:
-        session_tasks = task_service.get_session_tasks(session_id)
-
-        tasks_data = []
-        for task in session_tasks:
-            task_data = task.to_dict()
-            if task.result_file:
-                task_data['cropped_file_url'] = f"/api/output/{task.session_id}/{task.result_file}"
-                task_data['status'] = "completed"
-            elif task.status.value == "failed":
-                task_data['status'] = "failed"
-            else:
-                task_data['status'] = "processing"
-            tasks_data.append(task_data)
-
-        return jsonify({
-            "session_id": session_id,
-            "total_tasks": len(tasks_data),
-            "tasks": tasks_data
-        })
+        wait = _wait_seconds()
+        version, session_tasks = task_service.wait_for_session_change(
+            session_id, _version() if wait else None, wait
+        )
+
+        return jsonify(_session_data(session_id, version, session_tasks, _include_timings()))
 
     except Exception as e:
-        return jsonify({"error": f"Failed to get session tasks: {str(e)}", "status": "error"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Failed to get session tasks: {str(e)}", "status": "error"}), 500
+
+@status_bp.route('/status/session/<session_id>/stream')
+@rate_limit(max_requests=30, window_minutes=1)
+@log_request
+@handle_errors
+def stream_session_tasks(session_id):
+    """SSE: pełna lista tasków sesji po każdej zmianie któregokolwiek z nich (przez STATUS_STREAM_MAX_SECONDS)"""
+
+    def generate():
+        version = None
+        deadline = time.monotonic() + config.STATUS_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            current, session_tasks = task_service.wait_for_session_change(
+                session_id, version, config.STATUS_STREAM_KEEPALIVE_SECONDS
+            )
+            if current == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = current
+            yield _sse_event("session", _session_data(session_id, version, session_tasks), version)
+
+    return _sse_response(generate())
+
+def serialize_task(task, include_timings: bool = False) -> dict:
+    """Task w formacie oczekiwanym przez frontend (status completed/failed/cancelled/processing i URL pliku)"""
+    task_data = task.to_dict(include_timings)
+    # Add URL to the file if ready
+    if task.result_file:
+        task_data['cropped_file_url'] = f"/api/output/{task.session_id}/{task.result_file}"
+        if task.trace_id:
+            # Pobranie pliku trafia do trace uploadu
+            task_data['cropped_file_url'] += f"?trace_id={task.trace_id}"
+        task_data['status'] = "completed"  # Changed from "done" to match frontend expectation
+    elif task.status.value == "failed":
+        task_data['status'] = "failed"
+    elif task.status.value == "cancelled":
+        task_data['status'] = "cancelled"
+    else:
+        task_data['status'] = "processing"
+    return task_data
+
+def _session_data(session_id: str, version: int, session_tasks, include_timings: bool = False) -> dict:
+    tasks_data = [serialize_task(task, include_timings) for task in session_tasks]
+    return {
+        "session_id": session_id,
+        "version": version,
+        "total_tasks": len(tasks_data),
+        "tasks": tasks_data
+    }
+
+def _include_timings() -> bool:
+    """?timings=1 - odpowiedź z czasami etapów przetwarzania"""
+    return request.args.get("timings", "").lower() in ("1", "true", "yes")
+
+def _parse_timestamp(value):
+    """Czas ISO 8601 jako lokalny datetime bez strefy (jak Task.updated_at); None bez zmian"""
+    if value is None:
+        return None
+    timestamp = datetime.fromisoformat(str(value))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+def _wait_seconds() -> float:
+    """Czas long-poll z ?wait= ograniczony do STATUS_LONG_POLL_MAX_SECONDS (0 - zwykłe zapytanie)"""
+    wait = request.args.get("wait", type=float) or 0.0
+    return max(0.0, min(wait, config.STATUS_LONG_POLL_MAX_SECONDS))
+
+def _version():
+    return request.args.get("version", type=int)
+
+def _sse_event(event: str, data: dict, event_id: int = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+def _sse_response(generator) -> Response:
+    return Response(
+        stream_with_context(generator),
+        mimetype='text/event-stream',
+        headers={
+            "Cache-Control": "no-cache",
+            # Nginx nie może buforować strumienia zdarzeń
+            "X-Accel-Buffering": "no"
+        }
+    )
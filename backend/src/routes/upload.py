@@ -3,10 +3,11 @@ import uuid
 import logging
 
 from ..config import config
-from ..utils.decorators import rate_limit, log_request, handle_errors
+from ..utils.decorators import rate_limit, log_request, handle_errors, admission_control
 from ..services.file_service import file_service
 from ..services.image_service import image_service
 from ..services.task_service import task_service
+from ..services.tracing import tracer, current_trace
 from ..utils.exceptions import ValidationException
 
 logger = logging.getLogger(__name__)
@@ -17,14 +18,21 @@ upload_bp = Blueprint('upload', __name__)
 @rate_limit(max_requests=10, window_minutes=1)
 @log_request
 @handle_errors
+@admission_control
 def upload_file():
+    trace_id, request_span_id = current_trace()
+
+    # Parsowanie multipart następuje przy pierwszym dostępie do request.form/files
+    with tracer.span("parse_upload", trace_id, request_span_id):
+        session_id = request.form.get("session_id")
+        has_file = 'file' in request.files
+
     # Pobierz lub wygeneruj session_id
-    session_id = request.form.get("session_id")
     if not session_id:
         session_id = str(uuid.uuid4())
     
     # Sprawdź czy plik został przesłany
-    if 'file' not in request.files:
+    if not has_file:
         return jsonify({"error": "No file part"}), 400
     
     file = request.files['file']
@@ -33,7 +41,8 @@ def upload_file():
     
     try: 
         # Zapisz plik
-        filepath = file_service.save_uploaded_file(file, session_id)
+        with tracer.span("save_uploaded_file", trace_id, request_span_id, **{"file.name": file.filename}):
+            filepath = file_service.save_uploaded_file(file, session_id)
         logger.info(f"File saved: {filepath}")
         
         # Pobierz typ dokumentu
@@ -56,7 +65,9 @@ def upload_file():
         task = task_service.create_task(
             session_id=session_id, 
             filename=file.filename, 
-            document_type=document_type
+            document_type=document_type,
+            trace_id=trace_id,
+            trace_parent_id=request_span_id
         )
         
         # Rozpocznij przetwarzanie
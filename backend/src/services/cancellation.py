@@ -0,0 +1,79 @@
+import logging
+import os
+import threading
+from typing import Set
+
+from ..config import config
+from ..services.redis_client import get_redis_client, redis_key
+
+logger = logging.getLogger(__name__)
+
+# Znacznik anulowania w Redis wygasa sam - job mógł zginąć razem z workerem
+REDIS_MARKER_TTL_SECONDS = 24 * 3600
+
+class CancellationRegistry:
+    """
+    Zbiór anulowanych tasków widoczny tam, gdzie task jest przetwarzany: w pamięci (backend thread),
+    jako pliki-znaczniki w DATA_FOLDER (backend process - procesy workerów) albo w Redis (kolejka Redis).
+    Pipeline sprawdza go między etapami, więc odczyt musi być tani.
+    """
+
+    def __init__(self, backend: str = None):
+        self.backend = backend or config.EXECUTOR_BACKEND
+        self.cancelled: Set[str] = set()
+        self.lock = threading.Lock()
+
+    def cancel(self, task_id: str):
+        if self.backend == "redis":
+            get_redis_client().set(redis_key("cancelled", task_id), 1, ex=REDIS_MARKER_TTL_SECONDS)
+        elif self.backend == "process":
+            open(self._marker(task_id), 'w').close()
+        else:
+            with self.lock:
+                self.cancelled.add(task_id)
+
+    def is_cancelled(self, task_id: str) -> bool:
+        try:
+            if self.backend == "redis":
+                return bool(get_redis_client().exists(redis_key("cancelled", task_id)))
+            if self.backend == "process":
+                return os.path.exists(self._marker(task_id))
+        except Exception as e:
+            # Niedostępny magazyn znaczników nie przerywa przetwarzania
+            logger.error(f"Cancellation check failed for task {task_id}: {e}")
+            return False
+        return task_id in self.cancelled
+
+    def clear(self, task_id: str):
+        """Usuwa znacznik po zakończeniu (lub porzuceniu) joba"""
+        try:
+            if self.backend == "redis":
+                get_redis_client().delete(redis_key("cancelled", task_id))
+            elif self.backend == "process":
+                os.remove(self._marker(task_id))
+            else:
+                with self.lock:
+                    self.cancelled.discard(task_id)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to clear cancellation of task {task_id}: {e}")
+
+    def token(self, task_id: str) -> "CancellationToken":
+        return CancellationToken(self, task_id)
+
+    def _marker(self, task_id: str) -> str:
+        return os.path.join(config.cancelled_folder, task_id)
+
+class CancellationToken:
+    """Token przekazywany do id_maker - sprawdzany w punktach kontrolnych między etapami"""
+
+    def __init__(self, registry: CancellationRegistry, task_id: str):
+        self.registry = registry
+        self.task_id = task_id
+
+    def is_cancelled(self) -> bool:
+        return self.registry.is_cancelled(self.task_id)
+
+# Singleton instance
+cancellation = CancellationRegistry()
@@ -2,7 +2,8 @@ import os
 import shutil
 import glob
 import time
-from typing import Optional
+import uuid
+from typing import Optional, List, Tuple, Dict
 from werkzeug.datastructures import FileStorage
 
 from ..config import config
@@ -35,12 +36,43 @@ class FileService:
         
         # Sprawdź limit plików na sesję
         upload_folder, _, _ = self.get_user_folders(session_id)
+        self._check_files_limit(upload_folder, 1, max_files_override)
+        
+        return self._store_file(file, upload_folder)
+    
+    def save_uploaded_files(self, files: List[FileStorage], session_id: str,
+                            max_files_override: Optional[int] = None) -> Tuple[List[Tuple[FileStorage, str]], List[Dict[str, str]]]:
+        """
+        Waliduje wszystkie pliki w jednym przebiegu i zapisuje poprawne.
+        Zwraca listę (plik, ścieżka) zapisanych plików i listę odrzuconych z powodem.
+        Limit plików na sesję sprawdzany jest raz dla całej paczki.
+        """
+        valid_files = []
+        rejected_files = []
+        for file in files:
+            is_valid, error_msg = validate_file(file)
+            if is_valid:
+                valid_files.append(file)
+            else:
+                rejected_files.append({"filename": file.filename or "", "error": error_msg})
+        
+        upload_folder, _, _ = self.get_user_folders(session_id)
+        if valid_files:
+            self._check_files_limit(upload_folder, len(valid_files), max_files_override)
+        
+        saved_files = [(file, self._store_file(file, upload_folder)) for file in valid_files]
+        return saved_files, rejected_files
+    
+    def _check_files_limit(self, upload_folder: str, incoming: int, max_files_override: Optional[int] = None):
+        """Rzuca ValidationException, jeśli nowe pliki przekroczą limit plików na sesję"""
         existing_files = len(os.listdir(upload_folder))
         
         max_files = max_files_override or config.MAX_FILES_PER_SESSION
-        if existing_files >= max_files:
+        if existing_files + incoming > max_files:
             raise ValidationException(f"Przekroczony limit plików na sesję ({max_files})")
-        
+    
+    def _store_file(self, file: FileStorage, upload_folder: str) -> str:
+        """Zapisuje plik pod sanityzowaną, unikalną nazwą"""
         # Sanityzuj nazwę pliku
         safe_filename = sanitize_filename(file.filename)
         
@@ -51,6 +83,10 @@ class FileService:
             timestamp = int(time.time())
             safe_filename = f"{name}_{timestamp}{ext}"
             filepath = os.path.join(upload_folder, safe_filename)
+            # Kilka plików o tej samej nazwie w jednej sekundzie (np. w jednym batchu)
+            if os.path.exists(filepath):
+                safe_filename = f"{name}_{timestamp}_{uuid.uuid4().hex[:6]}{ext}"
+                filepath = os.path.join(upload_folder, safe_filename)
         
         # Zapisz plik
         file.save(filepath)
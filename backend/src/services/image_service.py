@@ -1,118 +1,611 @@
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Any
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 
-from ..IdMaker.id_maker import id_maker
 from ..config import config
 from ..models.task import Task, TaskStatus
 from ..services.task_service import task_service
 from ..services.file_service import file_service
-from ..utils.exceptions import ImageProcessingException
+from ..services.session_pool import session_pool
+from ..services.result_cache import result_cache
+from ..services import process_worker
+from ..services.job_queue import Job, RedisJobQueue
+from ..services.scheduler import FairScheduler, ScheduledJob, LANE_BULK, LANE_INTERACTIVE
+from ..services.cancellation import cancellation
+from ..services.stage_metrics import stage_metrics
+from ..services.prometheus import prometheus_metrics
+from ..services.profiler import profiler
+from ..utils.exceptions import ImageProcessingException, TaskCancelledException
 
 logger = logging.getLogger(__name__)
 
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+EXECUTOR_REDIS = "redis"
+
+# Waga nowej próbki w średniej kroczącej czasu przetwarzania
+SERVICE_TIME_SMOOTHING = 0.2
+
 class ImageProcessingService:
-    def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=config.MAX_WORKERS)
-    
-    def process_image_async(self, task: Task, filepath: str, processing_params: Dict[str, Any]):
-        """Rozpoczyna asynchroniczne przetwarzanie obrazu"""
-        future = self.executor.submit(
-            self._process_image_task,
-            task.id,
-            task.session_id,
+    def __init__(self, backend: str = None, max_workers: int = None):
+        self.backend = backend or config.EXECUTOR_BACKEND
+        self.max_workers = max_workers or config.MAX_WORKERS
+        self.lock = threading.Lock()
+        self.status_queue = None
+        self.status_listener: Optional[threading.Thread] = None
+
+        # Kolejka Redis: joby trafiają do wspólnej kolejki, przetwarzają je workery (worker.py)
+        # albo - z EMBEDDED_QUEUE_WORKER - wątki w procesie API
+        self.job_queue: Optional[RedisJobQueue] = None
+        self.embedded_worker = None
+        # Future jobów z kolejki, kończone po zmianie statusu taska na completed/failed
+        self.queued_futures: Dict[str, Future] = {}
+
+        # Joby czekające na wolnego workera (round-robin sesji, linie priorytetów)
+        # i liczba jobów przekazanych do executora - nigdy więcej niż max_workers
+        self.scheduler = FairScheduler()
+        self.running_jobs = 0
+
+        # Anulowane taski: przed startem (queued), w trakcie (running), zatrzymane w punkcie kontrolnym
+        # tego procesu (interrupted) i szacowany odzyskany czas workerów
+        self.cancellations = {"queued": 0, "running": 0, "interrupted": 0, "reclaimed_seconds": 0.0}
+
+        # Kontrola przyjęć: joby wysłane i niezakończone, miejsca zarezerwowane przez requesty
+        # zapisujące jeszcze pliki oraz średnia krocząca czasu przetwarzania
+        self.in_flight = 0
+        self.reserved = 0
+        self.service_time = config.SERVICE_TIME_INITIAL_SECONDS
+        task_service.add_listener(self._on_task_change)
+
+        if self.backend in (EXECUTOR_PROCESS, EXECUTOR_REDIS):
+            # Pula procesów / konsumenci kolejki startowani leniwie (start() lub pierwszy task),
+            # żeby import nie startował procesów ani połączeń
+            self.executor = None
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+
+    def start(self):
+        """Startuje workery i ładuje modele"""
+        if self.backend == EXECUTOR_PROCESS:
+            executor = self._get_process_executor()
+            # Każdy job rozgrzewający startuje osobny proces (initializer ładuje modele)
+            for _ in range(self.max_workers):
+                executor.submit(process_worker.warmup)
+        elif self.backend == EXECUTOR_REDIS:
+            # Bez wbudowanego workera proces API tylko kolejkuje - nie ładuje modeli
+            if config.EMBEDDED_QUEUE_WORKER:
+                session_pool.preload()
+                self._start_embedded_worker()
+        else:
+            session_pool.preload()
+
+    def _get_job_queue(self) -> RedisJobQueue:
+        with self.lock:
+            if self.job_queue is None:
+                self.job_queue = RedisJobQueue()
+            return self.job_queue
+
+    def _start_embedded_worker(self):
+        """Worker kolejki w procesie API (EMBEDDED_QUEUE_WORKER) - jak worker.py, ale bez osobnego procesu"""
+        from ..services.queue_worker import QueueWorker
+        queue = self._get_job_queue()
+        with self.lock:
+            if self.embedded_worker is not None:
+                return
+            self.embedded_worker = QueueWorker(self.process_job, self.max_workers, queue)
+        self.embedded_worker.start()
+
+    def get_queue_stats(self) -> Dict[str, Any]:
+        """Głębokość kolejki, szacowany czas oczekiwania i (dla kolejki Redis) zarejestrowane workery"""
+        depth = self.queue_depth()
+        stats = {
+            "depth": depth,
+            "max_depth": config.MAX_QUEUE_DEPTH,
+            "full": 0 < config.MAX_QUEUE_DEPTH <= depth,
+            "service_time_seconds": round(self.service_time, 2),
+            "estimated_wait_seconds": self.estimated_wait(depth)
+        }
+        if self.backend == EXECUTOR_REDIS:
+            from ..services.queue_worker import list_workers
+            stats["workers"] = list_workers(self._get_job_queue().client)
+        else:
+            with self.lock:
+                stats["lanes"] = self.scheduler.get_stats()
+        return stats
+
+    def process_job(self, job: Job):
+        """Przetwarza job pobrany z kolejki Redis (pomija joby tasków już zakończonych lub usuniętych)"""
+        task = task_service.get_task(job.task_id)
+        if task is None or task.is_finished:
+            logger.info(f"Skipping job of finished or removed task {job.task_id}")
+            return
+        self._process_image_task(job.task_id, job.session_id, job.filepath, job.params, job.cache_key, job.profile)
+
+    def _get_process_executor(self) -> ProcessPoolExecutor:
+        """Zwraca pulę procesów, tworząc ją (ponownie) jeśli trzeba"""
+        with self.lock:
+            if self.executor is None:
+                context = multiprocessing.get_context(config.PROCESS_START_METHOD)
+                if self.status_queue is None:
+                    self.status_queue = context.Queue()
+                    self.status_listener = threading.Thread(target=self._listen_status_events, daemon=True)
+                    self.status_listener.start()
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=process_worker.init_worker,
+                    initargs=(self.status_queue, config.PRELOAD_MODELS)
+                )
+            return self.executor
+
+    def _listen_status_events(self):
+        """Przekazuje zdarzenia statusu z procesów workerów do task_service"""
+        while True:
+            try:
+                event = self.status_queue.get()
+                if event is None:
+                    break
+                task_id, status, _ = event
+                if status == TaskStatus.PROCESSING.value:
+                    # Task mógł się już zakończyć, jeśli callback wyprzedził zdarzenie
+                    task = task_service.get_task(task_id)
+                    if task and task.status == TaskStatus.PENDING:
+                        task_service.update_task_status(task_id, TaskStatus.PROCESSING)
+                        logger.info(f"Starting image processing for task {task_id}")
+            except (EOFError, OSError):
+                break
+            except Exception as e:
+                logger.error(f"Error handling worker status event: {e}")
+
+    def process_image_async(self, task: Task, filepath: str, processing_params: Dict[str, Any],
+                            lane: Optional[str] = None) -> Future:
+        """
+        Rozpoczyna asynchroniczne przetwarzanie obrazu. Domyślnie taski z batcha/archiwum
+        trafiają do linii bulk, pojedyncze uploady do interactive (obsługiwanej najpierw).
+        """
+        cache_key = None
+        if result_cache.enabled:
+            cache_key = result_cache.make_key(filepath, processing_params)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                return self._finish_from_cache(task, filepath, cached)
+
+        # Profilowanie na żądanie (wyłączone - jedno porównanie)
+        profile = profiler.claim()
+
+        if self.backend == EXECUTOR_REDIS:
+            return self._submit_to_queue(task, filepath, processing_params, cache_key, profile)
+
+        if self.backend == EXECUTOR_PROCESS:
+            submit = lambda: self._submit_to_process(task.id, task.session_id, filepath, processing_params,
+                                                     cache_key, profile)
+        else:
+            submit = lambda: self.executor.submit(
+                self._process_image_task,
+                task.id,
+                task.session_id,
+                filepath,
+                processing_params,
+                cache_key,
+                profile
+            )
+
+        job = ScheduledJob(
+            task_id=task.id,
+            session_id=task.session_id,
+            lane=lane or (LANE_BULK if task.batch_id else LANE_INTERACTIVE),
+            submit=submit
+        )
+        self._track(job.future)
+        with self.lock:
+            self.scheduler.push(job)
+        self._dispatch()
+        return job.future
+
+    def _dispatch(self):
+        """Przekazuje joby ze schedulera do executora, dopóki są wolne workery"""
+        while True:
+            with self.lock:
+                if self.running_jobs >= self.max_workers:
+                    return
+                job = self.scheduler.pop()
+                if job is None:
+                    return
+                self.running_jobs += 1
+
+            try:
+                inner = job.submit()
+            except Exception as e:
+                logger.error(f"Failed to submit job: {e}")
+                self._job_done(job, None, e)
+                continue
+            inner.add_done_callback(lambda done, job=job: self._job_done(job, done))
+
+    def _job_done(self, job: ScheduledJob, done: Optional[Future], error: Optional[BaseException] = None):
+        """Zwalnia workera, przekazuje wynik do Future wywołującego i wysyła kolejny job"""
+        with self.lock:
+            self.running_jobs -= 1
+        if done is not None:
+            error = done.exception()
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(done.result())
+        self._dispatch()
+
+    def cancel_tasks(self, tasks: List[Task]) -> int:
+        """
+        Anuluje niezakończone taski: joby czekające w schedulerze są usuwane, przetwarzane
+        zatrzymują się w najbliższym punkcie kontrolnym id_maker, a joby z kolejki Redis
+        są pomijane przez worker. Zwraca liczbę anulowanych tasków.
+        """
+        task_ids = {task.id for task in tasks if not task.is_finished}
+        if not task_ids:
+            return 0
+        for task_id in task_ids:
+            cancellation.cancel(task_id)
+
+        with self.lock:
+            dropped = self.scheduler.remove(task_ids)
+        for job in dropped:
+            # Job nie trafi do executora - znacznik nie będzie już sprawdzany
+            cancellation.clear(job.task_id)
+            job.future.cancel()
+
+        cancelled = 0
+        for task_id in task_ids:
+            previous_status = task_service.cancel_task(task_id)
+            if previous_status is None:
+                # Task zakończył się w międzyczasie
+                cancellation.clear(task_id)
+                continue
+            cancelled += 1
+            self._count_cancellation(task_service.get_task(task_id), previous_status)
+
+        logger.info(f"Cancelled {cancelled} tasks ({len(dropped)} dropped from the queue)")
+        return cancelled
+
+    def cancel_session(self, session_id: str) -> int:
+        """Anuluje wszystkie niezakończone taski sesji"""
+        return self.cancel_tasks(task_service.get_session_tasks(session_id))
+
+    def _count_cancellation(self, task: Optional[Task], previous_status: TaskStatus):
+        """Odzyskany czas: pełny czas przetwarzania dla jobu czekającego, reszta średniego czasu dla trwającego"""
+        with self.lock:
+            if previous_status == TaskStatus.PROCESSING:
+                self.cancellations["running"] += 1
+                elapsed = (datetime.now() - task.started_at).total_seconds() if task and task.started_at else 0.0
+                self.cancellations["reclaimed_seconds"] += max(0.0, self.service_time - elapsed)
+            else:
+                self.cancellations["queued"] += 1
+                self.cancellations["reclaimed_seconds"] += self.service_time
+
+    def get_cancellation_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.cancellations)
+        stats["reclaimed_seconds"] = round(stats["reclaimed_seconds"], 1)
+        return stats
+
+    def _track(self, future: Future) -> Future:
+        """Liczy job jako niezakończony do czasu zakończenia jego Future"""
+        with self.lock:
+            self.in_flight += 1
+        future.add_done_callback(self._untrack)
+        return future
+
+    def _untrack(self, _: Future):
+        with self.lock:
+            self.in_flight -= 1
+
+    def queue_depth(self) -> int:
+        """Joby czekające na wolnego workera"""
+        if self.backend == EXECUTOR_REDIS:
+            try:
+                return len(self._get_job_queue())
+            except Exception as e:
+                logger.error(f"Job queue unavailable: {e}")
+                return 0
+        with self.lock:
+            return max(0, self.in_flight - self.max_workers)
+
+    def _worker_count(self) -> int:
+        """Liczba jobów przetwarzanych równolegle (dla kolejki Redis - suma żywych workerów)"""
+        if self.backend == EXECUTOR_REDIS:
+            from ..services.queue_worker import list_workers
+            try:
+                workers = list_workers(self._get_job_queue().client)
+                return max(1, sum(worker["concurrency"] for worker in workers if worker["alive"]))
+            except Exception:
+                return self.max_workers
+        return self.max_workers
+
+    def estimated_wait(self, depth: Optional[int] = None) -> float:
+        """Szacowany czas oczekiwania nowego joba: głębokość kolejki × czas przetwarzania / liczba workerów"""
+        depth = self.queue_depth() if depth is None else depth
+        return round(depth * self.service_time / self._worker_count(), 1)
+
+    def admission_retry_after(self, count: int = 1) -> Optional[int]:
+        """None jeśli kolejka przyjmie count nowych jobów, w przeciwnym razie sekundy do ponowienia (Retry-After)"""
+        if config.MAX_QUEUE_DEPTH <= 0:
+            return None
+        depth = self.queue_depth()
+        with self.lock:
+            depth += self.reserved
+        if depth + count <= config.MAX_QUEUE_DEPTH:
+            return None
+        return max(1, math.ceil(self.estimated_wait(depth)))
+
+    def reserve(self, count: int) -> Optional[int]:
+        """
+        Rezerwuje w kolejce miejsce na count jobów przed zapisem plików (batch, archiwum).
+        None - zarezerwowano, w przeciwnym razie Retry-After. Rezerwację zwalnia release().
+        """
+        if config.MAX_QUEUE_DEPTH <= 0:
+            return None
+        depth = self.queue_depth()
+        with self.lock:
+            if depth + self.reserved + count <= config.MAX_QUEUE_DEPTH:
+                self.reserved += count
+                return None
+            depth += self.reserved
+        return max(1, math.ceil(self.estimated_wait(depth)))
+
+    def release(self, count: int):
+        """Zwalnia rezerwację (joby zostały wysłane i są już liczone w głębokości kolejki albo odrzucone)"""
+        if config.MAX_QUEUE_DEPTH <= 0:
+            return
+        with self.lock:
+            self.reserved = max(0, self.reserved - count)
+
+    def _finish_from_cache(self, task: Task, filepath: str, cached) -> Future:
+        """Kończy task od razu wynikiem z cache (ten sam plik i parametry były już przetwarzane)"""
+        _, output_folder, _ = file_service.get_user_folders(task.session_id)
+        output_filename = os.path.basename(filepath)
+        result = dict(cached.result)
+        # Czasy etapów dotyczą przetwarzania, z którego pochodzi wpis - nie tego taska
+        result.pop("stages", None)
+        if cached.output_path is not None:
+            if result_cache.materialize(cached, os.path.join(output_folder, output_filename)):
+                result["output_filename"] = output_filename
+
+        # Bez przejścia przez "processing" - trafienie w cache nie wlicza się do czasu przetwarzania
+        logger.info(f"Result cache hit for task {task.id}")
+        self._finish_task(task.id, task.session_id, result)
+
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def _submit_to_process(self, task_id: str, session_id: str, filepath: str, params: Dict[str, Any],
+                           cache_key: Optional[str] = None, profile: bool = False) -> Future:
+        """Wysyła task do puli procesów; wynik wraca do task_service w procesie rodzica"""
+        _, output_folder, error_folder = file_service.get_user_folders(session_id)
+        executor = self._get_process_executor()
+        future = executor.submit(
+            process_worker.process_in_worker,
+            task_id,
             filepath,
-            processing_params
+            output_folder,
+            error_folder,
+            params,
+            profile
         )
+
+        # Future zwracany wywołującemu kończy się dopiero po zapisaniu wyniku w task_service
+        task_future = Future()
+
+        def on_done(done: Future):
+            error = done.exception()
+            if error is None:
+                try:
+                    self._finish_task(task_id, session_id, done.result(), cache_key)
+                finally:
+                    cancellation.clear(task_id)
+                    task_future.set_result(done.result())
+                return
+
+            cancelled = isinstance(error, TaskCancelledException) or cancellation.is_cancelled(task_id)
+            cancellation.clear(task_id)
+            if cancelled:
+                # Status "cancelled" ustawił już cancel_tasks
+                if isinstance(error, TaskCancelledException):
+                    self._count_interrupted()
+                task_future.set_result(None)
+                return
+
+            logger.error(f"Image processing failed for task {task_id}: {error}")
+            task_service.update_task_status(task_id, TaskStatus.FAILED, error_message=str(error))
+            if isinstance(error, BrokenProcessPool):
+                # Proces workera padł - kolejne taski dostaną nową pulę
+                with self.lock:
+                    if self.executor is executor:
+                        self.executor = None
+            task_future.set_exception(error)
+
+        future.add_done_callback(on_done)
+        return task_future
+
+    def _submit_to_queue(self, task: Task, filepath: str, params: Dict[str, Any],
+                         cache_key: Optional[str] = None, profile: bool = False) -> Future:
+        """Wysyła job do kolejki Redis; Future kończy się, gdy task (przetwarzany gdziekolwiek) się zakończy"""
+        if config.EMBEDDED_QUEUE_WORKER:
+            self._start_embedded_worker()
+        future = Future()
+        with self.lock:
+            self.queued_futures[task.id] = future
+        self._get_job_queue().push(Job(
+            task_id=task.id,
+            session_id=task.session_id,
+            filepath=filepath,
+            params=params,
+            cache_key=cache_key,
+            profile=profile
+        ))
         return future
-    
-    def _process_image_task(self, task_id: str, session_id: str, filepath: str, params: Dict[str, Any]):
+
+    def _on_task_change(self, task_id: str, local: bool = True):
+        """
+        Po zakończeniu taska (także na innym węźle) aktualizuje średni czas przetwarzania
+        i statystyki etapów oraz kończy Future joba z kolejki Redis (również gdy task usunięto).
+        Metryki Prometheus zapisuje tylko proces, który zakończył task - suma po instancjach liczy go raz.
+        """
+        task = task_service.get_task(task_id)
+        if task is not None and not task.is_finished:
+            return
+
+        if task is not None and local:
+            prometheus_metrics.observe_finished_task(task, self._output_size(task))
+        if task is not None and task.status != TaskStatus.CANCELLED:
+            stage_metrics.record(task)
+        with self.lock:
+            if task is not None and task.processing_time is not None and task.status != TaskStatus.CANCELLED:
+                self.service_time += SERVICE_TIME_SMOOTHING * (task.processing_time - self.service_time)
+            future = self.queued_futures.pop(task_id, None)
+        if future is not None:
+            future.set_result(task.to_dict() if task else None)
+
+    def _output_size(self, task: Task) -> Optional[int]:
+        if task.status != TaskStatus.COMPLETED or not task.result_file:
+            return None
+        _, output_folder, _ = file_service.get_user_folders(task.session_id)
+        try:
+            return os.path.getsize(os.path.join(output_folder, task.result_file))
+        except OSError:
+            return None
+
+    def _process_image_task(self, task_id: str, session_id: str, filepath: str, params: Dict[str, Any],
+                            cache_key: Optional[str] = None, profile: bool = False):
         """Przetwarza obraz w tle"""
         try:
+            if cancellation.is_cancelled(task_id):
+                # Anulowany, zanim trafił do workera (np. job z kolejki Redis)
+                logger.info(f"Skipping cancelled task {task_id}")
+                return
+
             # Aktualizuj status na "processing"
             task_service.update_task_status(task_id, TaskStatus.PROCESSING)
-            
+
             # Pobierz foldery
             _, output_folder, error_folder = file_service.get_user_folders(session_id)
-            
+
             logger.info(f"Starting image processing for task {task_id}")
-            
-            # Przetwarzaj obraz 
-            
-            processor = id_maker(upload_path=filepath,
-                                 error_folder=error_folder,
-                                output_folder=output_folder,
-                                params=params)
-            processor.process_image()
-            
-            # Pobierz informacje biometryczne
-            biometric_info = processor.get_biometric_info()
-            
-            # Sprawdź czy kadrowanie się udało
-            cropping_successful = getattr(processor, 'cropping_successful', False)
-            
-            # Kategoryzuj informacje biometryczne
-            error_messages = []
-            warning_messages = []
-            
-            if biometric_info:
-                # Sprawdź czy to jest błąd krytyczny czy ostrzeżenie
-                if any(keyword in biometric_info.lower() for keyword in [
-                    "nie wykryto twarzy", 
-                    "wykryto wiele twarzy", 
-                    "brakujące cechy twarzy"
-                ]):
-                    error_messages.append(biometric_info)
-                else:
-                    warning_messages.append(biometric_info)
-            
-            # Znajdź najnowszy plik wyjściowy
-            output_filename = file_service.get_latest_output_file(session_id)
-            
-            if output_filename and cropping_successful:
-                # Sukces - plik istnieje i kadrowanie się udało
-                task_service.update_task_status(
-                    task_id, 
-                    TaskStatus.COMPLETED, 
-                    result_file=output_filename,
-                    biometric_warnings=warning_messages if warning_messages else None,
-                    biometric_errors=error_messages if error_messages else None
-                )
-                logger.info(f"Image processing completed for task {task_id}")
-            else:
-                # Błąd - brak pliku wyjściowego lub nieudane kadrowanie
-                error_msg = "Nie udało się przetworzyć zdjęcia"
-                if not cropping_successful:
-                    error_msg += " - błąd podczas kadrowania"
-                elif not output_filename:
-                    error_msg += " - nie znaleziono pliku wyjściowego"
-                
-                # Dodaj informacje biometryczne do błędu jeśli istnieją
-                if error_messages:
-                    error_msg += f". {error_messages[0]}"
-                
-                task_service.update_task_status(
-                    task_id, 
-                    TaskStatus.FAILED, 
-                    error_message=error_msg,
-                    biometric_warnings=warning_messages if warning_messages else None,
-                    biometric_errors=error_messages if error_messages else None
-                )
-                logger.error(f"Image processing failed for task {task_id}: {error_msg}")
-                
+
+            # Przetwarzaj obraz
+            with profiler.profile(task_id) if profile else nullcontext():
+                result = process_worker.run_id_maker(filepath, output_folder, error_folder, params, task_id)
+            self._finish_task(task_id, session_id, result, cache_key)
+
+        except TaskCancelledException:
+            self._count_interrupted()
+
         except Exception as e:
+            if cancellation.is_cancelled(task_id):
+                # Błąd anulowanego taska (np. /api/clear usunął plik) - status już "cancelled"
+                return
             error_msg = str(e)
             logger.error(f"Image processing failed for task {task_id}: {error_msg}", exc_info=True)
-            
+
             task_service.update_task_status(
-                task_id, 
-                TaskStatus.FAILED, 
+                task_id,
+                TaskStatus.FAILED,
                 error_message=error_msg
             )
-    
+
+        finally:
+            cancellation.clear(task_id)
+
+    def _count_interrupted(self):
+        with self.lock:
+            self.cancellations["interrupted"] += 1
+
+    def _finish_task(self, task_id: str, session_id: str, result: Dict[str, Any], cache_key: Optional[str] = None):
+        """
+        Zapisuje wynik przetwarzania w task_service (i w cache wyników, jeśli podano klucz).
+        Task anulowany po ostatnim punkcie kontrolnym zachowuje status "cancelled" - odrzuca go update_task_status.
+        """
+        # Pobierz informacje biometryczne
+        biometric_info = result.get("biometric_info")
+
+        # Sprawdź czy kadrowanie się udało
+        cropping_successful = result.get("cropping_successful", False)
+
+        # Kategoryzuj informacje biometryczne
+        error_messages = []
+        warning_messages = []
+
+        if biometric_info:
+            # Sprawdź czy to jest błąd krytyczny czy ostrzeżenie
+            if any(keyword in biometric_info.lower() for keyword in [
+                "nie wykryto twarzy",
+                "wykryto wiele twarzy",
+                "brakujące cechy twarzy"
+            ]):
+                error_messages.append(biometric_info)
+            else:
+                warning_messages.append(biometric_info)
+
+        # Plik wyjściowy tego taska
+        output_filename = result.get("output_filename")
+        if not output_filename or not file_service.file_exists(session_id, output_filename, 'output'):
+            output_filename = None
+
+        # W cache trafiają wyniki z plikiem oraz błędy analizy twarzy (powtarzalne), nie błędy zapisu.
+        # Plik bez usuniętego tła (przejściowy błąd rembg/serwera segmentacji) nie trafia tam wcale.
+        background_failed = cropping_successful and not result.get("background_removed", False)
+        if cache_key is not None and not background_failed and (output_filename and cropping_successful or error_messages):
+            _, output_folder, _ = file_service.get_user_folders(session_id)
+            output_file = os.path.join(output_folder, output_filename) if output_filename and cropping_successful else None
+            result_cache.put(cache_key, {key: value for key, value in result.items() if key != "stages"}, output_file)
+
+        if output_filename and cropping_successful:
+            # Sukces - plik istnieje i kadrowanie się udało
+            if task_service.update_task_status(
+                task_id,
+                TaskStatus.COMPLETED,
+                result_file=output_filename,
+                biometric_warnings=warning_messages if warning_messages else None,
+                biometric_errors=error_messages if error_messages else None,
+                stage_timings=result.get("stages")
+            ):
+                logger.info(f"Image processing completed for task {task_id}")
+        else:
+            # Błąd - brak pliku wyjściowego lub nieudane kadrowanie
+            error_msg = "Nie udało się przetworzyć zdjęcia"
+            if not cropping_successful:
+                error_msg += " - błąd podczas kadrowania"
+            elif not output_filename:
+                error_msg += " - nie znaleziono pliku wyjściowego"
+
+            # Dodaj informacje biometryczne do błędu jeśli istnieją
+            if error_messages:
+                error_msg += f". {error_messages[0]}"
+
+            if task_service.update_task_status(
+                task_id,
+                TaskStatus.FAILED,
+                error_message=error_msg,
+                biometric_warnings=warning_messages if warning_messages else None,
+                biometric_errors=error_messages if error_messages else None,
+                stage_timings=result.get("stages")
+            ):
+                logger.error(f"Image processing failed for task {task_id}: {error_msg}")
+
     def shutdown(self):
-        """Zamyka thread pool"""
-        self.executor.shutdown(wait=True)
+        """Zamyka pulę wątków/procesów i workera kolejki"""
+        if self.embedded_worker is not None:
+            self.embedded_worker.stop()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        if self.status_queue is not None:
+            self.status_queue.put(None)
 
 # Singleton instance
-image_service = ImageProcessingService()
\ No newline at end of file
+image_service = ImageProcessingService()
@@ -0,0 +1,82 @@
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ..services.redis_client import get_redis_client, redis_key
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Job:
+    task_id: str
+    session_id: str
+    filepath: str
+    params: Dict[str, Any]
+    cache_key: Optional[str] = None
+    # Przetwarzanie pod profilerem (profilowanie na żądanie)
+    profile: bool = False
+    # Zserializowany job dokładnie w postaci z listy Redis (potrzebny do ack)
+    raw: bytes = b""
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "task_id": self.task_id,
+            "session_id": self.session_id,
+            "filepath": self.filepath,
+            "params": self.params,
+            "cache_key": self.cache_key,
+            "profile": self.profile
+        })
+
+class RedisJobQueue:
+    """
+    Wspólna kolejka jobów w Redis. Pobrany job jest atomowo przenoszony (BLMOVE) na listę
+    konsumenta i usuwany z niej dopiero po ack - job przerwanego konsumenta nie ginie.
+    """
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else get_redis_client()
+        self.key = redis_key("jobs")
+
+    def processing_key(self, consumer_id: str) -> str:
+        return redis_key("processing", consumer_id)
+
+    def push(self, job: Job):
+        self.client.lpush(self.key, job.to_json())
+
+    def pop(self, consumer_id: str, timeout: float = 1.0) -> Optional[Job]:
+        """Czeka na job do timeout sekund; None jeśli kolejka pusta"""
+        raw = self.client.blmove(self.key, self.processing_key(consumer_id), timeout, "RIGHT", "LEFT")
+        if raw is None:
+            return None
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            logger.error(f"Dropping malformed job: {raw!r}")
+            self.client.lrem(self.processing_key(consumer_id), 1, raw)
+            return None
+        return Job(raw=raw, **data)
+
+    def ack(self, consumer_id: str, job: Job):
+        """Job zakończony (sukcesem albo błędem zapisanym w tasku)"""
+        self.client.lrem(self.processing_key(consumer_id), 1, job.raw)
+
+    def requeue(self, consumer_id: str) -> List[Job]:
+        """Przenosi niezakończone joby konsumenta na początek kolejki (następne do pobrania)"""
+        jobs = []
+        while True:
+            raw = self.client.lmove(self.processing_key(consumer_id), self.key, "RIGHT", "RIGHT")
+            if raw is None:
+                return jobs
+            try:
+                jobs.append(Job(raw=raw, **json.loads(raw)))
+            except ValueError:
+                logger.error(f"Requeued malformed job: {raw!r}")
+
+    def discard(self, job: Job):
+        """Usuwa job z kolejki (np. przeniesiony przez requeue, ale jego task jest już zakończony)"""
+        self.client.lrem(self.key, 1, job.raw)
+
+    def __len__(self) -> int:
+        return self.client.llen(self.key)
@@ -0,0 +1,66 @@
+import logging
+from contextlib import nullcontext
+import os
+from typing import Dict, Any, Optional
+
+from ..IdMaker.id_maker import id_maker
+from ..services.session_pool import session_pool
+from ..services.cancellation import cancellation
+from ..services.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+# Kolejka zdarzeń statusu do procesu rodzica (ustawiana w procesach workerów)
+_status_queue = None
+
+def run_id_maker(filepath: str, output_folder: str, error_folder: str, params: Dict[str, Any],
+                 task_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Uruchamia pipeline id_maker i zwraca wynik możliwy do przesłania między procesami.
+    Z task_id pipeline sprawdza między etapami, czy task nie został anulowany.
+    """
+    with session_pool.borrow() as session:
+        processor = id_maker(upload_path=filepath,
+                             error_folder=error_folder,
+                             output_folder=output_folder,
+                             params=params,
+                             session=session,
+                             cancel_token=cancellation.token(task_id) if task_id else None)
+        processor.process_image()
+
+    return {
+        "biometric_info": processor.get_biometric_info(),
+        "cropping_successful": getattr(processor, 'cropping_successful', False),
+        "output_filename": os.path.basename(processor.processed_image_path),
+        "background_removed": processor.background_removed,
+        "stages": processor.stage_timings
+    }
+
+def init_worker(status_queue, preload_models: bool = True):
+    """Initializer procesu workera - ładuje modele raz na cały czas życia procesu"""
+    global _status_queue
+    _status_queue = status_queue
+
+    # Jeden task naraz na proces - wystarczy jedna sesja
+    session_pool.size = 1
+    if preload_models:
+        try:
+            session_pool.preload()
+        except Exception as e:
+            logger.error(f"Failed to preload rembg session in worker {os.getpid()}: {e}")
+
+def warmup() -> int:
+    """Pusty job wymuszający start procesu workera"""
+    return os.getpid()
+
+def process_in_worker(task_id: str, filepath: str, output_folder: str, error_folder: str,
+                      params: Dict[str, Any], profile: bool = False) -> Dict[str, Any]:
+    """Przetwarza obraz w procesie workera, zgłaszając rozpoczęcie do procesu rodzica (z profile=True pod profilerem)"""
+    notify_status(task_id, "processing")
+    with profiler.profile(task_id) if profile else nullcontext():
+        return run_id_maker(filepath, output_folder, error_folder, params, task_id)
+
+def notify_status(task_id: str, status: str, payload: Optional[Dict[str, Any]] = None):
+    """Wysyła zdarzenie statusu do procesu rodzica"""
+    if _status_queue is not None:
+        _status_queue.put((task_id, status, payload))
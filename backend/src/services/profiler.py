@@ -0,0 +1,134 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+# Plik ze stosami wszystkich profilowanych tasków (format collapsed: "a;b;c <liczba próbek>")
+MERGED_FILE = "merged.collapsed"
+
+class StackSampler:
+    """
+    Statystyczny profiler jednego wątku: co interval sekund zapisuje jego stos wywołań.
+    Próbki zbierane są także wtedy, gdy wątek jest w kodzie natywnym (rembg/onnxruntime, dlib),
+    który zwalnia GIL - czas przypisywany jest wtedy wywołującej funkcji Pythona.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self) -> Counter:
+        self.stopped.set()
+        self.thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+class PipelineProfiler:
+    """
+    Profilowanie na żądanie: po włączeniu (enable) kolejne taski - nie więcej niż N i nie częściej
+    niż co PROFILE_MIN_INTERVAL_SECONDS - są przetwarzane pod StackSampler. Dla każdego powstaje
+    profiles/<task_id>.collapsed, a stosy są dopisywane do profiles/merged.collapsed (wejście dla
+    flamegraph.pl / speedscope). Wyłączony kosztuje jedno porównanie przy wysyłaniu taska.
+    """
+
+    def __init__(self):
+        self.remaining = 0
+        self.next_allowed = 0.0
+        self.lock = threading.Lock()
+
+    def enable(self, tasks: int) -> int:
+        """Włącza profilowanie kolejnych tasków (z limitem PROFILE_MAX_TASKS); zwraca faktyczną liczbę"""
+        tasks = max(0, min(tasks, config.PROFILE_MAX_TASKS))
+        with self.lock:
+            self.remaining = tasks
+            self.next_allowed = 0.0
+        logger.info(f"Pipeline profiling enabled for {tasks} tasks")
+        return tasks
+
+    def disable(self):
+        with self.lock:
+            self.remaining = 0
+
+    def claim(self) -> bool:
+        """Czy profilować wysyłany właśnie task (wywoływane dla każdego taska)"""
+        if not self.remaining:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            if not self.remaining or now < self.next_allowed:
+                return False
+            self.remaining -= 1
+            self.next_allowed = now + config.PROFILE_MIN_INTERVAL_SECONDS
+            return True
+
+    @contextmanager
+    def profile(self, task_id: str):
+        """Próbkuje stos bieżącego wątku w trakcie bloku i zapisuje profil taska"""
+        sampler = StackSampler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stacks = sampler.stop()
+            self.save(task_id, stacks, time.perf_counter() - started)
+
+    def save(self, task_id: str, stacks: Counter, duration: float):
+        lines = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        folder = config.profiles_folder
+        try:
+            with open(os.path.join(folder, f"{task_id}.collapsed"), 'w') as f:
+                f.write(lines)
+            # Jeden zapis w trybie append - profile z kilku procesów się nie przeplatają;
+            # powtórzone stosy są sumowane przez narzędzia do flame graphów
+            with open(os.path.join(folder, MERGED_FILE), 'a') as f:
+                f.write(lines)
+        except OSError as e:
+            logger.error(f"Failed to save profile of task {task_id}: {e}")
+            return
+        logger.info(f"Profiled task {task_id}: {sum(stacks.values())} samples in {duration:.2f}s")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Stan profilowania i zapisane profile (także z procesów workerów - z folderu profiles)"""
+        folder = config.profiles_folder
+        profiles = sorted(name for name in os.listdir(folder) if name.endswith(".collapsed") and name != MERGED_FILE)
+        return {
+            "remaining": self.remaining,
+            "max_tasks": config.PROFILE_MAX_TASKS,
+            "min_interval_seconds": config.PROFILE_MIN_INTERVAL_SECONDS,
+            "sample_interval_ms": config.PROFILE_SAMPLE_INTERVAL_MS,
+            "folder": folder,
+            "profiles": profiles,
+            "merged_file": MERGED_FILE
+        }
+
+def _collapse(frame) -> str:
+    """Stos od korzenia do liścia jako "plik:funkcja;plik:funkcja;..." """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+# Singleton instance
+profiler = PipelineProfiler()
@@ -0,0 +1,169 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Przedziały histogramów (górne granice, +Inf dodawane przy eksporcie)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUEUE_WAIT_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Fragmenty komunikatów biometrycznych z id_maker.check_image -> kategoria (etykieta metryki)
+BIOMETRIC_CATEGORIES = (
+    ("nie wykryto twarzy", "no_face"),
+    ("wykryto wiele twarzy", "multiple_faces"),
+    ("brakujące cechy twarzy", "missing_features"),
+    ("ukośna", "oblique_pose"),
+    ("usta są otwarte", "open_mouth"),
+    ("nienormalny stan otwarcia powiek", "abnormal_eyelid"),
+    ("nierówno otwarte", "uneven_eyelid"),
+    ("ogólny problem", "general"),
+    ("nieoczekiwany błąd", "unexpected"),
+)
+
+class _Metric:
+    """Wspólna część metryk: nazwa, opis, etykiety i wartości per zestaw etykiet"""
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labels, key))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = dict(self.values)
+        return self.header() + [f"{self.name}{self._label_text(key)} {_number(value)}" for key, value in values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # Zestaw etykiet -> (liczniki przedziałów bez kumulacji, z ostatnim dla +Inf; suma)
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+        lines = self.header()
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+class PrometheusMetrics:
+    """
+    Metryki w formacie tekstowym Prometheus. Wartości są aktualizowane w miejscu zdarzenia
+    (request, zakończenie taska, cache, limit), a eksport tylko je formatuje. Liczniki są
+    per proces - przy kilku workerach gunicorn każdy ma własne.
+    """
+
+    def __init__(self):
+        self.request_latency = Histogram(
+            "idmaker_http_request_duration_seconds", "Czas obsługi requestu per route",
+            LATENCY_BUCKETS, ("blueprint", "route", "method", "status"))
+        self.queue_wait = Histogram(
+            "idmaker_task_queue_wait_seconds", "Czas od utworzenia taska do rozpoczęcia przetwarzania",
+            QUEUE_WAIT_BUCKETS)
+        self.stage_duration = Histogram(
+            "idmaker_stage_duration_seconds", "Czas (wall) etapu pipeline id_maker",
+            STAGE_BUCKETS, ("stage",))
+        self.output_size = Histogram(
+            "idmaker_output_file_bytes", "Rozmiar pliku wynikowego", SIZE_BUCKETS)
+        self.tasks_finished = Counter(
+            "idmaker_tasks_finished_total", "Taski zakończone, per status końcowy", ("status",))
+        self.biometric_issues = Counter(
+            "idmaker_biometric_issues_total", "Ostrzeżenia i błędy kontroli biometrycznej per kategoria",
+            ("kind", "category"))
+        self.rate_limited = Counter(
+            "idmaker_rate_limit_rejections_total", "Requesty odrzucone przez limit zapytań", ("route",))
+        self.admission_rejected = Counter(
+            "idmaker_admission_rejections_total", "Uploady odrzucone przy pełnej kolejce", ("route",))
+        self.cache_hits = Counter("idmaker_result_cache_hits_total", "Trafienia w cache wyników")
+        self.cache_misses = Counter("idmaker_result_cache_misses_total", "Chybienia w cache wyników")
+
+    def observe_finished_task(self, task, output_size: Optional[int] = None):
+        """Metryki zakończonego taska (status, czas w kolejce, etapy, kategorie biometryczne, rozmiar pliku)"""
+        self.tasks_finished.inc(status=task.status.value)
+        if task.queue_wait is not None:
+            self.queue_wait.observe(task.queue_wait)
+        for stage, timing in (task.stage_timings or {}).items():
+            if timing.get("wall_seconds") is not None:
+                self.stage_duration.observe(timing["wall_seconds"], stage=stage)
+        for kind, messages in (("warning", task.biometric_warnings), ("error", task.biometric_errors)):
+            for message in messages or ():
+                category = biometric_category(message)
+                if category is not None:
+                    self.biometric_issues.inc(kind=kind, category=category)
+        if output_size is not None:
+            self.output_size.observe(output_size)
+
+    def render(self) -> str:
+        metrics = (self.request_latency, self.queue_wait, self.stage_duration, self.output_size,
+                   self.tasks_finished, self.biometric_issues, self.rate_limited, self.admission_rejected,
+                   self.cache_hits, self.cache_misses)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def biometric_category(message: str) -> Optional[str]:
+    """Kategoria komunikatu z check_image; None dla zdjęcia bez zastrzeżeń"""
+    message = message.lower()
+    for fragment, category in BIOMETRIC_CATEGORIES:
+        if fragment in message:
+            return category
+    return None
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+# Singleton instance
+prometheus_metrics = PrometheusMetrics()
@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from ..config import config
+from ..models.task import TaskStatus
+from ..services.job_queue import Job, RedisJobQueue
+from ..services.redis_client import redis_key
+from ..services.task_service import task_service
+
+logger = logging.getLogger(__name__)
+
+class QueueWorker:
+    """
+    Konsument wspólnej kolejki jobów: concurrency wątków pobiera joby i przekazuje je do handlera.
+    Worker ogłasza się w rejestrze Redis (host, pid, concurrency) i odnawia heartbeat z TTL.
+    Każdy worker sprawdza też rejestr - joby workera bez heartbeatu wracają na początek kolejki.
+    """
+
+    def __init__(self, handler: Callable[[Job], None], concurrency: int = None, queue: RedisJobQueue = None,
+                 heartbeat_timeout: float = None):
+        self.handler = handler
+        self.concurrency = concurrency or config.MAX_WORKERS
+        self.queue = queue if queue is not None else RedisJobQueue()
+        self.client = self.queue.client
+        self.heartbeat_timeout = heartbeat_timeout or config.WORKER_HEARTBEAT_TIMEOUT
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.running = False
+        self.consumers: List[threading.Thread] = []
+        self.heartbeat_thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+
+    def consumer_id(self, index: int) -> str:
+        return f"{self.worker_id}:{index}"
+
+    def start(self):
+        """Rejestruje workera i startuje wątki konsumentów oraz heartbeat"""
+        self.running = True
+        self.client.hset(redis_key("workers"), self.worker_id, json.dumps({
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "concurrency": self.concurrency,
+            "started_at": datetime.now().isoformat()
+        }))
+        self.heartbeat()
+
+        for index in range(self.concurrency):
+            consumer = threading.Thread(target=self._consume, args=(self.consumer_id(index),), daemon=True)
+            consumer.start()
+            self.consumers.append(consumer)
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self.heartbeat_thread.start()
+        logger.info(f"Worker {self.worker_id} started (concurrency {self.concurrency})")
+
+    def heartbeat(self):
+        self.client.set(redis_key("heartbeat", self.worker_id), int(time.time()), ex=max(1, int(self.heartbeat_timeout)))
+
+    def _heartbeat_loop(self):
+        # Kilka odnowień na okres ważności - jeden zgubiony heartbeat nie oznacza martwego workera
+        interval = self.heartbeat_timeout / 3
+        while not self.stopped.wait(interval):
+            try:
+                self.heartbeat()
+                self.requeue_dead_workers()
+            except Exception as e:
+                logger.error(f"Worker heartbeat failed: {e}")
+
+    def _consume(self, consumer_id: str):
+        """Pętla konsumenta: job z kolejki -> handler -> ack"""
+        while self.running:
+            try:
+                job = self.queue.pop(consumer_id, timeout=1.0)
+            except Exception as e:
+                logger.error(f"Job queue unavailable: {e}")
+                time.sleep(1.0)
+                continue
+            if job is None:
+                continue
+            try:
+                self.handler(job)
+            except Exception as e:
+                # Handler zapisuje błędy w tasku - tu trafiają tylko nieoczekiwane
+                logger.error(f"Job for task {job.task_id} failed: {e}", exc_info=True)
+            self.queue.ack(consumer_id, job)
+
+    def requeue_dead_workers(self) -> int:
+        """Przenosi joby workerów bez heartbeatu z powrotem do kolejki; zwraca liczbę jobów"""
+        requeued = 0
+        for worker_id, info in self.client.hgetall(redis_key("workers")).items():
+            worker_id = worker_id.decode() if isinstance(worker_id, bytes) else worker_id
+            if worker_id == self.worker_id or self.client.exists(redis_key("heartbeat", worker_id)):
+                continue
+
+            concurrency = json.loads(info).get("concurrency", 1)
+            for index in range(concurrency):
+                for job in self.queue.requeue(f"{worker_id}:{index}"):
+                    task = task_service.get_task(job.task_id)
+                    if task is None or task.is_finished:
+                        # Anulowany, usunięty albo zakończony tuż przed śmiercią workera (bez ack)
+                        self.queue.discard(job)
+                        continue
+                    # Task wraca do oczekujących - UI nie pokazuje przetwarzania, którego nikt nie robi
+                    task_service.update_task_status(job.task_id, TaskStatus.PENDING)
+                    requeued += 1
+            self.client.hdel(redis_key("workers"), worker_id)
+            logger.warning(f"Worker {worker_id} is dead (no heartbeat), requeued its jobs")
+        return requeued
+
+    def stop(self):
+        """Kończy pobieranie jobów; trwające joby są dokańczane, potem worker się wyrejestrowuje"""
+        self.running = False
+        # Heartbeat działa do końca trwających jobów, żeby inny worker ich nie przejął
+        for consumer in self.consumers:
+            consumer.join()
+        self.stopped.set()
+        if self.heartbeat_thread is not None:
+            self.heartbeat_thread.join()
+        self.client.hdel(redis_key("workers"), self.worker_id)
+        self.client.delete(redis_key("heartbeat", self.worker_id))
+        logger.info(f"Worker {self.worker_id} stopped")
+
+def list_workers(client) -> List[Dict]:
+    """Zarejestrowane workery z informacją, czy mają aktualny heartbeat"""
+    workers = []
+    for worker_id, info in client.hgetall(redis_key("workers")).items():
+        worker_id = worker_id.decode() if isinstance(worker_id, bytes) else worker_id
+        data = json.loads(info)
+        data["id"] = worker_id
+        data["alive"] = bool(client.exists(redis_key("heartbeat", worker_id)))
+        workers.append(data)
+    return workers
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    if config.EXECUTOR_BACKEND != "redis":
+        raise SystemExit("Standalone workers need EXECUTOR_BACKEND=redis")
+    if config.TASK_STORE != "redis":
+        # Procesy API dowiadują się o zakończeniu taska z kanału zmian magazynu - ma go tylko Redis
+        raise SystemExit("Standalone workers need TASK_STORE=redis")
+
+    from ..services.image_service import image_service
+    from ..services.session_pool import session_pool
+
+    if config.PRELOAD_MODELS:
+        session_pool.preload()
+
+    worker = QueueWorker(image_service.process_job)
+    worker.start()
+
+    # SIGTERM/SIGINT: dokończ bieżące joby i wyrejestruj workera
+    shutdown = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: shutdown.set())
+    signal.signal(signal.SIGINT, lambda *_: shutdown.set())
+    while not shutdown.wait(1.0):
+        pass
+    worker.stop()
+    task_service.close()
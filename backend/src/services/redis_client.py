@@ -0,0 +1,22 @@
+import threading
+
+from ..config import config
+
+_client = None
+_lock = threading.Lock()
+
+def get_redis_client():
+    """Wspólny klient Redis (pula połączeń) z config.REDIS_URL, tworzony przy pierwszym użyciu"""
+    global _client
+    with _lock:
+        if _client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("Redis backend requires the 'redis' package (pip install redis)")
+            _client = redis.Redis.from_url(config.REDIS_URL)
+        return _client
+
+def redis_key(*parts: str) -> str:
+    """Klucz z prefiksem aplikacji, np. idmaker:task:<id>"""
+    return config.REDIS_PREFIX + ":".join(parts)
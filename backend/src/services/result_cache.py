@@ -0,0 +1,310 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+from ..config import config
+from ..services.prometheus import prometheus_metrics
+from ..services.redis_client import get_redis_client, redis_key
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CacheEntry:
+    # Wynik run_id_maker bez nazwy pliku wyjściowego
+    result: Dict[str, Any]
+    # Kopia pliku wyjściowego w folderze cache (None jeśli przetwarzanie nie dało pliku)
+    output_path: Optional[str]
+    size: int
+    created_at: float
+
+class ResultCache:
+    """
+    Cache wyników przetwarzania adresowany treścią: klucz to hash bajtów uploadu
+    i parametrów dokumentu. Wyrzuca najdawniej używane wpisy po przekroczeniu limitu liczby wpisów lub rozmiaru.
+    Indeks jest w pamięci procesu - każdy proces (np. worker gunicorna) ma własne wpisy i własny folder
+    z plikami, więc procesy nie usuwają sobie nawzajem plików. Wspólny indeks: RedisResultCache.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None, folder: str = None):
+        self.max_entries = config.RESULT_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_bytes = config.RESULT_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self._folder = folder
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def folder(self) -> str:
+        folder = self._folder or os.path.join(config.cache_folder, str(os.getpid()))
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def make_key(self, filepath: str, params: Dict[str, Any]) -> str:
+        """Hash bajtów pliku, parametrów dokumentu i formatu wyjściowego (rozszerzenie)"""
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        settings = {
+            "params": params,
+            "model": config.REMBG_MODEL,
+            "extension": os.path.splitext(filepath)[1].lower()
+        }
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Zwraca wpis i oznacza go jako ostatnio używany"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry.output_path and not os.path.exists(entry.output_path)):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                prometheus_metrics.cache_misses.inc()
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            prometheus_metrics.cache_hits.inc()
+            return entry
+
+    def put(self, key: str, result: Dict[str, Any], output_file: Optional[str] = None):
+        """Zapisuje wynik; plik wyjściowy jest kopiowany do folderu cache"""
+        if not self.enabled:
+            return
+
+        output_path = None
+        size = 0
+        if output_file:
+            output_path = os.path.join(self.folder, key + os.path.splitext(output_file)[1].lower())
+            try:
+                _link_or_copy(output_file, output_path)
+                size = os.path.getsize(output_path)
+            except OSError as e:
+                logger.warning(f"Failed to store result in cache: {e}")
+                return
+
+        result = {k: v for k, v in result.items() if k != "output_filename"}
+        with self.lock:
+            if key in self.entries:
+                self._remove(key, keep_file=output_path == self.entries[key].output_path)
+            self.entries[key] = CacheEntry(result=result, output_path=output_path, size=size, created_at=time.time())
+            self.total_bytes += size
+            while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def materialize(self, entry: CacheEntry, target_path: str) -> bool:
+        """Podlinkowuje (lub kopiuje) zapisany plik wyjściowy do folderu sesji"""
+        if entry.output_path is None:
+            return False
+        try:
+            _link_or_copy(entry.output_path, target_path)
+            return True
+        except OSError as e:
+            logger.warning(f"Failed to link cached output to {target_path}: {e}")
+            return False
+
+    def expire(self, max_age_hours: int) -> int:
+        """Usuwa wpisy starsze niż max_age_hours (cache nie trzyma zdjęć dłużej niż foldery sesji)"""
+        cutoff = time.time() - max_age_hours * 3600
+        with self.lock:
+            expired = [key for key, entry in self.entries.items() if entry.created_at < cutoff]
+            for key in expired:
+                self._remove(key)
+        return len(expired)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._remove(key)
+
+    def _remove(self, key: str, keep_file: bool = False):
+        """Usuwa wpis (wywoływane pod self.lock)"""
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry.size
+        if entry.output_path and not keep_file:
+            try:
+                os.remove(entry.output_path)
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "size_bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+class RedisResultCache(ResultCache):
+    """
+    Cache wyników ze wspólnym indeksem w Redis (TASK_STORE=redis albo EXECUTOR_BACKEND=redis): wynik
+    zapisany przez worker jest trafieniem w każdym procesie API, a limity i wyrzucanie dotyczą
+    wszystkich procesów razem. Wpis to JSON pod kluczem cache:entry:<klucz>; kolejność użycia
+    i utworzenia w ZSET-ach, rozmiar i statystyki w licznikach. Pliki w folderze cache (DATA_FOLDER
+    jest wspólny dla hostów, tak jak uploady).
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None, folder: str = None, client=None):
+        super().__init__(max_entries, max_bytes, folder)
+        self.client = client if client is not None else get_redis_client()
+        self.used_key = redis_key("cache", "used")
+        self.created_key = redis_key("cache", "created")
+        self.bytes_key = redis_key("cache", "bytes")
+        self.stats_key = redis_key("cache", "stats")
+
+    @property
+    def folder(self) -> str:
+        folder = self._folder or config.cache_folder
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def _entry_key(self, key: str) -> str:
+        return redis_key("cache", "entry", key)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        data = self.client.get(self._entry_key(key))
+        entry = CacheEntry(**json.loads(data)) if data else None
+        if entry is None or (entry.output_path and not os.path.exists(entry.output_path)):
+            if entry is not None:
+                self._remove(key)
+            self.client.hincrby(self.stats_key, "misses", 1)
+            prometheus_metrics.cache_misses.inc()
+            return None
+        pipe = self.client.pipeline()
+        pipe.zadd(self.used_key, {key: time.time()})
+        pipe.hincrby(self.stats_key, "hits", 1)
+        pipe.execute()
+        prometheus_metrics.cache_hits.inc()
+        return entry
+
+    def put(self, key: str, result: Dict[str, Any], output_file: Optional[str] = None):
+        # Ten sam klucz to ten sam wynik - istniejącego wpisu (i pliku, który ktoś może właśnie linkować)
+        # nie trzeba podmieniać
+        if not self.enabled or self.client.exists(self._entry_key(key)):
+            return
+
+        output_path = None
+        size = 0
+        if output_file:
+            output_path = os.path.join(self.folder, key + os.path.splitext(output_file)[1].lower())
+            try:
+                _link_or_copy(output_file, output_path)
+                size = os.path.getsize(output_path)
+            except OSError as e:
+                logger.warning(f"Failed to store result in cache: {e}")
+                return
+
+        result = {k: v for k, v in result.items() if k != "output_filename"}
+        now = time.time()
+        entry = CacheEntry(result=result, output_path=output_path, size=size, created_at=now)
+        # NX - przy wyścigu dwóch procesów z tym samym kluczem liczy się tylko pierwszy wpis
+        if not self.client.set(self._entry_key(key), json.dumps(entry.__dict__), nx=True):
+            return
+        pipe = self.client.pipeline()
+        pipe.zadd(self.used_key, {key: now})
+        pipe.zadd(self.created_key, {key: now})
+        pipe.incrby(self.bytes_key, size)
+        pipe.execute()
+        self._evict()
+
+    def _evict(self):
+        """Wyrzuca najdawniej używane wpisy ponad limity (ZPOPMIN - każdy wpis wyrzuca jeden proces)"""
+        while True:
+            pipe = self.client.pipeline()
+            pipe.zcard(self.used_key)
+            pipe.get(self.bytes_key)
+            count, total_bytes = pipe.execute()
+            if count <= self.max_entries and int(total_bytes or 0) <= self.max_bytes:
+                return
+            popped = self.client.zpopmin(self.used_key)
+            if not popped:
+                return
+            key = popped[0][0]
+            if self._remove(key.decode() if isinstance(key, bytes) else key):
+                self.client.hincrby(self.stats_key, "evictions", 1)
+
+    def expire(self, max_age_hours: int) -> int:
+        cutoff = time.time() - max_age_hours * 3600
+        expired = [key.decode() if isinstance(key, bytes) else key
+                   for key in self.client.zrangebyscore(self.created_key, 0, cutoff)]
+        return sum(1 for key in expired if self._remove(key))
+
+    def clear(self):
+        for key in self.client.zrange(self.created_key, 0, -1):
+            self._remove(key.decode() if isinstance(key, bytes) else key)
+
+    def _remove(self, key: str, keep_file: bool = False) -> bool:
+        """Usuwa wpis; GET i DEL w transakcji - przy wyścigu plik i rozmiar zwalnia tylko jeden proces"""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(self._entry_key(key))
+        pipe.delete(self._entry_key(key))
+        pipe.zrem(self.used_key, key)
+        pipe.zrem(self.created_key, key)
+        data = pipe.execute()[0]
+        if not data:
+            return False
+        entry = CacheEntry(**json.loads(data))
+        self.client.decrby(self.bytes_key, entry.size)
+        if entry.output_path and not keep_file:
+            try:
+                os.remove(entry.output_path)
+            except OSError:
+                pass
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        pipe = self.client.pipeline()
+        pipe.zcard(self.created_key)
+        pipe.get(self.bytes_key)
+        pipe.hgetall(self.stats_key)
+        count, total_bytes, stats = pipe.execute()
+        stats = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in stats.items()}
+        hits = stats.get("hits", 0)
+        lookups = hits + stats.get("misses", 0)
+        return {
+            "entries": count,
+            "size_bytes": int(total_bytes or 0),
+            "hits": hits,
+            "misses": stats.get("misses", 0),
+            "evictions": stats.get("evictions", 0),
+            "hit_ratio": hits / lookups if lookups else 0.0
+        }
+
+def create_result_cache() -> ResultCache:
+    """Wspólny indeks w Redis, jeśli Redis jest używany (worker i API to różne procesy), inaczej w pamięci"""
+    if config.TASK_STORE == "redis" or config.EXECUTOR_BACKEND == "redis":
+        logger.info("Using Redis result cache index")
+        return RedisResultCache()
+    return ResultCache()
+
+def _link_or_copy(source: str, target: str):
+    """Hard link (bez kopiowania danych), a jeśli się nie da - kopia"""
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+# Singleton instance
+result_cache = create_result_cache()
@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Collection, Deque, Dict, List, Optional
+
+from ..utils.helpers import percentile
+
+# Kolejność = priorytet: pojedyncze uploady przed jobami z batchy i archiwów
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+LANES = (LANE_INTERACTIVE, LANE_BULK)
+
+# Liczba ostatnich czasów oczekiwania na linię, z których liczone są percentyle
+WAIT_SAMPLES = 500
+
+@dataclass
+class ScheduledJob:
+    task_id: str
+    session_id: str
+    lane: str
+    # Wysyła job do executora i zwraca jego Future
+    submit: Callable[[], Future]
+    # Future zwrócony wywołującemu, kończony wynikiem joba
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+class FairScheduler:
+    """
+    Kolejka jobów czekających na wolnego workera. Linie mają ścisły priorytet (LANES),
+    a w obrębie linii sesje są obsługiwane po kolei (round-robin) - jedna sesja z wieloma
+    plikami nie blokuje pozostałych. Nie jest thread-safe - wywołujący trzyma swój lock.
+    """
+
+    def __init__(self, lanes=LANES):
+        # Linia -> sesja -> joby sesji w kolejności dodania; kolejność sesji = kolejka round-robin
+        self.lanes: Dict[str, "OrderedDict[str, Deque[ScheduledJob]]"] = {lane: OrderedDict() for lane in lanes}
+        self.depths: Dict[str, int] = {lane: 0 for lane in lanes}
+        self.dispatched: Dict[str, int] = {lane: 0 for lane in lanes}
+        self.waits: Dict[str, Deque[float]] = {lane: deque(maxlen=WAIT_SAMPLES) for lane in lanes}
+
+    def push(self, job: ScheduledJob):
+        sessions = self.lanes[job.lane]
+        if job.session_id not in sessions:
+            sessions[job.session_id] = deque()
+        sessions[job.session_id].append(job)
+        self.depths[job.lane] += 1
+
+    def pop(self) -> Optional[ScheduledJob]:
+        """Następny job: pierwsza niepusta linia, w niej sesja z początku kolejki round-robin"""
+        for lane, sessions in self.lanes.items():
+            if not sessions:
+                continue
+            session_id, jobs = next(iter(sessions.items()))
+            job = jobs.popleft()
+            if jobs:
+                # Sesja z kolejnymi jobami idzie na koniec kolejki
+                sessions.move_to_end(session_id)
+            else:
+                del sessions[session_id]
+            self.depths[lane] -= 1
+            self.dispatched[lane] += 1
+            self.waits[lane].append(time.monotonic() - job.enqueued_at)
+            return job
+        return None
+
+    def remove(self, task_ids: Collection[str]) -> List[ScheduledJob]:
+        """Usuwa z kolejki joby podanych tasków (anulowane) i je zwraca"""
+        removed = []
+        for lane, sessions in self.lanes.items():
+            for session_id in list(sessions):
+                jobs = sessions[session_id]
+                kept = deque(job for job in jobs if job.task_id not in task_ids)
+                if len(kept) == len(jobs):
+                    continue
+                removed.extend(job for job in jobs if job.task_id in task_ids)
+                self.depths[lane] -= len(jobs) - len(kept)
+                if kept:
+                    sessions[session_id] = kept
+                else:
+                    del sessions[session_id]
+        return removed
+
+    def __len__(self) -> int:
+        return sum(self.depths.values())
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Głębokość, liczba sesji, najdłużej czekający job i czasy oczekiwania (p50/p95 z ostatnich jobów) dla każdej linii"""
+        stats = {}
+        now = time.monotonic()
+        for lane, sessions in self.lanes.items():
+            waits = sorted(self.waits[lane])
+            oldest = min((jobs[0].enqueued_at for jobs in sessions.values()), default=None)
+            stats[lane] = {
+                "depth": self.depths[lane],
+                "sessions": len(sessions),
+                "dispatched": self.dispatched[lane],
+                "oldest_wait_seconds": round(now - oldest, 3) if oldest is not None else None,
+                "wait_p50_seconds": percentile(waits, 0.5),
+                "wait_p95_seconds": percentile(waits, 0.95)
+            }
+        return stats
@@ -0,0 +1,247 @@
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from multiprocessing.connection import Listener, Client, Connection
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+from ..config import config
+from ..utils.exceptions import ImageProcessingException
+
+logger = logging.getLogger(__name__)
+
+# Normalizacja wejścia (mean, std) jak w sesjach rembg - tylko modele zwracające jedną maskę.
+# Rozmiar wejścia jest czytany z modelu; inne modele serwer odmawia załadować.
+IMAGENET_NORMALIZATION = ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225))
+MODEL_NORMALIZATION = {
+    "u2net": IMAGENET_NORMALIZATION,
+    "u2netp": IMAGENET_NORMALIZATION,
+    "u2net_human_seg": IMAGENET_NORMALIZATION,
+    "silueta": IMAGENET_NORMALIZATION,
+    "isnet-general-use": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0)),
+    "isnet-anime": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0)),
+}
+
+STATUS_OK = b"\x00"
+STATUS_ERROR = b"\x01"
+
+@dataclass
+class SegmentationRequest:
+    conn: Connection
+    image: np.ndarray
+
+class SegmentationServer:
+    """
+    Lokalny serwer segmentacji: jedna sesja onnxruntime na cały host, nasłuchuje na sokecie Unix,
+    zbiera zapytania przez kilka ms i uruchamia je w modelu jako jeden batch.
+    """
+
+    def __init__(self, socket_path: str = None, model_name: str = None, batch_window_ms: float = None,
+                 max_batch: int = None, inner_session=None):
+        self.socket_path = socket_path or config.SEGMENTATION_SOCKET
+        self.model_name = model_name or config.REMBG_MODEL
+        self.batch_window = (batch_window_ms if batch_window_ms is not None else config.SEGMENTATION_BATCH_WINDOW_MS) / 1000.0
+        self.max_batch = max_batch or config.SEGMENTATION_MAX_BATCH
+        self.inner_session = inner_session
+        self.requests: "queue.Queue[SegmentationRequest]" = queue.Queue()
+        self.listener: Optional[Listener] = None
+        self.running = False
+        self.stats = {"requests": 0, "batches": 0, "max_batch": 0}
+
+    def _load_model(self):
+        """Ładuje model raz, w procesie serwera. Nieobsługiwany model albo wejście bez stałego rozmiaru = błąd startu"""
+        if self.model_name not in MODEL_NORMALIZATION:
+            raise ValueError(f"Segmentation server does not support model {self.model_name} "
+                             f"(supported: {', '.join(sorted(MODEL_NORMALIZATION))})")
+        self.mean, self.std = MODEL_NORMALIZATION[self.model_name]
+        if self.inner_session is None:
+            from rembg import new_session
+            self.inner_session = new_session(self.model_name, providers=['CPUExecutionProvider']).inner_session
+        model_input = self.inner_session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Wejście NCHW: [batch, 3, wysokość, szerokość]
+        shape = list(model_input.shape or [])
+        if len(shape) != 4 or shape[1] != 3 or not all(isinstance(dim, int) and dim > 0 for dim in shape[2:]):
+            raise ValueError(f"Unsupported input shape {shape} of segmentation model {self.model_name}")
+        self.input_size = (shape[3], shape[2])
+        # Eksport z ustaloną wymiarowością batcha (1) wymaga uruchamiania pojedynczo
+        batch_dim = shape[0]
+        self.dynamic_batch = not isinstance(batch_dim, int) or batch_dim <= 0
+        logger.info(f"Segmentation model {self.model_name} loaded (input: {self.input_size[0]}x{self.input_size[1]}, "
+                    f"dynamic batch: {self.dynamic_batch})")
+
+    def start(self):
+        """Startuje serwer w wątkach w tle"""
+        self._load_model()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.listener = Listener(self.socket_path, family='AF_UNIX')
+        os.chmod(self.socket_path, 0o600)
+        self.running = True
+
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        logger.info(f"Segmentation server listening on {self.socket_path}")
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while self.running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.running = False
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._connection_loop, args=(conn,), daemon=True).start()
+
+    def _connection_loop(self, conn: Connection):
+        """
+        Czyta zapytania z jednego połączenia (jeden id_maker = jedno zapytanie naraz).
+        Najpierw wysyła klientowi rozmiar wejścia modelu - klient skaluje do niego obrazy.
+        """
+        try:
+            conn.send_bytes(struct.pack("<II", *self.input_size))
+            while self.running:
+                data = conn.recv_bytes()
+                image = np.frombuffer(data, dtype=np.uint8).reshape(self.input_size[1], self.input_size[0], 3)
+                self.requests.put(SegmentationRequest(conn=conn, image=image))
+        except (EOFError, OSError, ValueError):
+            conn.close()
+
+    def _batch_loop(self):
+        """Zbiera zapytania przez okno batcha i uruchamia je razem"""
+        while self.running:
+            try:
+                batch = [self.requests.get(timeout=1)]
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[SegmentationRequest]):
+        try:
+            masks = self.predict([request.image for request in batch])
+            replies = [STATUS_OK + mask.tobytes() for mask in masks]
+        except Exception as e:
+            logger.error(f"Segmentation batch of {len(batch)} failed: {e}")
+            replies = [STATUS_ERROR + str(e).encode()] * len(batch)
+
+        self.stats["requests"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+
+        for request, reply in zip(batch, replies):
+            try:
+                request.conn.send_bytes(reply)
+            except (EOFError, OSError):
+                pass
+
+    def predict(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """Zwraca maski uint8 w rozmiarze wejścia modelu dla obrazów w tym rozmiarze - normalizacja jak w rembg"""
+        tensors = np.stack([normalize(image, self.mean, self.std) for image in images])
+        if self.dynamic_batch:
+            outputs = self.inner_session.run(None, {self.input_name: tensors})[0][:, 0, :, :]
+        else:
+            outputs = np.concatenate([
+                self.inner_session.run(None, {self.input_name: tensor[None]})[0][:, 0, :, :]
+                for tensor in tensors
+            ])
+
+        masks = []
+        for pred in outputs:
+            ma, mi = np.max(pred), np.min(pred)
+            pred = (pred - mi) / max(ma - mi, 1e-6)
+            masks.append((pred.clip(0, 1) * 255).astype(np.uint8))
+        return masks
+
+def normalize(image: np.ndarray, mean: tuple, std: tuple) -> np.ndarray:
+    """Normalizacja wejścia modelu (kopiuje rembg BaseSession.normalize)"""
+    image = image / max(np.max(image), 1e-6)
+    tensor = (image - np.array(mean)) / np.array(std)
+    return tensor.transpose((2, 0, 1)).astype(np.float32)
+
+class RemoteSegmentationSession:
+    """Sesja zgodna z rembg (predict), która wysyła obraz do serwera segmentacji"""
+
+    def __init__(self, socket_path: str = None):
+        self.socket_path = socket_path or config.SEGMENTATION_SOCKET
+        self.conn: Optional[Connection] = None
+        # Rozmiar wejścia modelu (szerokość, wysokość) - podaje go serwer po połączeniu
+        self.input_size = None
+
+    def connect(self) -> "RemoteSegmentationSession":
+        if self.conn is None:
+            conn = Client(self.socket_path, family='AF_UNIX')
+            self.input_size = struct.unpack("<II", conn.recv_bytes())
+            self.conn = conn
+        return self
+
+    def predict(self, img: Image.Image, *args, **kwargs) -> List[Image.Image]:
+        try:
+            reply = self._request(img)
+        except (EOFError, OSError):
+            # Serwer mógł zostać zrestartowany (także z innym modelem) - jedna próba z nowym połączeniem
+            self.close()
+            reply = self._request(img)
+
+        if reply[:1] != STATUS_OK:
+            raise ImageProcessingException(f"Segmentation server error: {reply[1:].decode(errors='replace')}")
+
+        pred = np.frombuffer(reply[1:], dtype=np.uint8).reshape(self.input_size[1], self.input_size[0])
+        mask = Image.fromarray(pred).resize(img.size, Image.Resampling.LANCZOS)
+        return [mask]
+
+    def _request(self, img: Image.Image) -> bytes:
+        self.connect()
+        data = np.asarray(img.convert("RGB").resize(self.input_size, Image.Resampling.LANCZOS), dtype=np.uint8)
+        self.conn.send_bytes(data.tobytes())
+        return self.conn.recv_bytes()
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+            self.conn = None
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    if not config.SEGMENTATION_SOCKET:
+        raise SystemExit("SEGMENTATION_SOCKET is not set")
+    try:
+        SegmentationServer().serve_forever()
+    except ValueError as e:
+        # Nieobsługiwany model - bez serwera workery zgłoszą błąd, zamiast dostawać złe maski
+        raise SystemExit(str(e))
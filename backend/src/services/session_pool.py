@@ -0,0 +1,81 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+class RembgSessionPool:
+    """Pula wcześniej załadowanych sesji rembg/onnxruntime współdzielona przez workery"""
+
+    def __init__(self, model_name: str = None, size: int = None):
+        self.model_name = model_name or config.REMBG_MODEL
+        self.size = size or config.MAX_WORKERS
+        self.sessions: "queue.Queue" = queue.Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _create_session(self):
+        """Ładuje model do nowej sesji onnxruntime (CPU) albo łączy się z serwerem segmentacji"""
+        if config.SEGMENTATION_SOCKET:
+            from .segmentation_server import RemoteSegmentationSession
+            try:
+                return RemoteSegmentationSession(config.SEGMENTATION_SOCKET).connect()
+            except OSError as e:
+                logger.warning(f"Segmentation server unavailable ({e}), loading a local rembg session")
+
+        from rembg import new_session
+        return new_session(self.model_name, providers=['CPUExecutionProvider'])
+
+    def preload(self) -> int:
+        """Tworzy sesje z góry, przy starcie aplikacji"""
+        with self.lock:
+            while self.created < self.size:
+                self.sessions.put(self._create_session())
+                self.created += 1
+        logger.info(f"Preloaded {self.created} rembg sessions ({self.model_name})")
+        return self.created
+
+    def acquire(self, timeout: Optional[float] = None):
+        """Pobiera sesję z puli, tworząc ją leniwie jeśli pula nie została jeszcze zapełniona"""
+        try:
+            return self.sessions.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._create_session()
+            except Exception:
+                with self.lock:
+                    self.created -= 1
+                raise
+
+        return self.sessions.get(timeout=timeout)
+
+    def release(self, session):
+        """Zwraca sesję do puli"""
+        if session is not None:
+            self.sessions.put(session)
+
+    @contextmanager
+    def borrow(self, timeout: Optional[float] = None):
+        """Context manager: pożycza sesję na czas przetwarzania jednego obrazu"""
+        session = self.acquire(timeout=timeout)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+# Singleton instance
+session_pool = RembgSessionPool()
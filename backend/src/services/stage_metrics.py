@@ -0,0 +1,58 @@
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from ..models.task import Task
+from ..utils.helpers import percentile
+
+# Liczba ostatnich zakończonych tasków, z których liczone są percentyle
+STAGE_SAMPLES = 1000
+
+# Wartości mierzone dla każdego etapu (klucze Task.stage_timings[etap])
+STAGE_FIELDS = ("wall_seconds", "cpu_seconds", "rss_peak_delta_mb")
+
+class StageMetrics:
+    """Czasy w kolejce i czasy etapów pipeline z ostatnich zakończonych tasków, z percentylami dla /api/metrics"""
+
+    def __init__(self, samples: int = STAGE_SAMPLES):
+        self.samples = samples
+        self.queue_waits: Deque[float] = deque(maxlen=samples)
+        # Etap -> pole -> ostatnie wartości
+        self.stages: Dict[str, Dict[str, Deque[float]]] = {}
+        self.lock = threading.Lock()
+
+    def record(self, task: Task):
+        with self.lock:
+            if task.queue_wait is not None:
+                self.queue_waits.append(task.queue_wait)
+            for stage, timing in (task.stage_timings or {}).items():
+                fields = self.stages.get(stage)
+                if fields is None:
+                    fields = self.stages[stage] = {field: deque(maxlen=self.samples) for field in STAGE_FIELDS}
+                for field in STAGE_FIELDS:
+                    if timing.get(field) is not None:
+                        fields[field].append(timing[field])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """p50/p95/p99 czasu w kolejce i każdej wartości każdego etapu"""
+        with self.lock:
+            queue_waits = list(self.queue_waits)
+            stages = {stage: {field: list(values) for field, values in fields.items()}
+                      for stage, fields in self.stages.items()}
+        return {
+            "queue_wait_seconds": _summary(queue_waits),
+            "stages": {stage: {field: _summary(values) for field, values in fields.items()}
+                       for stage, fields in stages.items()}
+        }
+
+def _summary(values) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99)
+    }
+
+# Singleton instance
+stage_metrics = StageMetrics()
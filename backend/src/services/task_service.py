@@ -1,50 +1,278 @@
 import threading
-from typing import Dict, Optional, List
+import time
+from typing import Callable, Dict, Optional, List, Tuple, Any, Set
 from datetime import datetime, timedelta
 
 from ..models.task import Task, TaskStatus
+from ..models.batch import Batch
+from ..services.task_store import TaskStore, create_task_store
+from ..services.tracing import tracer
 from ..utils.exceptions import TaskNotFoundException
 from ..config import config
 
 class TaskService:
-    def __init__(self):
-        self.tasks: Dict[str, Task] = {}
+    """
+    Stan tasków i batchy (w magazynie z task_store) oraz budzenie klientów long-poll/SSE.
+    Zapisy idą pod self.lock; pojedyncze odczyty (get_task, get_batch) są bez locka,
+    więc odpytywanie statusu nie czeka na workery zapisujące aktualizacje.
+    """
+    
+    def __init__(self, store: TaskStore = None):
+        self.store = store or create_task_store()
         self.lock = threading.Lock()
+        # Oczekujący klienci long-poll/SSE: klucz taska lub sesji -> eventy do obudzenia
+        self.watchers: Dict[str, Set[threading.Event]] = {}
+        # Callbacki (task_id, local) wywoływane po każdej zmianie taska, także zrobionej w innym procesie (local=False)
+        self.listeners: List[Callable[[str, bool], None]] = []
+        self.store.listen(self._on_store_change)
     
-    def create_task(self, session_id: str, filename: str, document_type: str) -> Task:
-        """Tworzy nowy task"""
+    def create_task(self, session_id: str, filename: str, document_type: str, batch_id: Optional[str] = None,
+                    trace_id: Optional[str] = None, trace_parent_id: Optional[str] = None) -> Task:
+        """Tworzy nowy task (opcjonalnie dopisany do istniejącego batcha i do trace requestu)"""
         task = Task(
             session_id=session_id,
             filename=filename,
-            document_type=document_type
+            document_type=document_type,
+            batch_id=batch_id,
+            trace_id=trace_id,
+            trace_parent_id=trace_parent_id
         )
         
         with self.lock:
-            self.tasks[task.id] = task
+            self.store.add_tasks([task])
+            batch = self.store.get_batch(batch_id) if batch_id else None
+            if batch is not None:
+                batch.task_ids.append(task.id)
+                self.store.save_batch(batch)
+            self._notify_session(session_id)
         
         return task
     
-    def get_task(self, task_id: str) -> Optional[Task]:
-        """Pobiera task po ID"""
+    def create_batch(self, session_id: str, filenames: List[str], document_type: str,
+                     rejected_files: Optional[List[Dict[str, str]]] = None,
+                     trace_id: Optional[str] = None, trace_parent_id: Optional[str] = None) -> Tuple[Batch, List[Task]]:
+        """Tworzy batch i jego taski (jeden na plik)"""
+        batch = Batch(session_id=session_id, document_type=document_type)
+        batch.rejected_files = rejected_files or []
+        tasks = [
+            Task(session_id=session_id, filename=filename, document_type=document_type, batch_id=batch.id,
+                 trace_id=trace_id, trace_parent_id=trace_parent_id)
+            for filename in filenames
+        ]
+        batch.task_ids = [task.id for task in tasks]
+        
+        with self.lock:
+            self.store.add_tasks(tasks)
+            self.store.save_batch(batch)
+            self._notify_session(session_id)
+        
+        return batch, tasks
+    
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        """Pobiera batch po ID (bez locka)"""
+        return self.store.get_batch(batch_id)
+    
+    def get_batch_tasks(self, batch_id: str) -> List[Task]:
+        """Pobiera taski batcha (w kolejności plików)"""
         with self.lock:
-            return self.tasks.get(task_id)
+            return self._batch_tasks(self.store.get_batch(batch_id))
+    
+    def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Zwraca zbiorczy status batcha"""
+        with self.lock:
+            batch = self.store.get_batch(batch_id)
+            if not batch:
+                return None
+            return batch.to_dict(self._batch_tasks(batch), workers=config.MAX_WORKERS)
+    
+    def _batch_tasks(self, batch: Optional[Batch]) -> List[Task]:
+        if not batch:
+            return []
+        tasks = self.store.get_tasks(batch.task_ids)
+        return [tasks[task_id] for task_id in batch.task_ids if task_id in tasks]
+    
+    def get_task(self, task_id: str) -> Optional[Task]:
+        """Pobiera task po ID (bez locka)"""
+        return self.store.get_task(task_id)
     
     def update_task_status(self, task_id: str, status: TaskStatus, 
                           error_message: Optional[str] = None, 
                           result_file: Optional[str] = None,
                           biometric_warnings: Optional[list] = None,
-                          biometric_errors: Optional[list] = None) -> bool:
-        """Aktualizuje status taska"""
-        with self.lock:
-            task = self.tasks.get(task_id)
-            if not task:
-                return False
-            
+                          biometric_errors: Optional[list] = None,
+                          stage_timings: Optional[Dict[str, Dict[str, float]]] = None) -> bool:
+        """
+        Aktualizuje status taska. Zakończony task (także anulowany) nie jest już zmieniany -
+        sprawdzenie i zapis są pod jednym lockiem z cancel_task. Zwraca False, gdy nic nie zapisano.
+        """
+        def change(task: Task):
             task.update_status(status, error_message, biometric_warnings, biometric_errors)
             if result_file:
                 task.result_file = result_file
+            if stage_timings:
+                task.stage_timings = stage_timings
+
+        task, previous_status = self._change_task(task_id, change)
+        if task is None:
+            return False
+        
+        if task.is_finished and previous_status != status:
+            tracer.trace_task(task)
+        self._call_listeners(task_id)
+        return True
+    
+    def cancel_task(self, task_id: str) -> Optional[TaskStatus]:
+        """
+        Oznacza niezakończony task jako anulowany (pod tym samym lockiem co zapis wyniku,
+        więc zakończony task nie zostanie nadpisany). Zwraca poprzedni status albo None.
+        """
+        task, previous_status = self._change_task(
+            task_id, lambda task: task.update_status(TaskStatus.CANCELLED, error_message="Przetwarzanie anulowane")
+        )
+        if task is None:
+            return None
+        
+        tracer.trace_task(task)
+        self._call_listeners(task_id)
+        return previous_status
+    
+    def _change_task(self, task_id: str, change: Callable[[Task], None]) -> Tuple[Optional[Task], Optional[TaskStatus]]:
+        """
+        Zmienia niezakończony task funkcją change i zapisuje go. Jeśli w międzyczasie zmienił go inny
+        proces/host (wspólny magazyn odrzucił zapis), task jest czytany i zmieniany ponownie.
+        Zwraca (zapisany task, poprzedni status) albo (None, None) dla nieznanego lub zakończonego taska.
+        """
+        with self.lock:
+            while True:
+                task = self.store.get_task(task_id)
+                if not task or task.is_finished:
+                    return None, None
+                
+                previous_status = task.status
+                previous_version = task.version
+                change(task)
+                if self.store.save_task(task, previous_status, previous_version):
+                    break
             
-            return True
+            self._notify(_task_key(task_id))
+            self._notify_session(task.session_id)
+        return task, previous_status
+    
+    def add_listener(self, callback: Callable[[str, bool], None]):
+        """
+        Rejestruje callback(task_id, local) wywoływany po zmianie statusu taska;
+        local=False dla zmian zrobionych przez inny proces/host
+        """
+        self.listeners.append(callback)
+    
+    def _on_store_change(self, task_id: str, session_id: str):
+        """Zmiana zrobiona przez inny proces/host (zdarzenie z magazynu tasków)"""
+        with self.lock:
+            if task_id:
+                self._notify(_task_key(task_id))
+            if session_id:
+                # Wersję sesji zwiększył już proces, który zrobił zmianę
+                self._notify(_session_key(session_id))
+        if task_id:
+            self._call_listeners(task_id, local=False)
+    
+    def _call_listeners(self, task_id: str, local: bool = True):
+        for callback in self.listeners:
+            callback(task_id, local)
+    
+    def get_changed_tasks(self, since_by_id: Dict[str, Optional[datetime]]) -> Tuple[List[Task], List[str]]:
+        """
+        Zbiorcze zapytanie o wiele tasków pod jednym przejęciem locka.
+        Zwraca (taski zmienione po podanym czasie - lub wszystkie bez czasu, nieznane ID).
+        """
+        changed = []
+        missing = []
+        with self.lock:
+            tasks = self.store.get_tasks(since_by_id)
+            for task_id, since in since_by_id.items():
+                task = tasks.get(task_id)
+                if task is None:
+                    missing.append(task_id)
+                elif since is None or task.updated_at > since:
+                    changed.append(task)
+        return changed, missing
+    
+    def wait_for_task_change(self, task_id: str, version: Optional[int], timeout: float) -> Optional[Task]:
+        """
+        Long-poll: zwraca task, gdy jego wersja jest inna niż podana (od razu, jeśli już jest),
+        albo po upływie timeout. Budzony tylko przez zmiany tego taska.
+        """
+        key = _task_key(task_id)
+        with self.lock:
+            task = self.store.get_task(task_id)
+            if task is None or version is None or task.version != version or task.is_finished:
+                return task
+            event = self._watch(key)
+        
+        self._wait(event, timeout, lambda: self._task_version(task_id) != version)
+        
+        with self.lock:
+            self._unwatch(key, event)
+            return self.store.get_task(task_id)
+    
+    def wait_for_session_change(self, session_id: str, version: Optional[int],
+                                timeout: float) -> Tuple[int, List[Task]]:
+        """Long-poll dla całej sesji: zwraca (wersja sesji, taski) po zmianie dowolnego taska sesji lub po timeout"""
+        key = _session_key(session_id)
+        with self.lock:
+            current = self.store.get_session_version(session_id)
+            if version is None or current != version:
+                return current, self.store.get_session_tasks(session_id)
+            event = self._watch(key)
+        
+        self._wait(event, timeout, lambda: self.store.get_session_version(session_id) != version)
+        
+        with self.lock:
+            self._unwatch(key, event)
+            return self.store.get_session_version(session_id), self.store.get_session_tasks(session_id)
+    
+    def _wait(self, event: threading.Event, timeout: float, changed: Callable[[], bool]):
+        """
+        Czeka na obudzenie albo timeout. Jeśli magazyn nie zgłasza zmian innych procesów (poll_interval),
+        co poll_interval sprawdza changed() - zmiana zrobiona w innym procesie też kończy oczekiwanie.
+        """
+        poll_interval = self.store.poll_interval
+        if not poll_interval:
+            event.wait(timeout)
+            return
+        
+        deadline = time.monotonic() + timeout
+        while not event.wait(min(poll_interval, max(deadline - time.monotonic(), 0))):
+            if changed() or time.monotonic() >= deadline:
+                return
+    
+    def _task_version(self, task_id: str) -> Optional[int]:
+        task = self.store.get_task(task_id)
+        return task.version if task else None
+    
+    def _watch(self, key: str) -> threading.Event:
+        """Rejestruje oczekującego klienta (wywoływane pod self.lock)"""
+        event = threading.Event()
+        self.watchers.setdefault(key, set()).add(event)
+        return event
+    
+    def _unwatch(self, key: str, event: threading.Event):
+        """Wyrejestrowuje klienta (wywoływane pod self.lock)"""
+        events = self.watchers.get(key)
+        if events is not None:
+            events.discard(event)
+            if not events:
+                del self.watchers[key]
+    
+    def _notify(self, key: str):
+        """Budzi klientów czekających na klucz (wywoływane pod self.lock)"""
+        for event in self.watchers.pop(key, ()):
+            event.set()
+    
+    def _notify_session(self, session_id: str):
+        """Zwiększa wersję sesji (w magazynie) i budzi jej obserwatorów (wywoływane pod self.lock)"""
+        self.store.bump_session_version(session_id)
+        self._notify(_session_key(session_id))
     
     def cleanup_old_tasks(self, hours: int = None):
         """Usuwa stare taski"""
@@ -52,49 +280,45 @@ class TaskService:
         cutoff_time = datetime.now() - timedelta(hours=hours)
         
         with self.lock:
-            expired_tasks = [
-                task_id for task_id, task in self.tasks.items()
-                if task.created_at < cutoff_time
-            ]
-            
-            for task_id in expired_tasks:
-                del self.tasks[task_id]
+            removed = self.store.remove_expired(cutoff_time)
+            for task_id in removed:
+                self._notify(_task_key(task_id))
         
-        return len(expired_tasks)
+        return len(removed)
     
     def get_session_tasks(self, session_id: str) -> List[Task]:
         """Pobiera wszystkie taski dla sesji"""
         with self.lock:
-            return [task for task in self.tasks.values() if task.session_id == session_id]
+            return self.store.get_session_tasks(session_id)
     
     def clear_session_tasks(self, session_id: str) -> int:
         """Usuwa wszystkie taski z sesji"""
         with self.lock:
-            tasks_to_remove = [
-                task_id for task_id, task in self.tasks.items()
-                if task.session_id == session_id
-            ]
-            
-            for task_id in tasks_to_remove:
-                del self.tasks[task_id]
+            removed = self.store.remove_session(session_id)
+            for task_id in removed:
+                self._notify(_task_key(task_id))
+            # Magazyn usunął też wersję sesji (zmiana na 0) - wystarczy obudzić obserwatorów
+            self._notify(_session_key(session_id))
         
-        return len(tasks_to_remove)
+        return len(removed)
     
     def get_tasks_stats(self) -> Dict[str, int]:
         """Zwraca statystyki tasków"""
         with self.lock:
-            stats = {
-                'total': len(self.tasks),
-                'pending': 0,
-                'processing': 0,
-                'completed': 0,
-                'failed': 0
-            }
-            
-            for task in self.tasks.values():
-                stats[task.status.value] += 1
-            
-            return stats
+            counts = self.store.count_by_status()
+        stats = {'total': sum(counts.values())}
+        stats.update(counts)
+        return stats
+    
+    def close(self):
+        """Zapisuje i zamyka magazyn tasków"""
+        self.store.close()
+
+def _task_key(task_id: str) -> str:
+    return f"task:{task_id}"
+
+def _session_key(session_id: str) -> str:
+    return f"session:{session_id}"
 
 # Singleton instance
 task_service = TaskService()
\ No newline at end of file
@@ -0,0 +1,689 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from ..config import config
+from ..models.task import Task, TaskStatus
+from ..models.batch import Batch
+from ..services.redis_client import get_redis_client, redis_key
+
+logger = logging.getLogger(__name__)
+
+STORE_MEMORY = "memory"
+STORE_SQLITE = "sqlite"
+STORE_REDIS = "redis"
+
+class TaskStore:
+    """
+    Magazyn tasków i batchy używany przez TaskService.
+    Metody zmieniające stan są wywoływane pod lockiem TaskService; odczyty mogą być wywoływane bez niego.
+    Zwracane obiekty wolno zmieniać tylko razem z późniejszym save_task/save_batch.
+    """
+
+    # Co ile sekund oczekujący klienci sprawdzają magazyn sami - dla magazynów wspólnych
+    # dla procesów, które nie zgłaszają zmian innych procesów przez listen (None - nie trzeba)
+    poll_interval: Optional[float] = None
+
+    def add_tasks(self, tasks: List[Task]):
+        raise NotImplementedError
+
+    def save_task(self, task: Task, previous_status: TaskStatus, previous_version: int) -> bool:
+        """
+        Zapisuje zmieniony task. Zwraca False (bez zapisu), gdy zapisana wersja nie jest już
+        previous_version - task zmienił w międzyczasie inny proces/host.
+        """
+        raise NotImplementedError
+
+    def get_task(self, task_id: str) -> Optional[Task]:
+        raise NotImplementedError
+
+    def get_tasks(self, task_ids: Iterable[str]) -> Dict[str, Task]:
+        raise NotImplementedError
+
+    def get_session_tasks(self, session_id: str) -> List[Task]:
+        raise NotImplementedError
+
+    def save_batch(self, batch: Batch):
+        raise NotImplementedError
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        raise NotImplementedError
+
+    def remove_session(self, session_id: str) -> List[str]:
+        """Usuwa taski i batche sesji, zwraca ID usuniętych tasków"""
+        raise NotImplementedError
+
+    def remove_expired(self, cutoff: datetime) -> List[str]:
+        """Usuwa taski i batche utworzone przed cutoff, zwraca ID usuniętych tasków"""
+        raise NotImplementedError
+
+    def count_by_status(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def bump_session_version(self, session_id: str) -> int:
+        """
+        Zwiększa wersję sesji (przy każdej zmianie jej tasków) i ją zwraca. Wersja jest trzymana w magazynie,
+        więc long-poll sesji działa także wtedy, gdy kolejne requesty trafiają do innych procesów/hostów.
+        """
+        raise NotImplementedError
+
+    def get_session_version(self, session_id: str) -> int:
+        """Aktualna wersja sesji (0 dla sesji bez zmian)"""
+        raise NotImplementedError
+
+    def listen(self, callback: Callable[[str, str], None]):
+        """
+        Rejestruje callback(task_id, session_id) wywoływany przy zmianach zrobionych przez inne
+        procesy/hosty. Magazyny lokalne nie mają takich zmian.
+        """
+        pass
+
+    def close(self):
+        pass
+
+class MemoryTaskStore(TaskStore):
+    """
+    Taski w pamięci procesu z indeksami: sesja -> ID tasków i batchy, kolejka wygasania
+    w kolejności tworzenia i liczniki statusów. Zapytania o sesję, statystyki i sprzątanie
+    kosztują tyle, ile wynik, a nie tyle, ile wszystkich tasków.
+    Odczyty pojedynczych tasków nie potrzebują locka - wyszukanie w dict jest atomowe pod GIL.
+    """
+
+    def __init__(self):
+        self.tasks: Dict[str, Task] = {}
+        self.batches: Dict[str, Batch] = {}
+        # Sesja -> ID tasków (dict jako uporządkowany zbiór) i ID batchy
+        self.session_tasks: Dict[str, Dict[str, None]] = {}
+        self.session_batches: Dict[str, Dict[str, None]] = {}
+        # (created_at, ID) w kolejności dodania - sprzątanie zdejmuje tylko przeterminowany początek
+        self.task_expiry: Deque[Tuple[datetime, str]] = deque()
+        self.batch_expiry: Deque[Tuple[datetime, str]] = deque()
+        self.status_counts: Dict[str, int] = {status.value: 0 for status in TaskStatus}
+        # Sesja -> wersja w kolejności ostatniej zmiany (sprzątanie zdejmuje przeterminowany początek)
+        self.session_versions: "OrderedDict[str, int]" = OrderedDict()
+
+    def add_tasks(self, tasks: List[Task]):
+        for task in tasks:
+            self.tasks[task.id] = task
+            self.session_tasks.setdefault(task.session_id, {})[task.id] = None
+            self.task_expiry.append((task.created_at, task.id))
+            self.status_counts[task.status.value] += 1
+
+    def save_task(self, task: Task, previous_status: TaskStatus, previous_version: int) -> bool:
+        # Task jest zmieniany w miejscu - zostaje tylko przeliczyć liczniki
+        self.status_counts[previous_status.value] -= 1
+        self.status_counts[task.status.value] += 1
+        return True
+
+    def get_task(self, task_id: str) -> Optional[Task]:
+        return self.tasks.get(task_id)
+
+    def get_tasks(self, task_ids: Iterable[str]) -> Dict[str, Task]:
+        return {task_id: self.tasks[task_id] for task_id in task_ids if task_id in self.tasks}
+
+    def get_session_tasks(self, session_id: str) -> List[Task]:
+        return [self.tasks[task_id] for task_id in self.session_tasks.get(session_id, ())]
+
+    def save_batch(self, batch: Batch):
+        if batch.id not in self.batches:
+            self.session_batches.setdefault(batch.session_id, {})[batch.id] = None
+            self.batch_expiry.append((batch.created_at, batch.id))
+        self.batches[batch.id] = batch
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        return self.batches.get(batch_id)
+
+    def remove_session(self, session_id: str) -> List[str]:
+        removed = list(self.session_tasks.get(session_id, ()))
+        for task_id in removed:
+            self._remove_task(task_id)
+        for batch_id in list(self.session_batches.get(session_id, ())):
+            self._remove_batch(batch_id)
+        self.session_versions.pop(session_id, None)
+        return removed
+
+    def remove_expired(self, cutoff: datetime) -> List[str]:
+        removed = []
+        # Kolejki są w kolejności tworzenia - wystarczy zdjąć przeterminowany początek.
+        # Wpisy tasków usuniętych wcześniej (remove_session) są tu po prostu pomijane.
+        while self.task_expiry and self.task_expiry[0][0] < cutoff:
+            _, task_id = self.task_expiry.popleft()
+            if self._remove_task(task_id):
+                removed.append(task_id)
+
+        while self.batch_expiry and self.batch_expiry[0][0] < cutoff:
+            _, batch_id = self.batch_expiry.popleft()
+            self._remove_batch(batch_id)
+
+        # Wersja to czas ostatniej zmiany sesji - sesja bez zmian od cutoff ma już tylko usunięte taski
+        version_cutoff = int(cutoff.timestamp() * 1e6)
+        while self.session_versions:
+            session_id, version = next(iter(self.session_versions.items()))
+            if version >= version_cutoff:
+                break
+            del self.session_versions[session_id]
+        return removed
+
+    def count_by_status(self) -> Dict[str, int]:
+        return dict(self.status_counts)
+
+    def bump_session_version(self, session_id: str) -> int:
+        version = _next_version(self.session_versions.pop(session_id, 0))
+        self.session_versions[session_id] = version
+        return version
+
+    def get_session_version(self, session_id: str) -> int:
+        return self.session_versions.get(session_id, 0)
+
+    def _remove_task(self, task_id: str) -> bool:
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return False
+        self.status_counts[task.status.value] -= 1
+        _discard(self.session_tasks, task.session_id, task_id)
+        return True
+
+    def _remove_batch(self, batch_id: str):
+        batch = self.batches.pop(batch_id, None)
+        if batch is not None:
+            _discard(self.session_batches, batch.session_id, batch_id)
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Trwały magazyn w SQLite (WAL) - przeżywa restart i jest wspólny dla procesów gunicorna.
+    Nowe taski, batche, zakończenia tasków i wersje sesji są zapisywane od razu, więc inne procesy
+    widzą je natychmiast. Grupowane są tylko zmiany pośrednie (np. PENDING -> PROCESSING): trafiają
+    do bufora (widocznego dla odczytów w tym procesie), a osobny wątek zapisuje je w jednej transakcji
+    (inne procesy widzą je po flushu, domyślnie do 50 ms).
+    Zapis taska nie nadpisuje zakończonego taska ani nowszej wersji zapisanej przez inny proces.
+    SQLite nie powiadamia o zmianach innych procesów - oczekujący klienci sprawdzają bazę
+    co poll_interval (TASK_STORE_POLL_MS).
+    """
+
+    def __init__(self, path: str = None, flush_interval: float = None, batch_size: int = None,
+                 poll_interval: float = None):
+        self.path = path or config.task_store_path
+        self.flush_interval = config.TASK_STORE_FLUSH_MS / 1000 if flush_interval is None else flush_interval
+        self.batch_size = batch_size or config.TASK_STORE_BATCH_SIZE
+        self.poll_interval = config.TASK_STORE_POLL_MS / 1000 if poll_interval is None else poll_interval
+        # Niezapisane jeszcze zmiany pośrednie: ID -> krotka kolumn
+        self.pending_tasks: Dict[str, tuple] = {}
+        self.pending_lock = threading.Lock()
+        # Jedno połączenie zapisujące; wszystkie zapisy są przez nie serializowane
+        self.db_lock = threading.Lock()
+        self.connection = self._connect()
+        self._create_schema()
+        self.local = threading.local()
+        # dirty - są niezapisane zmiany, full - bufor osiągnął batch_size (flush bez czekania)
+        self.dirty = threading.Event()
+        self.full = threading.Event()
+        self.closed = False
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _create_schema(self):
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_session_id ON tasks (session_id);
+            CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status);
+            CREATE INDEX IF NOT EXISTS tasks_created_at ON tasks (created_at);
+            CREATE TABLE IF NOT EXISTS batches (
+                id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS batches_session_id ON batches (session_id);
+            CREATE INDEX IF NOT EXISTS batches_created_at ON batches (created_at);
+            CREATE TABLE IF NOT EXISTS session_versions (
+                session_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS session_versions_version ON session_versions (version);
+        """)
+
+    def _reader(self) -> sqlite3.Connection:
+        """Połączenie do odczytu dla bieżącego wątku (WAL - odczyty nie czekają na zapis)"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self.local.connection = connection
+        return connection
+
+    def _write(self, sql: str, rows: Iterable[tuple]) -> int:
+        """Zapis od razu, w jednej transakcji; zwraca liczbę zmienionych wierszy"""
+        with self.db_lock:
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                return self.connection.executemany(sql, rows).rowcount
+
+    def add_tasks(self, tasks: List[Task]):
+        # Nowe taski od razu w bazie - inny proces nie może zwrócić 404 dla właśnie utworzonego taska
+        self._write(
+            "INSERT OR REPLACE INTO tasks (id, session_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+            [_task_row(task) for task in tasks]
+        )
+
+    def save_task(self, task: Task, previous_status: TaskStatus, previous_version: int) -> bool:
+        if not task.is_finished:
+            # Zmiana pośrednia - przez bufor; flush i tak nie nadpisze zakończonego ani nowszego taska
+            with self.pending_lock:
+                self.pending_tasks[task.id] = _task_row(task)
+            self._schedule_flush()
+            return True
+
+        # Zakończenie - od razu i warunkowo. Zapisana wersja może być starsza niż previous_version
+        # (zmiany pośrednie tego procesu czekające w buforze), ale nie nowsza.
+        row = _task_row(task)
+        with self.db_lock:
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                changed = self.connection.execute(
+                    f"UPDATE tasks SET status = ?, data = ? WHERE id = ? AND {_SQLITE_UNFINISHED}"
+                    " AND json_extract(data, '$.version') <= ?",
+                    (row[2], row[4], task.id, previous_version)
+                ).rowcount
+            # Bufor jest nieaktualny w obu przypadkach - po odrzuceniu ponowny odczyt ma trafić do bazy
+            with self.pending_lock:
+                self.pending_tasks.pop(task.id, None)
+        return changed == 1
+
+    def get_task(self, task_id: str) -> Optional[Task]:
+        return self.get_tasks([task_id]).get(task_id)
+
+    def get_tasks(self, task_ids: Iterable[str]) -> Dict[str, Task]:
+        task_ids = list(task_ids)
+        with self.pending_lock:
+            found = {task_id: self.pending_tasks[task_id][4] for task_id in task_ids if task_id in self.pending_tasks}
+        missing = [task_id for task_id in task_ids if task_id not in found]
+        # Limit parametrów SQLite - zapytania po 500 ID
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for task_id, data in self._reader().execute(f"SELECT id, data FROM tasks WHERE id IN ({placeholders})", chunk):
+                found.setdefault(task_id, data)
+        return {task_id: Task.from_dict(json.loads(found[task_id])) for task_id in task_ids if task_id in found}
+
+    def get_session_tasks(self, session_id: str) -> List[Task]:
+        rows = {
+            row[0]: (row[1], row[2])
+            for row in self._reader().execute(
+                "SELECT id, created_at, data FROM tasks WHERE session_id = ?", (session_id,)
+            )
+        }
+        with self.pending_lock:
+            for task_id, row in self.pending_tasks.items():
+                # Tylko taski, które są jeszcze w bazie (usunięte przez inny proces nie wracają z bufora)
+                if task_id in rows:
+                    rows[task_id] = (row[3], row[4])
+        ordered = sorted(rows.values(), key=lambda row: row[0])
+        return [Task.from_dict(json.loads(data)) for _, data in ordered]
+
+    def save_batch(self, batch: Batch):
+        self._write(
+            "INSERT OR REPLACE INTO batches (id, session_id, created_at, data) VALUES (?, ?, ?, ?)",
+            [(batch.id, batch.session_id, batch.created_at.timestamp(), json.dumps(batch.to_record()))]
+        )
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        found = self._reader().execute("SELECT data FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        return Batch.from_record(json.loads(found[0])) if found else None
+
+    def bump_session_version(self, session_id: str) -> int:
+        # Od razu i w jednym zapytaniu - wersja rośnie także przy zmianach z kilku procesów naraz
+        with self.db_lock:
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                return self.connection.execute(
+                    "INSERT INTO session_versions (session_id, version) VALUES (?, ?)"
+                    " ON CONFLICT (session_id) DO UPDATE SET version = MAX(version + 1, excluded.version)"
+                    " RETURNING version",
+                    (session_id, _next_version(0))
+                ).fetchone()[0]
+
+    def get_session_version(self, session_id: str) -> int:
+        found = self._reader().execute(
+            "SELECT version FROM session_versions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return found[0] if found else 0
+
+    def remove_session(self, session_id: str) -> List[str]:
+        removed = self._remove("session_id = ?", (session_id,), lambda row: row[1] == session_id)
+        self._write("DELETE FROM session_versions WHERE session_id = ?", [(session_id,)])
+        return removed
+
+    def remove_expired(self, cutoff: datetime) -> List[str]:
+        timestamp = cutoff.timestamp()
+        removed = self._remove("created_at < ?", (timestamp,), lambda row: row[3] < timestamp)
+        # Wersja to czas ostatniej zmiany sesji - sesja bez zmian od cutoff ma już tylko usunięte taski
+        self._write("DELETE FROM session_versions WHERE version < ?", [(int(timestamp * 1e6),)])
+        return removed
+
+    def _remove(self, where: str, args: tuple, matches) -> List[str]:
+        """
+        Usuwa pasujące taski i batche z bufora i z bazy. matches(wiersz bufora) wybiera wiersze bufora.
+        Całość pod db_lock, żeby trwający flush nie przywrócił usuniętych wierszy.
+        """
+        with self.db_lock:
+            with self.pending_lock:
+                removed = [task_id for task_id, row in self.pending_tasks.items() if matches(row)]
+                for task_id in removed:
+                    del self.pending_tasks[task_id]
+
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                stored = [row[0] for row in self.connection.execute(f"SELECT id FROM tasks WHERE {where}", args)]
+                self.connection.execute(f"DELETE FROM tasks WHERE {where}", args)
+                self.connection.execute(f"DELETE FROM batches WHERE {where}", args)
+        return list(dict.fromkeys(removed + stored))
+
+    def count_by_status(self) -> Dict[str, int]:
+        # Statystyki liczone z bazy (indeks po statusie) - najpierw zapisz bufor
+        self.flush()
+        counts = {status.value: 0 for status in TaskStatus}
+        for status, count in self._reader().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    def _schedule_flush(self):
+        self.dirty.set()
+        if len(self.pending_tasks) >= self.batch_size:
+            self.full.set()
+
+    def _write_loop(self):
+        while not self.closed:
+            self.dirty.wait()
+            # Zmiany są zbierane przez flush_interval, chyba że bufor zapełni się wcześniej
+            self.full.wait(self.flush_interval)
+            self.dirty.clear()
+            self.full.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Task store flush failed: {e}")
+
+    def flush(self):
+        """Zapisuje bufor zmian pośrednich w jednej transakcji"""
+        with self.db_lock:
+            with self.pending_lock:
+                tasks = dict(self.pending_tasks)
+            if not tasks:
+                return
+
+            # Tylko istniejące, niezakończone taski ze starszą wersją - zmiana pośrednia nie przywraca
+            # usuniętego taska ani nie nadpisuje zakończenia lub nowszej zmiany z innego procesu
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                self.connection.executemany(
+                    f"UPDATE tasks SET status = ?, data = ? WHERE id = ? AND {_SQLITE_UNFINISHED}"
+                    " AND json_extract(data, '$.version') < json_extract(?, '$.version')",
+                    [(row[2], row[4], task_id, row[4]) for task_id, row in tasks.items()]
+                )
+
+            # Wiersze zostają w buforze do commitu - odczyty nie widzą przerwy między buforem a bazą.
+            # Usuwane są tylko te, których nikt w międzyczasie nie nadpisał.
+            with self.pending_lock:
+                for task_id, row in tasks.items():
+                    if self.pending_tasks.get(task_id) is row:
+                        del self.pending_tasks[task_id]
+
+    def close(self):
+        self.closed = True
+        self.dirty.set()
+        self.full.set()
+        self.writer.join(timeout=5)
+        self.flush()
+        self.connection.close()
+
+class RedisTaskStore(TaskStore):
+    """
+    Stan tasków w Redis, wspólny dla wszystkich procesów i hostów API oraz workerów.
+    Task to JSON pod kluczem task:<id>; indeksy: sesja -> ZSET ID po czasie utworzenia,
+    ZSET wygasania i HASH liczników statusów. Każda zmiana jest publikowana na kanale events,
+    żeby inne procesy mogły obudzić swoich klientów long-poll/SSE.
+    """
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else get_redis_client()
+        # Identyfikator tego magazynu - własne zdarzenia z kanału są pomijane
+        self.origin = uuid.uuid4().hex
+        self.channel = redis_key("events")
+        self.pubsub = None
+        self.listener = None
+
+    def _task_key(self, task_id: str) -> str:
+        return redis_key("task", task_id)
+
+    def _batch_key(self, batch_id: str) -> str:
+        return redis_key("batch", batch_id)
+
+    def _session_tasks_key(self, session_id: str) -> str:
+        return redis_key("session_tasks", session_id)
+
+    def _session_batches_key(self, session_id: str) -> str:
+        return redis_key("session_batches", session_id)
+
+    def _session_version_key(self, session_id: str) -> str:
+        return redis_key("session_version", session_id)
+
+    def _publish(self, pipe, task_id: str, session_id: str):
+        pipe.publish(self.channel, json.dumps({"origin": self.origin, "task_id": task_id, "session_id": session_id}))
+
+    def add_tasks(self, tasks: List[Task]):
+        pipe = self.client.pipeline()
+        for task in tasks:
+            pipe.set(self._task_key(task.id), json.dumps(task.to_dict(include_timings=True)))
+            pipe.zadd(self._session_tasks_key(task.session_id), {task.id: task.created_at.timestamp()})
+            pipe.zadd(redis_key("task_expiry"), {task.id: task.created_at.timestamp()})
+            pipe.hincrby(redis_key("status_counts"), task.status.value, 1)
+        for session_id in {task.session_id for task in tasks}:
+            self._publish(pipe, "", session_id)
+        pipe.execute()
+
+    def save_task(self, task: Task, previous_status: TaskStatus, previous_version: int) -> bool:
+        """Compare-and-set po wersji (WATCH/MULTI) - liczniki statusów zmieniają się tylko razem z udanym zapisem"""
+        from redis.exceptions import WatchError
+
+        key = self._task_key(task.id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                data = pipe.get(key)
+                if not data or json.loads(data).get("version", 0) != previous_version:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.set(key, json.dumps(task.to_dict(include_timings=True)))
+                if previous_status != task.status:
+                    pipe.hincrby(redis_key("status_counts"), previous_status.value, -1)
+                    pipe.hincrby(redis_key("status_counts"), task.status.value, 1)
+                self._publish(pipe, task.id, task.session_id)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def get_task(self, task_id: str) -> Optional[Task]:
+        data = self.client.get(self._task_key(task_id))
+        return Task.from_dict(json.loads(data)) if data else None
+
+    def get_tasks(self, task_ids: Iterable[str]) -> Dict[str, Task]:
+        task_ids = list(task_ids)
+        if not task_ids:
+            return {}
+        values = self.client.mget([self._task_key(task_id) for task_id in task_ids])
+        return {task_id: Task.from_dict(json.loads(data)) for task_id, data in zip(task_ids, values) if data}
+
+    def get_session_tasks(self, session_id: str) -> List[Task]:
+        task_ids = [_text(task_id) for task_id in self.client.zrange(self._session_tasks_key(session_id), 0, -1)]
+        tasks = self.get_tasks(task_ids)
+        return [tasks[task_id] for task_id in task_ids if task_id in tasks]
+
+    def save_batch(self, batch: Batch):
+        pipe = self.client.pipeline()
+        pipe.set(self._batch_key(batch.id), json.dumps(batch.to_record()))
+        pipe.sadd(self._session_batches_key(batch.session_id), batch.id)
+        pipe.zadd(redis_key("batch_expiry"), {batch.id: batch.created_at.timestamp()})
+        pipe.execute()
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        data = self.client.get(self._batch_key(batch_id))
+        return Batch.from_record(json.loads(data)) if data else None
+
+    def remove_session(self, session_id: str) -> List[str]:
+        task_ids = [_text(task_id) for task_id in self.client.zrange(self._session_tasks_key(session_id), 0, -1)]
+        batch_ids = [_text(batch_id) for batch_id in self.client.smembers(self._session_batches_key(session_id))]
+        removed = self._remove_tasks(task_ids)
+        self._remove_batches(batch_ids)
+        # Klucz wersji wygasa sam - tu tylko zmiana wersji dla obserwatorów wyczyszczonej sesji
+        self.bump_session_version(session_id)
+        return removed
+
+    def remove_expired(self, cutoff: datetime) -> List[str]:
+        timestamp = cutoff.timestamp()
+        task_ids = [_text(task_id) for task_id in self.client.zrangebyscore(redis_key("task_expiry"), "-inf", f"({timestamp}")]
+        batch_ids = [_text(batch_id) for batch_id in self.client.zrangebyscore(redis_key("batch_expiry"), "-inf", f"({timestamp}")]
+        removed = self._remove_tasks(task_ids)
+        self._remove_batches(batch_ids)
+        return removed
+
+    def _remove_tasks(self, task_ids: List[str]) -> List[str]:
+        """
+        Usuwa taski razem z licznikami statusów w jednej transakcji (WATCH/MULTI). Zmiana statusu albo
+        usunięcie tych samych tasków przez inny proces w międzyczasie powoduje ponowną próbę, więc licznik
+        jest zmniejszany raz i dla statusu, z którym task został usunięty.
+        """
+        from redis.exceptions import WatchError
+
+        removed = []
+        # Po 500 ID - transakcja nie obejmuje naraz całej kolejki wygasania
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            keys = [self._task_key(task_id) for task_id in chunk]
+            with self.client.pipeline() as pipe:
+                while True:
+                    try:
+                        pipe.watch(*keys)
+                        tasks = [
+                            Task.from_dict(json.loads(data))
+                            for data in pipe.mget(keys) if data
+                        ]
+                        pipe.multi()
+                        for task in tasks:
+                            pipe.delete(self._task_key(task.id))
+                            pipe.zrem(self._session_tasks_key(task.session_id), task.id)
+                            pipe.hincrby(redis_key("status_counts"), task.status.value, -1)
+                            self._publish(pipe, task.id, task.session_id)
+                        pipe.zrem(redis_key("task_expiry"), *chunk)
+                        pipe.execute()
+                        removed.extend(task.id for task in tasks)
+                        break
+                    except WatchError:
+                        continue
+        return removed
+
+    def _remove_batches(self, batch_ids: List[str]):
+        if not batch_ids:
+            return
+        values = self.client.mget([self._batch_key(batch_id) for batch_id in batch_ids])
+        pipe = self.client.pipeline()
+        for batch_id, data in zip(batch_ids, values):
+            if data:
+                pipe.srem(self._session_batches_key(json.loads(data)["session_id"]), batch_id)
+            pipe.delete(self._batch_key(batch_id))
+        pipe.zrem(redis_key("batch_expiry"), *batch_ids)
+        pipe.execute()
+
+    def count_by_status(self) -> Dict[str, int]:
+        counts = {status.value: 0 for status in TaskStatus}
+        for status, count in self.client.hgetall(redis_key("status_counts")).items():
+            counts[_text(status)] = int(count)
+        return counts
+
+    def bump_session_version(self, session_id: str) -> int:
+        # INCR na wspólnym kluczu; klucz wygasa razem z sesją i nie jest usuwany wcześniej,
+        # żeby wersja sesji wyczyszczonej i użytej ponownie nie wróciła do starej wartości
+        key = self._session_version_key(session_id)
+        pipe = self.client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, config.SESSION_TIMEOUT_HOURS * 3600)
+        version, _ = pipe.execute()
+        return int(version)
+
+    def get_session_version(self, session_id: str) -> int:
+        version = self.client.get(self._session_version_key(session_id))
+        return int(version) if version else 0
+
+    def listen(self, callback: Callable[[str, str], None]):
+        def handle(message):
+            try:
+                event = json.loads(message["data"])
+                if event["origin"] != self.origin:
+                    callback(event["task_id"], event["session_id"])
+            except Exception as e:
+                logger.error(f"Error handling task store event: {e}")
+
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(**{self.channel: handle})
+        self.listener = self.pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.pubsub.close()
+
+def create_task_store(backend: str = None) -> TaskStore:
+    """Magazyn tasków wybrany w config.TASK_STORE"""
+    backend = backend or config.TASK_STORE
+    if backend == STORE_SQLITE:
+        logger.info(f"Using SQLite task store: {config.task_store_path}")
+        return SQLiteTaskStore()
+    if backend == STORE_REDIS:
+        logger.info(f"Using Redis task store: {config.REDIS_URL}")
+        return RedisTaskStore()
+    if backend != STORE_MEMORY:
+        raise ValueError(f"Unknown task store: {backend}")
+    return MemoryTaskStore()
+
+# Warunek SQL: task nie jest zakończony (zakończonego nie nadpisuje żaden zapis)
+_SQLITE_UNFINISHED = "status NOT IN ('{}', '{}', '{}')".format(
+    TaskStatus.COMPLETED.value, TaskStatus.FAILED.value, TaskStatus.CANCELLED.value
+)
+
+def _task_row(task: Task) -> tuple:
+    return (task.id, task.session_id, task.status.value, task.created_at.timestamp(), json.dumps(task.to_dict(include_timings=True)))
+
+def _next_version(current: int) -> int:
+    """
+    Wersja sesji: czas zmiany w mikrosekundach - rośnie także między procesami i po usunięciu sesji,
+    a mieści się w 2^53 (liczba w JSON czytana przez przeglądarkę bez utraty precyzji)
+    """
+    return max(current + 1, time.time_ns() // 1000)
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+def _discard(index: Dict[str, Dict[str, None]], key: str, item_id: str):
+    items = index.get(key)
+    if items is not None:
+        items.pop(item_id, None)
+        if not items:
+            del index[key]
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "id-maker"
+SCOPE_NAME = "idmaker"
+
+# Rodzaje spanów OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+# Status spanu OTLP
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+TRACE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+def new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+def new_span_id() -> str:
+    return os.urandom(8).hex()
+
+def parse_traceparent(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """(trace ID, span ID rodzica) z nagłówka W3C traceparent; (None, None) jeśli brak/niepoprawny"""
+    match = TRACEPARENT_RE.match((value or "").strip().lower())
+    return (match.group(1), match.group(2)) if match else (None, None)
+
+def parse_trace_id(value: Optional[str]) -> Optional[str]:
+    """Samo 32-znakowe trace ID (nagłówek X-Trace-Id, parametr trace_id); None jeśli niepoprawne"""
+    value = (value or "").strip().lower()
+    return value if TRACE_ID_RE.match(value) else None
+
+def current_trace() -> Tuple[Optional[str], Optional[str]]:
+    """(trace ID, span ID) bieżącego requestu - rodzic spanów tworzonych w trakcie jego obsługi"""
+    from flask import g, has_request_context
+    if not has_request_context():
+        return None, None
+    span = g.get("request_span")
+    return g.get("trace_id"), span.span_id if span is not None else None
+
+def unix_nano(moment: datetime) -> int:
+    """Czas z Task (lokalny, bez strefy) jako nanosekundy epoki"""
+    return int(moment.timestamp() * 1e9)
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 kind: int = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+class Tracer:
+    """
+    Zapisuje spany do lokalnego pliku JSON-lines. Każda linia to ExportTraceServiceRequest
+    w kształcie OTLP JSON (resourceSpans -> scopeSpans -> spans), więc plik można wczytać
+    eksporterem/collectorem OTLP. Wyłączony (TRACING_ENABLED=false) nic nie zapisuje.
+    """
+
+    def __init__(self, path: str = None, enabled: bool = None):
+        self._path = path
+        self.enabled = config.TRACING_ENABLED if enabled is None else enabled
+        self.writer: Optional[logging.Logger] = None
+        self.lock = threading.Lock()
+
+    def _get_writer(self) -> logging.Logger:
+        with self.lock:
+            if self.writer is None:
+                handler = RotatingFileHandler(
+                    self._path or config.trace_file,
+                    maxBytes=config.TRACE_FILE_MAX_MB * 1024 * 1024,
+                    backupCount=3
+                )
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                writer = logging.getLogger(f"{__name__}.spans.{id(self)}")
+                writer.propagate = False
+                writer.setLevel(logging.INFO)
+                writer.addHandler(handler)
+                self.writer = writer
+            return self.writer
+
+    def start_span(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                   kind: int = SPAN_KIND_INTERNAL, **attributes) -> Span:
+        return Span(name, trace_id, parent_id, kind, attributes)
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = str(error) or type(error).__name__
+        self.export([span])
+
+    @contextmanager
+    def span(self, name: str, trace_id: Optional[str], parent_id: Optional[str] = None, **attributes):
+        """Span wokół bloku kodu; bez trace_id (albo z wyłączonym tracingiem) tylko wykonuje blok"""
+        if not self.enabled or not trace_id:
+            yield None
+            return
+        span = self.start_span(name, trace_id, parent_id, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        self.end_span(span)
+
+    def record(self, name: str, trace_id: str, parent_id: Optional[str], start_ns: int, end_ns: int,
+               span_id: Optional[str] = None, error: Optional[str] = None, **attributes) -> Span:
+        """Span zmierzony wcześniej (np. etap w procesie workera) - zwracany do eksportu razem z innymi"""
+        span = Span(name, trace_id, parent_id, SPAN_KIND_INTERNAL, attributes)
+        if span_id:
+            span.span_id = span_id
+        span.start_ns = start_ns
+        span.end_ns = end_ns
+        span.error = error
+        return span
+
+    def export(self, spans: List[Span]):
+        if not self.enabled or not spans:
+            return
+        try:
+            self._get_writer().info(json.dumps(_otlp_request(spans), separators=(',', ':')))
+        except Exception as e:
+            logger.error(f"Failed to export spans: {e}")
+
+    def trace_task(self, task):
+        """
+        Spany zakończonego taska: task (utworzenie -> koniec), queue_wait (oczekiwanie na workera),
+        process_image (przetwarzanie) i po jednym spanie na etap id_maker z Task.stage_timings.
+        """
+        if not self.enabled or not task.trace_id:
+            return
+        end = task.completed_at or task.updated_at
+        error = task.error_message if task.status.value != "completed" else None
+        root = self.record("task", task.trace_id, task.trace_parent_id, unix_nano(task.created_at), unix_nano(end),
+                           error=error, **{"task.id": task.id, "task.status": task.status.value,
+                                           "session.id": task.session_id, "document.type": task.document_type})
+        spans = [root]
+        if task.started_at:
+            spans.append(self.record("queue_wait", task.trace_id, root.span_id,
+                                     unix_nano(task.created_at), unix_nano(task.started_at)))
+            processing = self.record("process_image", task.trace_id, root.span_id,
+                                     unix_nano(task.started_at), unix_nano(end), error=error)
+            spans.append(processing)
+            for stage, timing in (task.stage_timings or {}).items():
+                start = timing.get("start_unix_nano")
+                if start is None:
+                    continue
+                spans.append(self.record(
+                    f"id_maker.{stage}", task.trace_id, processing.span_id,
+                    start, start + int(timing["wall_seconds"] * 1e9),
+                    **{"cpu_seconds": timing.get("cpu_seconds"), "rss_peak_delta_mb": timing.get("rss_peak_delta_mb")}
+                ))
+        self.export(spans)
+
+def _otlp_request(spans: List[Span]) -> Dict[str, Any]:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": SERVICE_NAME, "process.pid": os.getpid()})},
+            "scopeSpans": [{
+                "scope": {"name": SCOPE_NAME},
+                "spans": [_otlp_span(span) for span in spans]
+            }]
+        }]
+    }
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    data = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        # OTLP JSON koduje liczby 64-bitowe jako stringi
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": _attributes(span.attributes),
+        "status": {"code": STATUS_ERROR, "message": span.error} if span.error else {"code": STATUS_OK}
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    return data
+
+def _attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    attributes = []
+    for key, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        attributes.append({"key": key, "value": typed})
+    return attributes
+
+# Singleton instance
+tracer = Tracer()
@@ -1,4 +1,5 @@
 from functools import wraps
+import hmac
 from flask import request, jsonify, g
 import time
 from collections import defaultdict, deque
@@ -6,6 +7,7 @@ from threading import Lock
 import logging
 
 from ..config import config
+from ..services.prometheus import prometheus_metrics
 from .validators import validate_session_id
 
 # Rate limiting storage
@@ -42,12 +44,13 @@ def rate_limit(max_requests: int = None, window_minutes: int = 1):
                 # Sprawdź limit
                 if len(rate_limit_storage[client_ip]) >= max_requests:
                     logger.warning(f"Rate limit exceeded for IP: {client_ip}")
+                    prometheus_metrics.rate_limited.inc(route=_route())
                     return jsonify({
                         'error': 'Zbyt dużo zapytań',
                         'retry_after': int(window_minutes * 60),
                         'max_requests': max_requests,
                         'window_minutes': window_minutes
-                    }), 429
+                    }), 429, {'Retry-After': str(int(window_minutes * 60))}
                 
                 # Dodaj current request
                 rate_limit_storage[client_ip].append(current_time)
@@ -56,6 +59,45 @@ def rate_limit(max_requests: int = None, window_minutes: int = 1):
         return decorated_function
     return decorator
 
+def admission_control(f):
+    """
+    Odrzuca request z 503 i Retry-After, gdy kolejka przetwarzania jest pełna (przed odczytem plików).
+    Batch i archiwum dodatkowo rezerwują miejsce na wszystkie swoje joby (image_service.reserve).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        from ..services.image_service import image_service
+
+        retry_after = image_service.admission_retry_after()
+        if retry_after is not None:
+            return queue_full_response(retry_after)
+        
+        return f(*args, **kwargs)
+    return decorated_function
+
+def queue_full_response(retry_after: int):
+    """Odpowiedź 503 z Retry-After dla pełnej kolejki przetwarzania"""
+    logger.warning(f"Processing queue full, rejecting {request.path} (retry after {retry_after}s)")
+    prometheus_metrics.admission_rejected.inc(route=_route())
+    return jsonify({
+        'error': 'Serwer jest przeciążony, spróbuj ponownie później',
+        'retry_after': retry_after
+    }), 503, {'Retry-After': str(retry_after)}
+
+def require_admin(f):
+    """Dostęp tylko z nagłówkiem X-Admin-Token równym ADMIN_TOKEN (bez skonfigurowanego tokenu - 403)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not config.ADMIN_TOKEN:
+            return jsonify({'error': 'Admin API is disabled'}), 403
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+            logger.warning(f"Rejected admin request to {request.path}")
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        return f(*args, **kwargs)
+    return decorated_function
+
 def validate_session(required: bool = True):
     """Waliduje session_id z request"""
     def decorator(f):
@@ -90,16 +132,29 @@ def log_request(f):
         try:
             result = f(*args, **kwargs)
             duration = time.time() - start_time
+            status = result[1] if isinstance(result, tuple) else getattr(result, 'status_code', 200)
             
             logger.info(f"{request.method} {request.path} - {client_ip} - "
-                       f"{result[1] if isinstance(result, tuple) else 200} - {duration:.3f}s")
+                       f"{status} - {duration:.3f}s")
+            _observe_latency(duration, status)
             return result
         except Exception as e:
             duration = time.time() - start_time
             logger.error(f"{request.method} {request.path} - {client_ip} - ERROR - {duration:.3f}s - {str(e)}")
+            _observe_latency(duration, 500)
             raise
     return decorated_function
 
+def _route() -> str:
+    """Szablon route (np. /api/status/<task_id>) - etykieta metryk o ograniczonej liczbie wartości"""
+    return request.url_rule.rule if request.url_rule is not None else request.path
+
+def _observe_latency(duration: float, status):
+    # Dla odpowiedzi strumieniowych (SSE, ZIP) to czas do rozpoczęcia odpowiedzi
+    prometheus_metrics.request_latency.observe(
+        duration, blueprint=request.blueprint or "", route=_route(), method=request.method, status=status
+    )
+
 def handle_errors(f):
     """Decorator do obsługi błędów"""
     @wraps(f)
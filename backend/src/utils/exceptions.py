@@ -14,4 +14,8 @@ class RateLimitException(Exception):
 
 class TaskNotFoundException(Exception):
     """Wyjątek gdy task nie został znaleziony"""
-    pass
\ No newline at end of file
+    pass
+
+class TaskCancelledException(Exception):
+    """Wyjątek przerywający przetwarzanie anulowanego taska (między etapami pipeline)"""
+    pass
@@ -59,4 +59,11 @@ def cleanup_filesystem(folder: str, max_age_hours: int):
 
 def get_filename_from_path(path: str) -> str:
     """Return the filename from a given file path."""
-    return Path(path).name
\ No newline at end of file
+    return Path(path).name
+
+
+def percentile(sorted_values, fraction: float):
+    """Nearest-rank percentile of an already sorted sequence (None if empty), rounded to 3 places"""
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))], 3)
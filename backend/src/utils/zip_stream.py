@@ -0,0 +1,258 @@
+import io
+import os
+import struct
+import tempfile
+import zlib
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterator, Optional
+
+LOCAL_FILE_HEADER = b"PK\x03\x04"
+DATA_DESCRIPTOR = b"PK\x07\x08"
+# Po ostatnim wpisie: centralny katalog albo (dla pustego archiwum) rekord końca
+END_SIGNATURES = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+
+FLAG_ENCRYPTED = 0x1
+FLAG_DATA_DESCRIPTOR = 0x8
+
+ZIP64_EXTRA_ID = 0x0001
+
+CHUNK_SIZE = 64 * 1024
+# Wpisy do tego rozmiaru trzymane w pamięci, większe w pliku tymczasowym
+SPOOL_SIZE = 1024 * 1024
+
+
+class ZipStreamError(Exception):
+    """Błąd struktury archiwum - dalsze wpisy nie mogą zostać odczytane"""
+    pass
+
+
+@dataclass
+class ZipStreamEntry:
+    name: str
+    # Rozpakowana zawartość (przewinięta na początek), None jeśli wpis odrzucono
+    file: Optional[BinaryIO]
+    size: int
+    error: Optional[str] = None
+    # Dane pominięte bez rozpakowania na żądanie wywołującego (skip)
+    skipped: bool = False
+
+
+class _Reader:
+    """Bufor nad strumieniem bez seek (np. request.stream)"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.buffer = b""
+
+    def read_some(self, limit: int = CHUNK_SIZE) -> bytes:
+        if self.buffer:
+            data, self.buffer = self.buffer[:limit], self.buffer[limit:]
+            return data
+        return self.stream.read(limit)
+
+    def read_exact(self, size: int) -> bytes:
+        parts = []
+        while size > 0:
+            data = self.read_some(min(size, CHUNK_SIZE))
+            if not data:
+                raise ZipStreamError("Unexpected end of archive")
+            parts.append(data)
+            size -= len(data)
+        return b"".join(parts)
+
+    def unread(self, data: bytes):
+        self.buffer = data + self.buffer
+
+    def drain(self):
+        while self.read_some():
+            pass
+
+
+class _EntryReader:
+    """Dane jednego wpisu o znanym rozmiarze skompresowanym - odczyty nie wychodzą poza wpis"""
+
+    def __init__(self, reader: _Reader, size: int):
+        self.reader = reader
+        self.remaining = size
+
+    def read_some(self, limit: int = CHUNK_SIZE) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        data = self.reader.read_some(min(limit, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def unread(self, data: bytes):
+        self.reader.unread(data)
+        self.remaining += len(data)
+
+    def skip_rest(self):
+        """Pomija nieprzeczytane (surowe, nierozpakowywane) bajty wpisu"""
+        while self.remaining > 0:
+            data = self.reader.read_some(min(self.remaining, CHUNK_SIZE))
+            if not data:
+                raise ZipStreamError("Unexpected end of archive")
+            self.remaining -= len(data)
+
+
+def iter_zip_entries(stream: BinaryIO, max_entry_size: int,
+                     skip: Optional[Callable[[], bool]] = None) -> Iterator[ZipStreamEntry]:
+    """
+    Czyta archiwum ZIP sekwencyjnie po nagłówkach lokalnych, bez centralnego katalogu
+    i bez seek - każdy wpis jest zwracany zaraz po odczytaniu. Pamięć jest ograniczona do
+    jednego wpisu (większe niż SPOOL_SIZE trafiają do pliku tymczasowego).
+    Wpisy większe niż max_entry_size, zaszyfrowane lub z nieobsługiwaną kompresją są odrzucane.
+    Reszta za dużego wpisu jest pomijana bez rozpakowywania (rozmiar skompresowany z nagłówka);
+    za duży wpis bez tego rozmiaru (data descriptor) przerywa całe archiwum.
+    Gdy skip() zwraca True, kolejne wpisy są zwracane z samą nazwą (skipped=True), bez zapisu danych.
+    """
+    reader = _Reader(stream)
+    while True:
+        signature = reader.read_some(4)
+        if not signature:
+            return
+        if len(signature) < 4:
+            signature += reader.read_exact(4 - len(signature))
+        if signature in END_SIGNATURES:
+            reader.drain()
+            return
+        if signature != LOCAL_FILE_HEADER:
+            raise ZipStreamError("Invalid ZIP entry header")
+
+        (_, flags, method, _, _, crc, compressed_size, size,
+         name_length, extra_length) = struct.unpack("<HHHHHIIIHH", reader.read_exact(26))
+        raw_name = reader.read_exact(name_length)
+        extra = reader.read_exact(extra_length)
+        name = raw_name.decode("utf-8" if flags & 0x800 else "cp437", errors="replace")
+
+        zip64 = False
+        if compressed_size == 0xFFFFFFFF or size == 0xFFFFFFFF:
+            zip64 = True
+            size, compressed_size = _zip64_sizes(extra, size, compressed_size)
+
+        if flags & FLAG_ENCRYPTED:
+            raise ZipStreamError(f"Encrypted entries are not supported ({name})")
+        if method == METHOD_STORED and flags & FLAG_DATA_DESCRIPTOR and compressed_size == 0:
+            raise ZipStreamError(f"Stored entries without size are not supported ({name})")
+        if method not in (METHOD_STORED, METHOD_DEFLATED):
+            raise ZipStreamError(f"Unsupported compression method {method} ({name})")
+
+        # Bez data descriptor rozmiar skompresowany jest w nagłówku - wpis można pominąć bez rozpakowania
+        sized = not flags & FLAG_DATA_DESCRIPTOR or method == METHOD_STORED
+        entry_reader = _EntryReader(reader, compressed_size) if sized else reader
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        written = 0
+        actual_crc = 0
+        # Zadeklarowany rozmiar sprawdzany od razu, rzeczywisty - w trakcie rozpakowywania
+        too_large = sized and size > max_entry_size
+        skipped = skip is not None and skip() and not name.endswith("/")
+
+        # Pominięty wpis ze znanym rozmiarem nie jest rozpakowywany; bez rozmiaru koniec danych
+        # wyznacza tylko rozpakowanie (ograniczone przez max_entry_size), ale nic nie jest zapisywane
+        if not too_large and not (skipped and sized):
+            for chunk in _entry_data(entry_reader, method, compressed_size):
+                written += len(chunk)
+                if written > max_entry_size:
+                    too_large = True
+                    break
+                if not skipped:
+                    actual_crc = zlib.crc32(chunk, actual_crc)
+                    output.write(chunk)
+        if skipped:
+            output.close()
+
+        if too_large:
+            output.close()
+            if not sized:
+                # Bez rozmiaru koniec wpisu wyznacza tylko rozpakowanie - nie rozpakowujemy bomby do końca
+                raise ZipStreamError(f"Entry too large ({name})")
+        if sized:
+            entry_reader.skip_rest()
+
+        if flags & FLAG_DATA_DESCRIPTOR:
+            crc = _read_data_descriptor(reader, zip64)
+
+        if name.endswith("/"):
+            output.close()
+            continue
+
+        if skipped:
+            yield ZipStreamEntry(name=name, file=None, size=0, skipped=True)
+            continue
+
+        error = None
+        if too_large:
+            error = f"Plik za duży (max. {max_entry_size / 1024 / 1024:.1f}MB)"
+        elif actual_crc != crc:
+            output.close()
+            error = "Uszkodzony wpis archiwum (błędna suma CRC)"
+
+        if error:
+            yield ZipStreamEntry(name=name, file=None, size=written, error=error)
+        else:
+            output.seek(0)
+            yield ZipStreamEntry(name=name, file=output, size=written)
+
+
+def _entry_data(reader, method: int, compressed_size: int) -> Iterator[bytes]:
+    """Rozpakowane dane jednego wpisu"""
+    if method == METHOD_STORED:
+        remaining = compressed_size
+        while remaining > 0:
+            data = reader.read_some(min(remaining, CHUNK_SIZE))
+            if not data:
+                raise ZipStreamError("Unexpected end of archive")
+            remaining -= len(data)
+            yield data
+        return
+
+    # Deflate sam oznacza koniec strumienia - rozmiar nie jest potrzebny (wpisy z data descriptor)
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    while not decompressor.eof:
+        data = reader.read_some()
+        if not data:
+            raise ZipStreamError("Unexpected end of archive")
+        try:
+            chunk = decompressor.decompress(data, CHUNK_SIZE)
+            while True:
+                if chunk:
+                    yield chunk
+                if not decompressor.unconsumed_tail:
+                    break
+                chunk = decompressor.decompress(decompressor.unconsumed_tail, CHUNK_SIZE)
+        except zlib.error as e:
+            raise ZipStreamError(f"Corrupted deflate data: {e}")
+    reader.unread(decompressor.unused_data)
+
+
+def _read_data_descriptor(reader: _Reader, zip64: bool) -> int:
+    """Czyta data descriptor po danych wpisu, zwraca CRC"""
+    head = reader.read_exact(4)
+    if head == DATA_DESCRIPTOR:
+        head = reader.read_exact(4)
+    reader.read_exact(16 if zip64 else 8)
+    return struct.unpack("<I", head)[0]
+
+
+def _zip64_sizes(extra: bytes, size: int, compressed_size: int):
+    """Rozmiary z pola extra ZIP64 (tylko te, które w nagłówku mają wartość 0xFFFFFFFF)"""
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, length = struct.unpack_from("<HH", extra, offset)
+        if header_id == ZIP64_EXTRA_ID:
+            field = io.BytesIO(extra[offset + 4:offset + 4 + length])
+            if size == 0xFFFFFFFF:
+                size = struct.unpack("<Q", field.read(8))[0]
+            if compressed_size == 0xFFFFFFFF:
+                compressed_size = struct.unpack("<Q", field.read(8))[0]
+            break
+        offset += 4 + length
+    return size, compressed_size
+
+
+def entry_filename(name: str) -> str:
+    """Nazwa pliku wpisu bez katalogów archiwum"""
+    return os.path.basename(name.replace("\\", "/"))
@@ -0,0 +1,77 @@
+import math
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+
+pytest.importorskip("face_recognition")
+
+from majormode.photoidmagick import BiometricPassportPhoto, FaceFeature
+from src.config import config
+from src.IdMaker.face_analysis import FaceAnalysis, _CropOnlyFacePhoto, _PrecomputedFacePhoto, analyze_face, detection_proxy
+
+def make_face_features(center_x, center_y, radius, angle):
+    """Linia podbródka i grzbiet nosa prostej, lekko obróconej twarzy"""
+    chin = [
+        (round(center_x + radius * math.cos(t + angle)), round(center_y + radius * math.sin(t + angle)))
+        for t in np.linspace(math.pi, 0, 17)
+    ]
+    nose_bridge = [
+        (round(center_x - k * math.sin(angle) * radius / 8), round(center_y + k * math.cos(angle) * radius / 8 - radius / 2))
+        for k in range(4)
+    ]
+    return {feature: chin if feature == FaceFeature.chin else nose_bridge for feature in FaceFeature}
+
+def test_detection_proxy_bounds_long_side():
+    image = Image.new("RGB", (6000, 4000))
+    proxy, scale = detection_proxy(image)
+
+    assert max(proxy.size) == 1600
+    assert scale == pytest.approx(6000 / 1600, rel=1e-3)
+
+def test_crop_from_region_matches_full_image_crop():
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 255, (3000, 4000, 3), dtype=np.uint8)).filter(ImageFilter.GaussianBlur(3))
+    features = make_face_features(2100, 1300, 300, 0.1)
+
+    full = _PrecomputedFacePhoto(
+        image, features,
+        forbid_abnormally_open_eyelid=False, forbid_closed_eye=False, forbid_oblique_face=False,
+        forbid_open_mouth=False, forbid_unevenly_open_eye=False
+    ).build_image(size=(768, 1004), horizontal_padding=0.25, vertical_padding=0.25)
+    region = FaceAnalysis(image=image, face_features=features, photo=object()).build_image((768, 1004), 0.25, 0.25)
+
+    # Różnice tylko z zaokrągleń próbkowania przy obrocie
+    diff = np.abs(np.asarray(full, dtype=int) - np.asarray(region, dtype=int))
+    assert diff.mean() < 1
+
+def test_landmarks_are_detected_once_per_image(monkeypatch, tmp_path):
+    """Wykrywanie cech twarzy działa raz na zdjęcie - oba warianty sprawdzeń i kadr używają nadpisanych hooków"""
+    monkeypatch.setattr(config, "FACE_PREFILTER", False)
+    path = str(tmp_path / "face.jpg")
+    Image.new("RGB", (800, 1000), (128, 128, 128)).save(path)
+    features = make_face_features(400, 500, 150, 0.05)
+    calls = {"detect": 0, "precomputed": 0, "crop_assert": 0}
+
+    def detect(image_array):
+        calls["detect"] += 1
+        return features
+
+    def precomputed(self, image_array):
+        calls["precomputed"] += 1
+        return self._face_features
+
+    def crop_assert(cls, face_features, **options):
+        calls["crop_assert"] += 1
+
+    monkeypatch.setattr(BiometricPassportPhoto, "_BiometricPassportPhoto__detect_face_features", staticmethod(detect))
+    monkeypatch.setattr(_PrecomputedFacePhoto, "_BiometricPassportPhoto__detect_face_features", precomputed)
+    monkeypatch.setattr(_CropOnlyFacePhoto, "_BiometricPassportPhoto__assert_front_full_face", classmethod(crop_assert))
+
+    analysis = analyze_face(path)
+    assert analysis.photo is not None
+    analysis.build_image((492, 633), 0.25, 0.25)
+
+    assert calls["detect"] == 1
+    # Ścisły i łagodny wariant (jeśli ścisły odrzucił zdjęcie) oraz kadr - bez ponownego wykrywania
+    assert calls["precomputed"] == (3 if analysis.error else 2)
+    assert calls["crop_assert"] == 1
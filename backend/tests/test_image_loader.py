@@ -0,0 +1,35 @@
+from PIL import Image
+from src.IdMaker.image_loader import load_image
+
+def save_photo(path, size, image_format, orientation=None):
+    image = Image.new("RGB", size, (200, 120, 80))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(path, image_format, exif=exif)
+
+def test_jpeg_is_decoded_at_reduced_scale(tmp_path):
+    path = str(tmp_path / "photo.jpg")
+    save_photo(path, (4000, 3000), "JPEG")
+    loaded = load_image(path, 900)
+
+    assert loaded.image.size == (1000, 750)
+    assert loaded.full_size == (4000, 3000)
+    assert loaded.scale == 4.0
+
+def test_png_is_decoded_at_full_size(tmp_path):
+    path = str(tmp_path / "photo.png")
+    save_photo(path, (1200, 800), "PNG")
+    loaded = load_image(path, 300)
+
+    assert loaded.image.size == (1200, 800)
+    assert loaded.scale == 1.0
+
+def test_exif_orientation_is_applied(tmp_path):
+    """Orientacja 6 (obrót o 90°) zamienia szerokość z wysokością"""
+    path = str(tmp_path / "photo.jpg")
+    save_photo(path, (4000, 3000), "JPEG", orientation=6)
+    loaded = load_image(path, 1600)
+
+    assert loaded.full_size == (3000, 4000)
+    assert loaded.image.size == (1500, 2000)
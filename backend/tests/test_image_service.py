@@ -0,0 +1,115 @@
+import io
+import os
+import threading
+from concurrent.futures import Future
+
+from flask import Flask
+
+from src.config import config
+from src.IdMaker.id_maker import id_maker
+from src.models.task import TaskStatus
+from src.services import image_service as image_service_module
+from src.services import process_worker
+from src.services.cancellation import cancellation
+from src.routes.batch import batch_bp
+from src.services.image_service import ImageProcessingService, image_service
+from src.services.file_service import file_service
+from src.services.result_cache import ResultCache, result_cache
+from src.services.task_service import task_service
+from src.utils.decorators import rate_limit_storage
+
+def test_full_queue_returns_retry_after_from_service_time(monkeypatch):
+    """Pełna kolejka odrzuca nowe joby z Retry-After = głębokość × czas przetwarzania / workery"""
+    monkeypatch.setattr(config, "MAX_QUEUE_DEPTH", 2)
+    service = ImageProcessingService(backend="thread", max_workers=2)
+    service.service_time = 3.0
+    futures = [service._track(Future()) for _ in range(3)]
+
+    # 2 joby w przetwarzaniu, 1 czeka
+    assert service.queue_depth() == 1
+    assert service.admission_retry_after() is None
+
+    futures.append(service._track(Future()))
+    assert service.queue_depth() == 2
+    assert service.admission_retry_after() == 3
+    assert service.get_queue_stats()["full"]
+
+    for future in futures:
+        future.set_result(None)
+    assert service.queue_depth() == 0 and service.in_flight == 0
+    service.shutdown()
+
+def test_batch_larger_than_free_queue_capacity_is_rejected(monkeypatch, tmp_path):
+    """Batch, który nie mieści się w wolnym miejscu kolejki, dostaje 503 z Retry-After przed zapisem plików"""
+    monkeypatch.setattr(config, "MAX_QUEUE_DEPTH", 2)
+    monkeypatch.setattr(config, "DATA_FOLDER", str(tmp_path))
+    rate_limit_storage.clear()
+    app = Flask(__name__)
+    app.register_blueprint(batch_bp, url_prefix='/api')
+
+    assert image_service.reserve(2) is None
+    assert image_service.reserve(1) is not None
+    image_service.release(2)
+
+    files = [(io.BytesIO(b"photo"), f"{index}.jpg") for index in range(3)]
+    response = app.test_client().post('/api/batch/upload', data={"files": files, "session_id": "session-1234567890"},
+                                      content_type='multipart/form-data')
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert not os.path.exists(os.path.join(config.upload_folder, "session-1234567890"))
+    assert image_service.reserved == 0
+
+def test_cancel_drops_queued_job_and_stops_running_at_checkpoint(monkeypatch):
+    """Anulowanie sesji usuwa czekający job, a trwający zatrzymuje w punkcie kontrolnym"""
+    service = ImageProcessingService(backend="thread", max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def fake_run_id_maker(filepath, output_folder, error_folder, params, task_id=None):
+        started.set()
+        release.wait(5)
+        processor = id_maker(filepath, error_folder, output_folder, params,
+                             cancel_token=cancellation.token(task_id))
+        processor.checkpoint("crop")
+        return {}
+
+    monkeypatch.setattr(process_worker, "run_id_maker", fake_run_id_maker)
+    monkeypatch.setattr(type(result_cache), "enabled", property(lambda _: False))
+    running = task_service.create_task("cancel-session", "a.jpg", "id_card")
+    queued = task_service.create_task("cancel-session", "b.jpg", "id_card")
+    running_future = service.process_image_async(running, "a.jpg", {})
+    queued_future = service.process_image_async(queued, "b.jpg", {})
+    assert started.wait(5)
+
+    assert service.cancel_session("cancel-session") == 2
+    assert queued_future.cancelled()
+    release.set()
+    running_future.result(5)
+
+    assert task_service.get_task(running.id).status == TaskStatus.CANCELLED
+    assert task_service.get_task(queued.id).status == TaskStatus.CANCELLED
+    stats = service.get_cancellation_stats()
+    assert (stats["queued"], stats["running"], stats["interrupted"]) == (1, 1, 1)
+    task_service.clear_session_tasks("cancel-session")
+    service.shutdown()
+
+def test_output_without_removed_background_is_not_cached(monkeypatch, tmp_path):
+    """Wynik, w którym rembg nie usunął tła (błąd przejściowy), nie trafia do cache - kolejny upload jest przetwarzany"""
+    monkeypatch.setattr(config, "DATA_FOLDER", str(tmp_path))
+    cache = ResultCache(max_entries=4, max_bytes=1024 * 1024, folder=str(tmp_path / "cache"))
+    monkeypatch.setattr(image_service_module, "result_cache", cache)
+    _, output_folder, _ = file_service.get_user_folders("cache-session")
+    with open(os.path.join(output_folder, "a.jpg"), "wb") as f:
+        f.write(b"photo")
+
+    for key, background_removed in (("failed", False), ("removed", True)):
+        task = task_service.create_task("cache-session", "a.jpg", "id_card")
+        result = {"biometric_info": "", "cropping_successful": True, "output_filename": "a.jpg",
+                  "background_removed": background_removed}
+        image_service._finish_task(task.id, task.session_id, result, cache_key=key)
+        assert task_service.get_task(task.id).status == TaskStatus.COMPLETED
+
+    assert cache.get("failed") is None
+    assert cache.get("removed").result["background_removed"]
+    task_service.clear_session_tasks("cache-session")
@@ -0,0 +1,37 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+from pymatting import estimate_alpha_cf
+from src.IdMaker.matting import band_matting_cutout, build_trimap
+
+def make_portrait(size=48):
+    """Mały obraz z miękką krawędzią i maską jak z U2Net"""
+    silhouette = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(silhouette).ellipse((size * 0.2, size * 0.1, size * 0.8, size * 0.9), fill=255)
+    alpha = np.asarray(silhouette.filter(ImageFilter.GaussianBlur(2)), dtype=np.float64) / 255.0
+    foreground = np.array([0.6, 0.3, 0.2])
+    background = np.array([0.2, 0.5, 0.8])
+    composite = alpha[..., None] * foreground + (1 - alpha[..., None]) * background
+    image = Image.fromarray((composite * 255).astype(np.uint8))
+    mask = Image.fromarray(((alpha > 0.5) * 255).astype(np.uint8))
+    return image, mask
+
+def test_band_matting_matches_full_frame_alpha():
+    image, mask = make_portrait()
+    result = band_matting_cutout(image, mask, 250, 5, 3)
+
+    trimap = build_trimap(np.asarray(mask), 250, 5, 3)
+    full_alpha = estimate_alpha_cf(np.asarray(image) / 255.0, trimap / 255.0)
+    band_alpha = np.asarray(result.cutout)[..., 3] / 255.0
+
+    assert result.band_pixels == int((trimap == 128).sum())
+    assert np.abs(band_alpha - full_alpha).max() < 0.01
+
+def test_band_matting_keeps_known_regions():
+    image, mask = make_portrait()
+    result = band_matting_cutout(image, mask, 250, 5, 3)
+    cutout = np.asarray(result.cutout)
+    trimap = build_trimap(np.asarray(mask), 250, 5, 3)
+
+    assert (cutout[..., 3][trimap == 255] == 255).all()
+    assert (cutout[..., 3][trimap == 0] == 0).all()
+    assert (cutout[..., :3][trimap == 255] == np.asarray(image)[trimap == 255]).all()
@@ -0,0 +1,38 @@
+import os
+import time
+
+from src.config import config
+from src.services.profiler import PipelineProfiler, MERGED_FILE
+
+
+def test_claim_limited_to_enabled_tasks(monkeypatch):
+    """Po enable(N) profilowanych jest dokładnie N kolejnych tasków"""
+    monkeypatch.setattr(config, "PROFILE_MIN_INTERVAL_SECONDS", 0)
+    profiler = PipelineProfiler()
+
+    assert profiler.claim() is False
+    profiler.enable(2)
+
+    assert [profiler.claim() for _ in range(3)] == [True, True, False]
+
+
+def test_profile_writes_task_and_merged_files(monkeypatch, tmp_path):
+    """Profil taska i wspólny plik collapsed trafiają do folderu profiles"""
+    monkeypatch.setattr(config, "DATA_FOLDER", str(tmp_path))
+    monkeypatch.setattr(config, "PROFILE_SAMPLE_INTERVAL_MS", 1)
+    profiler = PipelineProfiler()
+
+    def busy_stage():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+
+    with profiler.profile("task-1"):
+        busy_stage()
+
+    folder = config.profiles_folder
+    with open(os.path.join(folder, "task-1.collapsed")) as f:
+        lines = f.read().splitlines()
+    assert lines and any("busy_stage" in line for line in lines)
+    assert os.path.getsize(os.path.join(folder, MERGED_FILE)) > 0
+    assert profiler.get_status()["profiles"] == ["task-1.collapsed"]
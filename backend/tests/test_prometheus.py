@@ -0,0 +1,26 @@
+from src.models.task import Task, TaskStatus
+from src.services.prometheus import PrometheusMetrics
+
+def test_histograms_and_counters_render_in_text_format():
+    """Histogramy są kumulatywne z +Inf, a zakończony task aktualizuje liczniki statusu i kategorii"""
+    metrics = PrometheusMetrics()
+    for duration in (0.003, 0.2, 20.0):
+        metrics.request_latency.observe(duration, blueprint="status", route="/api/status/<task_id>",
+                                        method="GET", status=200)
+    task = Task(session_id="s", filename="a.jpg")
+    task.update_status(TaskStatus.PROCESSING)
+    task.stage_timings = {"background": {"wall_seconds": 1.2}}
+    task.update_status(TaskStatus.FAILED, biometric_errors=["Ostrzeżenie kontroli biometrycznej: Nie wykryto twarzy na zdjęciu"])
+    metrics.observe_finished_task(task, output_size=120_000)
+    text = metrics.render()
+
+    labels = 'blueprint="status",route="/api/status/<task_id>",method="GET",status="200"'
+    assert f'idmaker_http_request_duration_seconds_bucket{{{labels},le="0.005"}} 1' in text
+    assert f'idmaker_http_request_duration_seconds_bucket{{{labels},le="0.25"}} 2' in text
+    assert f'idmaker_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f'idmaker_http_request_duration_seconds_count{{{labels}}} 3' in text
+    assert 'idmaker_tasks_finished_total{status="failed"} 1' in text
+    assert 'idmaker_biometric_issues_total{kind="error",category="no_face"} 1' in text
+    assert 'idmaker_stage_duration_seconds_bucket{stage="background",le="2.5"} 1' in text
+    assert 'idmaker_output_file_bytes_count 1' in text
+    assert "# TYPE idmaker_tasks_finished_total counter" in text
@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from src.models.task import TaskStatus
+from src.services.job_queue import Job, RedisJobQueue
+from src.services.queue_worker import QueueWorker, list_workers
+from src.services.redis_client import redis_key
+from src.services.task_service import TaskService, task_service
+from src.services.task_store import RedisTaskStore
+
+def test_redis_store_is_shared_between_nodes():
+    """Dwa węzły API na wspólnym Redis widzą te same taski, a zmiana na jednym budzi long-poll na drugim"""
+    server = fakeredis.FakeServer()
+    node_a = TaskService(RedisTaskStore(fakeredis.FakeRedis(server=server)))
+    node_b = TaskService(RedisTaskStore(fakeredis.FakeRedis(server=server)))
+
+    changes = []
+    node_a.add_listener(lambda task_id, local: changes.append(local))
+    task = node_a.create_task("session-1234567890", "a.jpg", "id_card")
+    assert node_b.get_task(task.id).filename == "a.jpg"
+
+    timer = threading.Timer(0.1, node_b.update_task_status, (task.id, TaskStatus.PROCESSING))
+    timer.start()
+    started = time.monotonic()
+    updated = node_a.wait_for_task_change(task.id, task.version, 5)
+    timer.join()
+
+    assert updated.status == TaskStatus.PROCESSING
+    assert time.monotonic() - started < 5
+    assert node_a.get_tasks_stats()["processing"] == 1
+    # Zmiana z węzła B dociera do listenerów A jako nielokalna (bez metryk tego procesu)
+    while not changes and time.monotonic() - started < 5:
+        time.sleep(0.01)
+    assert changes == [False]
+
+    # Wersja sesji jest wspólna - long-poll z wersją z węzła A czeka na węźle B
+    version, _ = node_a.wait_for_session_change("session-1234567890", None, 0)
+    started = time.monotonic()
+    assert node_b.wait_for_session_change("session-1234567890", version, 0.2)[0] == version
+    assert time.monotonic() - started >= 0.2
+
+    assert node_a.clear_session_tasks("session-1234567890") == 1
+    assert node_b.get_task(task.id) is None
+    assert node_b.get_tasks_stats()["total"] == 0
+    node_a.close()
+    node_b.close()
+
+def test_concurrent_updates_from_two_nodes_do_not_get_lost():
+    """Zapis na podstawie nieaktualnego odczytu jest odrzucany, a liczniki statusów zostają spójne"""
+    server = fakeredis.FakeServer()
+    node_a = TaskService(RedisTaskStore(fakeredis.FakeRedis(server=server)))
+    node_b = TaskService(RedisTaskStore(fakeredis.FakeRedis(server=server)))
+    task = node_a.create_task("session-1234567890", "a.jpg", "id_card")
+
+    # Oba węzły przeczytały task w tej samej wersji
+    seen_by_a = node_a.store.get_task(task.id)
+    seen_by_b = node_b.store.get_task(task.id)
+    seen_by_a.update_status(TaskStatus.COMPLETED)
+    seen_by_b.update_status(TaskStatus.CANCELLED)
+    assert node_a.store.save_task(seen_by_a, TaskStatus.PENDING, task.version) is True
+    assert node_b.store.save_task(seen_by_b, TaskStatus.PENDING, task.version) is False
+
+    assert node_b.cancel_task(task.id) is None
+    assert node_b.get_task(task.id).status == TaskStatus.COMPLETED
+    stats = node_b.get_tasks_stats()
+    assert stats["completed"] == 1 and stats["pending"] == 0 and stats["cancelled"] == 0
+    node_a.close()
+    node_b.close()
+
+def test_removal_racing_with_status_change_keeps_counters_consistent(monkeypatch):
+    """Zmiana statusu między odczytem a usunięciem taska powoduje ponowną próbę - licznik zmniejsza właściwy status"""
+    server = fakeredis.FakeServer()
+    node_a = TaskService(RedisTaskStore(fakeredis.FakeRedis(server=server)))
+    node_b = TaskService(RedisTaskStore(fakeredis.FakeRedis(server=server)))
+    task = node_a.create_task("session-1234567890", "a.jpg", "id_card")
+    raced = []
+    pipeline = node_a.store.client.pipeline
+
+    def racing_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        mget = pipe.mget
+
+        def racing_mget(keys):
+            values = mget(keys)
+            if not raced:
+                # Węzeł B anuluje task, gdy węzeł A już go przeczytał (w statusie pending)
+                raced.append(node_b.cancel_task(task.id))
+            return values
+
+        pipe.mget = racing_mget
+        return pipe
+
+    monkeypatch.setattr(node_a.store.client, "pipeline", racing_pipeline)
+    assert node_a.clear_session_tasks("session-1234567890") == 1
+
+    assert raced == [TaskStatus.PENDING]
+    assert node_b.get_task(task.id) is None
+    assert all(count == 0 for count in node_b.get_tasks_stats().values())
+    node_a.close()
+    node_b.close()
+
+def test_job_stays_on_consumer_list_until_ack():
+    """Pobrany job jest na liście konsumenta do ack, więc nie ginie przy awarii konsumenta"""
+    client = fakeredis.FakeRedis()
+    queue = RedisJobQueue(client)
+    queue.push(Job(task_id="task-1", session_id="session-1234567890", filepath="/tmp/a.jpg", params={"res_x": 10}))
+    assert len(queue) == 1
+
+    job = queue.pop("worker-1", timeout=0.1)
+    assert job.task_id == "task-1" and job.params == {"res_x": 10}
+    assert len(queue) == 0
+    assert client.llen(queue.processing_key("worker-1")) == 1
+
+    queue.ack("worker-1", job)
+    assert client.llen(queue.processing_key("worker-1")) == 0
+    assert queue.pop("worker-1", timeout=0.1) is None
+
+def test_jobs_of_dead_worker_are_requeued():
+    """Joby workera, który przestał wysyłać heartbeat, wracają do kolejki dla innych workerów"""
+    queue = RedisJobQueue(fakeredis.FakeRedis())
+    dead = QueueWorker(handler=lambda job: None, concurrency=1, queue=queue)
+    dead.start()
+    dead.running = False
+    dead.stopped.set()
+    for thread in dead.consumers + [dead.heartbeat_thread]:
+        thread.join()
+
+    # Joby pobrane przez workera, który zaraz potem "umiera" bez ack; jeden task anulowano w międzyczasie
+    pending = task_service.create_task("session-1234567890", "a.jpg", "id_card")
+    cancelled = task_service.create_task("session-1234567890", "b.jpg", "id_card")
+    for task in (pending, cancelled):
+        queue.push(Job(task_id=task.id, session_id=task.session_id, filepath="/tmp/a.jpg", params={}))
+        assert queue.pop(dead.consumer_id(0), timeout=0.1).task_id == task.id
+        task_service.update_task_status(task.id, TaskStatus.PROCESSING)
+    task_service.cancel_task(cancelled.id)
+    queue.client.delete(redis_key("heartbeat", dead.worker_id))
+
+    alive = QueueWorker(handler=lambda job: None, concurrency=1, queue=queue)
+    assert alive.requeue_dead_workers() == 1
+    assert len(queue) == 1 and queue.pop("other", timeout=0.1).task_id == pending.id
+    assert task_service.get_task(pending.id).status == TaskStatus.PENDING
+    assert task_service.get_task(cancelled.id).status == TaskStatus.CANCELLED
+    assert [worker["id"] for worker in list_workers(queue.client)] == []
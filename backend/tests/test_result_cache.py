@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from src.services.result_cache import RedisResultCache, ResultCache
+
+def write(path, data: bytes):
+    path.write_bytes(data)
+    return str(path)
+
+def test_same_bytes_and_params_hit_the_cache(tmp_path):
+    cache = ResultCache(max_entries=4, max_bytes=1024 * 1024, folder=str(tmp_path / "cache"))
+    upload = write(tmp_path / "a.jpg", b"selfie")
+    output = write(tmp_path / "out.jpg", b"processed")
+    params = {"res_x": 768, "res_y": 1004}
+
+    key = cache.make_key(upload, params)
+    assert cache.get(key) is None
+    cache.put(key, {"biometric_info": "ok", "cropping_successful": True, "output_filename": "out.jpg"}, output)
+
+    again = write(tmp_path / "b.jpg", b"selfie")
+    entry = cache.get(cache.make_key(again, dict(params)))
+    assert entry is not None
+    assert entry.result == {"biometric_info": "ok", "cropping_successful": True}
+    assert cache.make_key(again, {"res_x": 492, "res_y": 633}) != key
+
+    target = str(tmp_path / "session_out.jpg")
+    assert cache.materialize(entry, target)
+    assert open(target, "rb").read() == b"processed"
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    """Limit rozmiaru wyrzuca najdawniej używany wpis"""
+    cache = ResultCache(max_entries=10, max_bytes=25, folder=str(tmp_path / "cache"))
+    for name in ("a", "b"):
+        cache.put(name, {"cropping_successful": True}, write(tmp_path / f"{name}.jpg", b"x" * 10))
+    cache.get("a")
+    cache.put("c", {"cropping_successful": True}, write(tmp_path / "c.jpg", b"x" * 10))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["size_bytes"] == 20
+
+def test_redis_index_is_shared_between_processes(tmp_path):
+    """Wynik zapisany przez worker jest trafieniem w procesie API, a limit obejmuje wpisy obu procesów"""
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    folder = str(tmp_path / "cache")
+    worker = RedisResultCache(max_entries=2, max_bytes=1024, folder=folder, client=fakeredis.FakeRedis(server=server))
+    api = RedisResultCache(max_entries=2, max_bytes=1024, folder=folder, client=fakeredis.FakeRedis(server=server))
+
+    worker.put("a", {"cropping_successful": True, "output_filename": "a.jpg"}, write(tmp_path / "a.jpg", b"a" * 10))
+    api.put("b", {"cropping_successful": True}, write(tmp_path / "b.jpg", b"b" * 10))
+    entry = api.get("a")
+    assert entry.result == {"cropping_successful": True}
+    assert open(entry.output_path, "rb").read() == b"a" * 10
+
+    worker.put("c", {"cropping_successful": True}, write(tmp_path / "c.jpg", b"c" * 10))
+    # "a" był użyty później niż "b" - wyrzucony jest "b", razem z plikiem
+    assert worker.get("b") is None
+    assert api.get("a") is not None
+    assert not os.path.exists(os.path.join(folder, "b.jpg"))
+    assert api.get_stats() == {
+        "entries": 2, "size_bytes": 20, "hits": 2, "misses": 1, "evictions": 1, "hit_ratio": 2 / 3
+    }
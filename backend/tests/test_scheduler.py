@@ -0,0 +1,24 @@
+import uuid
+
+from src.services.scheduler import FairScheduler, ScheduledJob, LANE_BULK, LANE_INTERACTIVE
+
+def _job(session_id, lane=LANE_BULK):
+    return ScheduledJob(task_id=str(uuid.uuid4()), session_id=session_id, lane=lane, submit=lambda: None)
+
+def test_sessions_round_robin_and_interactive_first():
+    """Sesje w linii obsługiwane po kolei, linia interactive przed bulk"""
+    scheduler = FairScheduler()
+    big = [_job("big") for _ in range(3)]
+    small = _job("small")
+    for job in big + [small]:
+        scheduler.push(job)
+    single = _job("other", LANE_INTERACTIVE)
+    scheduler.push(single)
+
+    order = [scheduler.pop() for _ in range(5)]
+    assert order == [single, big[0], small, big[1], big[2]]
+    assert scheduler.pop() is None and len(scheduler) == 0
+
+    stats = scheduler.get_stats()
+    assert stats[LANE_BULK]["dispatched"] == 4 and stats[LANE_INTERACTIVE]["dispatched"] == 1
+    assert stats[LANE_BULK]["wait_p95_seconds"] is not None
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.services.segmentation_server import SegmentationServer, RemoteSegmentationSession
+
+class FakeInnerSession:
+    """Udaje sesję onnxruntime z dynamicznym wymiarem batcha"""
+    def __init__(self, size=320):
+        self.batch_sizes = []
+        self.size = size
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input.1", shape=["batch_size", 3, self.size, self.size])]
+
+    def run(self, output_names, feeds):
+        tensor = feeds["input.1"]
+        self.batch_sizes.append(tensor.shape[0])
+        # Maska = kanał czerwony, żeby każdy klient mógł sprawdzić, że dostał swoją
+        return [tensor[:, :1, :, :]]
+
+def start_server(model_name="u2net", size=320, **kwargs):
+    socket_path = os.path.join(tempfile.mkdtemp(), "segmentation.sock")
+    inner = FakeInnerSession(size)
+    server = SegmentationServer(socket_path=socket_path, model_name=model_name, inner_session=inner, **kwargs)
+    server.start()
+    return server, inner
+
+def test_remote_session_returns_mask_of_input_size():
+    server, _ = start_server(batch_window_ms=1, max_batch=4)
+    try:
+        session = RemoteSegmentationSession(server.socket_path)
+        image = Image.new("RGB", (200, 260), (255, 0, 0))
+        image.paste((0, 0, 0), (0, 0, 100, 260))
+
+        [mask] = session.predict(image)
+        assert mask.size == (200, 260)
+        assert mask.mode == "L"
+        assert mask.getpixel((150, 130)) > 200
+        assert mask.getpixel((50, 130)) < 50
+        session.close()
+    finally:
+        server.stop()
+
+def test_concurrent_requests_are_batched():
+    server, inner = start_server(batch_window_ms=200, max_batch=8)
+    try:
+        barrier = threading.Barrier(6)
+        results = {}
+
+        def worker(i):
+            session = RemoteSegmentationSession(server.socket_path).connect()
+            barrier.wait()
+            # Czerwona lewa połowa dla parzystych, prawa dla nieparzystych
+            image = Image.new("RGB", (64, 64), (0, 0, 0))
+            image.paste((255, 0, 0), (32, 0, 64, 64) if i % 2 else (0, 0, 32, 64))
+            results[i] = session.predict(image)[0]
+            session.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert server.stats["requests"] == 6
+        assert server.stats["batches"] < 6
+        assert max(inner.batch_sizes) > 1
+        for i, mask in results.items():
+            left, right = np.asarray(mask)[:, :24].mean(), np.asarray(mask)[:, 40:].mean()
+            assert (right > left) if i % 2 else (left > right)
+    finally:
+        server.stop()
+
+def test_input_size_is_taken_from_the_model():
+    """Rozmiar wejścia pochodzi z modelu (isnet: 1024, tu 64) - klient skaluje obraz do rozmiaru podanego przez serwer"""
+    server, inner = start_server(model_name="isnet-general-use", size=64, batch_window_ms=1)
+    try:
+        session = RemoteSegmentationSession(server.socket_path)
+        [mask] = session.predict(Image.new("RGB", (100, 130), (255, 0, 0)))
+        assert session.input_size == (64, 64)
+        assert mask.size == (100, 130)
+        session.close()
+    finally:
+        server.stop()
+
+def test_unsupported_model_refuses_to_start():
+    """Model bez znanej normalizacji albo bez stałego rozmiaru wejścia nie startuje - bez cichego 320x320"""
+    with pytest.raises(ValueError):
+        start_server(model_name="u2net_cloth_seg")
+    with pytest.raises(ValueError):
+        start_server(size="height")
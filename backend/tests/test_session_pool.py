@@ -0,0 +1,39 @@
+import threading
+from src.services.session_pool import RembgSessionPool
+
+class FakeSessionPool(RembgSessionPool):
+    """Pula bez ładowania prawdziwego modelu"""
+    def _create_session(self):
+        return object()
+
+def test_preload_creates_sessions_once():
+    pool = FakeSessionPool(model_name="u2net", size=3)
+    assert pool.preload() == 3
+    assert pool.preload() == 3
+    assert pool.sessions.qsize() == 3
+
+def test_borrow_returns_session_to_pool():
+    pool = FakeSessionPool(model_name="u2net", size=1)
+    pool.preload()
+    with pool.borrow() as session:
+        assert session is not None
+        assert pool.sessions.qsize() == 0
+    assert pool.sessions.qsize() == 1
+    with pool.borrow() as second:
+        assert second is session
+
+def test_lazy_creation_is_bounded_by_size():
+    pool = FakeSessionPool(model_name="u2net", size=2)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    assert pool.created == 2
+
+    # Trzecie pobranie czeka na zwrot sesji
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(pool.acquire(timeout=5)))
+    waiter.start()
+    pool.release(first)
+    waiter.join()
+    assert result == [first]
+    assert pool.created == 2
@@ -0,0 +1,25 @@
+from src.IdMaker.stage_timing import measure_stage
+from src.models.task import Task, TaskStatus
+from src.services.stage_metrics import StageMetrics
+
+def test_stage_timings_are_stored_on_task_and_aggregated():
+    """Czasy etapów trafiają do taska (to_dict tylko z flagą, przeżywają zapis) i do percentyli"""
+    task = Task(session_id="s", filename="a.jpg")
+    task.update_status(TaskStatus.PROCESSING)
+    timings = {}
+    with measure_stage(timings, "crop"):
+        sum(range(10000))
+    task.stage_timings = timings
+    task.update_status(TaskStatus.COMPLETED)
+
+    assert task.queue_wait is not None and task.queue_wait >= 0
+    assert "stage_timings" not in task.to_dict()
+    restored = Task.from_dict(task.to_dict(include_timings=True))
+    assert restored.stage_timings == timings and restored.queue_wait == task.queue_wait
+
+    metrics = StageMetrics()
+    metrics.record(restored)
+    stats = metrics.get_stats()
+    assert stats["queue_wait_seconds"]["count"] == 1
+    assert stats["stages"]["crop"]["wall_seconds"]["p50"] == round(timings["crop"]["wall_seconds"], 3)
+    assert timings["crop"]["cpu_seconds"] >= 0
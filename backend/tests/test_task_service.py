@@ -0,0 +1,102 @@
+import threading
+import time
+from datetime import timedelta
+
+from src.models.task import TaskStatus
+from src.services.task_service import TaskService
+
+def test_batch_status_aggregates_tasks():
+    service = TaskService()
+    batch, tasks = service.create_batch("session-1234567890", ["a.jpg", "b.jpg", "c.jpg"], "passport")
+
+    service.update_task_status(tasks[0].id, TaskStatus.PROCESSING)
+    service.update_task_status(tasks[0].id, TaskStatus.COMPLETED, result_file="a.jpg")
+    service.update_task_status(tasks[1].id, TaskStatus.PROCESSING)
+    service.update_task_status(tasks[1].id, TaskStatus.FAILED, error_message="Nie wykryto twarzy")
+
+    status = service.get_batch_status(batch.id)
+    assert status["total"] == 3
+    assert status["done"] == 2
+    assert status["completed"] == 1
+    assert status["failed"] == 1
+    assert status["status"] == "processing"
+    assert status["eta_seconds"] is not None
+    assert all(task.batch_id == batch.id for task in service.get_batch_tasks(batch.id))
+
+def test_clearing_session_removes_batches():
+    service = TaskService()
+    batch, _ = service.create_batch("session-1234567890", ["a.jpg"], "id_card")
+
+    assert service.clear_session_tasks("session-1234567890") == 1
+    assert service.get_batch(batch.id) is None
+
+
+def test_wait_for_task_change_wakes_on_update():
+    """Long-poll wraca zaraz po zmianie statusu, a bez zmiany - dopiero po timeout"""
+    service = TaskService()
+    task = service.create_task("session-1234567890", "a.jpg", "id_card")
+
+    started = time.monotonic()
+    assert service.wait_for_task_change(task.id, task.version, 0.2).version == task.version
+    assert time.monotonic() - started >= 0.2
+
+    timer = threading.Timer(0.05, service.update_task_status, (task.id, TaskStatus.PROCESSING))
+    timer.start()
+    started = time.monotonic()
+    updated = service.wait_for_task_change(task.id, 0, 5)
+    timer.join()
+
+    assert updated.status == TaskStatus.PROCESSING
+    assert time.monotonic() - started < 5
+    assert not service.watchers
+
+def test_get_changed_tasks_filters_by_updated_at():
+    """Zbiorcze zapytanie zwraca tylko taski zmienione po podanym czasie i listę nieznanych ID"""
+    service = TaskService()
+    first = service.create_task("session-1234567890", "a.jpg", "id_card")
+    second = service.create_task("session-1234567890", "b.jpg", "id_card")
+    since = second.updated_at
+
+    time.sleep(0.01)
+    service.update_task_status(first.id, TaskStatus.PROCESSING)
+
+    changed, missing = service.get_changed_tasks({first.id: since, second.id: since, "unknown": None})
+    assert [task.id for task in changed] == [first.id]
+    assert missing == ["unknown"]
+
+    changed, _ = service.get_changed_tasks({second.id: None})
+    assert [task.id for task in changed] == [second.id]
+
+def test_indexes_follow_cleanup_and_status_changes():
+    """Indeks sesji, kolejka wygasania i liczniki statusów pozostają spójne z taskami"""
+    service = TaskService()
+    old = service.create_task("session-old", "a.jpg", "id_card")
+    old.created_at -= timedelta(hours=48)
+    service.store.task_expiry[0] = (old.created_at, old.id)
+    service.store.session_versions["session-old"] -= int(timedelta(hours=48).total_seconds() * 1e6)
+    cleared = service.create_task("session-cleared", "b.jpg", "id_card")
+    kept = service.create_task("session-kept", "c.jpg", "id_card")
+    service.update_task_status(kept.id, TaskStatus.PROCESSING)
+
+    assert service.clear_session_tasks("session-cleared") == 1
+    assert service.cleanup_old_tasks(hours=24) == 1
+
+    assert service.get_task(old.id) is None and service.get_task(cleared.id) is None
+    assert service.get_session_tasks("session-kept") == [kept]
+    assert service.get_session_tasks("session-old") == []
+    assert service.get_tasks_stats() == {"total": 1, "pending": 0, "processing": 1, "completed": 0, "failed": 0, "cancelled": 0}
+    assert list(service.store.session_tasks) == ["session-kept"]
+    assert list(service.store.session_versions) == ["session-kept"]
+
+def test_finished_task_is_not_overwritten():
+    """Anulowany task nie wraca do innego statusu (np. wynik workera zapisany po anulowaniu)"""
+    service = TaskService()
+    task = service.create_task("session-1234567890", "a.jpg", "id_card")
+    service.update_task_status(task.id, TaskStatus.PROCESSING)
+
+    assert service.cancel_task(task.id) == TaskStatus.PROCESSING
+    assert service.update_task_status(task.id, TaskStatus.COMPLETED, result_file="a.jpg") is False
+    assert service.update_task_status(task.id, TaskStatus.PENDING) is False
+
+    assert service.get_task(task.id).status == TaskStatus.CANCELLED
+    assert service.get_tasks_stats()["cancelled"] == 1
@@ -0,0 +1,96 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from src.models.task import TaskStatus
+from src.services.task_service import TaskService
+from src.services.task_store import SQLiteTaskStore
+
+def test_sqlite_store_survives_restart(tmp_path):
+    """Taski i batche zapisane w SQLite są widoczne po ponownym otwarciu magazynu"""
+    path = str(tmp_path / "tasks.db")
+    service = TaskService(SQLiteTaskStore(path, flush_interval=0.01))
+    batch, tasks = service.create_batch("session-1234567890", ["a.jpg", "b.jpg"], "passport")
+    service.update_task_status(tasks[0].id, TaskStatus.PROCESSING)
+    service.update_task_status(tasks[0].id, TaskStatus.COMPLETED, result_file="a.jpg")
+
+    # Zakończenie jest w bazie od razu, bez czekania na flush
+    assert service.get_task(tasks[0].id).result_file == "a.jpg"
+    service.close()
+
+    restarted = TaskService(SQLiteTaskStore(path))
+    task = restarted.get_task(tasks[0].id)
+    assert task.status == TaskStatus.COMPLETED
+    assert task.version == 2
+    assert [t.id for t in restarted.get_batch_tasks(batch.id)] == [t.id for t in tasks]
+    assert restarted.get_tasks_stats()["completed"] == 1
+
+    assert restarted.clear_session_tasks("session-1234567890") == 2
+    assert restarted.get_batch(batch.id) is None
+    restarted.close()
+
+def test_sqlite_store_removes_expired_tasks(tmp_path):
+    """Sprzątanie usuwa taski utworzone przed granicą, a zostawia nowsze"""
+    store = SQLiteTaskStore(str(tmp_path / "tasks.db"), flush_interval=60)
+    service = TaskService(store)
+    old = service.create_task("session-1234567890", "a.jpg", "id_card")
+    new = service.create_task("session-1234567890", "b.jpg", "id_card")
+    old.created_at -= timedelta(hours=48)
+    store.add_tasks([old])
+
+    assert store.remove_expired(datetime.now() - timedelta(hours=24)) == [old.id]
+    store.flush()
+    assert [task.id for task in service.get_session_tasks("session-1234567890")] == [new.id]
+    service.close()
+
+def test_sqlite_session_version_is_shared_between_processes(tmp_path):
+    """Nowy task i wersja sesji trafiają do bazy od razu - inny proces widzi je bez czekania na flush"""
+    path = str(tmp_path / "tasks.db")
+    first = TaskService(SQLiteTaskStore(path, flush_interval=60))
+    second = TaskService(SQLiteTaskStore(path, flush_interval=60))
+    task = first.create_task("session-1234567890", "a.jpg", "id_card")
+    assert second.get_task(task.id) is not None
+
+    version, _ = first.wait_for_session_change("session-1234567890", None, 0)
+    assert second.store.get_session_version("session-1234567890") == version
+
+    first.clear_session_tasks("session-1234567890")
+    assert second.store.get_session_version("session-1234567890") == 0
+    first.close()
+    second.close()
+
+def test_sqlite_finished_task_is_not_overwritten_by_another_process(tmp_path):
+    """Zapis zakończenia jest warunkowy - proces z nieaktualnym stanem nie nadpisuje anulowania"""
+    path = str(tmp_path / "tasks.db")
+    worker = TaskService(SQLiteTaskStore(path, flush_interval=60))
+    api = TaskService(SQLiteTaskStore(path, flush_interval=60))
+    task = worker.create_task("session-1234567890", "a.jpg", "id_card")
+    # PROCESSING czeka w buforze workera - API widzi jeszcze PENDING
+    worker.update_task_status(task.id, TaskStatus.PROCESSING)
+
+    assert api.cancel_task(task.id) == TaskStatus.PENDING
+    assert not worker.update_task_status(task.id, TaskStatus.COMPLETED, result_file="a.jpg")
+    # Flush zmiany pośredniej też nie przywraca PROCESSING
+    worker.store.flush()
+    assert worker.get_task(task.id).status == TaskStatus.CANCELLED
+    assert api.get_task(task.id).status == TaskStatus.CANCELLED
+    worker.close()
+    api.close()
+
+def test_sqlite_long_poll_sees_changes_from_another_process(tmp_path):
+    """Long-poll sprawdza bazę co poll_interval - budzi go także zmiana zrobiona w innym procesie"""
+    path = str(tmp_path / "tasks.db")
+    worker = TaskService(SQLiteTaskStore(path, flush_interval=60))
+    api = TaskService(SQLiteTaskStore(path, flush_interval=60, poll_interval=0.01))
+    task = worker.create_task("session-1234567890", "a.jpg", "id_card")
+
+    timer = threading.Timer(0.1, worker.update_task_status, (task.id, TaskStatus.FAILED))
+    timer.start()
+    started = time.monotonic()
+    changed = api.wait_for_task_change(task.id, task.version, 10)
+    timer.join()
+
+    assert changed.status == TaskStatus.FAILED
+    assert time.monotonic() - started < 5
+    worker.close()
+    api.close()
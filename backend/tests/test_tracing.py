@@ -0,0 +1,34 @@
+import json
+
+from src.IdMaker.stage_timing import measure_stage
+from src.models.task import Task, TaskStatus
+from src.services.tracing import Tracer, new_trace_id, new_span_id, parse_traceparent
+
+def test_finished_task_exports_linked_otlp_spans(tmp_path):
+    """Zakończony task zapisuje spany task/queue_wait/process_image/etapy w jednym trace (OTLP JSON)"""
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(path=str(path), enabled=True)
+    trace_id, request_span_id = new_trace_id(), new_span_id()
+    task = Task(session_id="s", filename="a.jpg", trace_id=trace_id, trace_parent_id=request_span_id)
+    task.update_status(TaskStatus.PROCESSING)
+    task.stage_timings = {}
+    with measure_stage(task.stage_timings, "crop"):
+        pass
+    task.update_status(TaskStatus.COMPLETED)
+
+    tracer.trace_task(task)
+    with tracer.span("save_uploaded_file", trace_id, request_span_id):
+        pass
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    spans = {span["name"]: span
+             for line in lines
+             for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+    assert set(spans) == {"task", "queue_wait", "process_image", "id_maker.crop", "save_uploaded_file"}
+    assert all(span["traceId"] == trace_id for span in spans.values())
+    assert spans["task"]["parentSpanId"] == request_span_id
+    assert spans["process_image"]["parentSpanId"] == spans["task"]["spanId"]
+    assert spans["id_maker.crop"]["parentSpanId"] == spans["process_image"]["spanId"]
+    assert int(spans["id_maker.crop"]["endTimeUnixNano"]) >= int(spans["id_maker.crop"]["startTimeUnixNano"])
+    assert parse_traceparent(f"00-{trace_id}-{request_span_id}-01") == (trace_id, request_span_id)
@@ -0,0 +1,72 @@
+import io
+import zipfile
+
+import pytest
+
+from src.utils.zip_stream import ZipStreamError, iter_zip_entries
+
+class UnseekableStream(io.RawIOBase):
+    """Strumień jak request.stream - bez seek, krótkie odczyty"""
+    def __init__(self, data: bytes):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self.data.read(min(size, 777) if size and size > 0 else size)
+
+def make_archive(files: dict, compression=zipfile.ZIP_DEFLATED) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        archive.writestr("photos/", b"")
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def test_entries_are_read_sequentially_without_seek():
+    files = {"photos/a.jpg": b"a" * 5000, "photos/b.png": bytes(range(256)) * 40}
+    for compression in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+        entries = list(iter_zip_entries(UnseekableStream(make_archive(files, compression)), 1024 * 1024))
+
+        assert [entry.name for entry in entries] == list(files)
+        assert all(entry.file.read() == files[entry.name] for entry in entries)
+
+def test_too_large_entry_is_rejected_and_next_entries_are_read():
+    files = {"big.jpg": b"x" * 10000, "small.jpg": b"y" * 10}
+    entries = list(iter_zip_entries(UnseekableStream(make_archive(files)), 1000))
+
+    assert entries[0].file is None and entries[0].error
+    assert entries[1].file.read() == b"y" * 10
+
+def test_too_large_entry_without_size_aborts_archive():
+    """Wpis z data descriptor (bez rozmiaru w nagłówku) nie jest rozpakowywany do końca - archiwum jest przerywane"""
+    class Sink(io.RawIOBase):
+        def __init__(self):
+            self.data = b""
+
+        def writable(self):
+            return True
+
+        def write(self, data):
+            self.data += bytes(data)
+            return len(data)
+
+    sink = Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("bomb.jpg", "w") as entry:
+            entry.write(b"\0" * 1_000_000)
+        archive.writestr("small.jpg", b"y" * 10)
+
+    with pytest.raises(ZipStreamError):
+        list(iter_zip_entries(UnseekableStream(sink.data), 1000))
+
+def test_skipped_entries_are_listed_without_data():
+    """Po skip() == True wpisy są zwracane tylko z nazwą (np. gdy kolejka przetwarzania jest pełna)"""
+    files = {"a.jpg": b"a" * 5000, "b.jpg": b"b" * 5000}
+    seen = []
+    for entry in iter_zip_entries(UnseekableStream(make_archive(files)), 1024 * 1024, skip=lambda: bool(seen)):
+        seen.append(entry)
+
+    assert seen[0].file.read() == files["a.jpg"] and not seen[0].skipped
+    assert seen[1].name == "b.jpg" and seen[1].skipped and seen[1].file is None
@@ -6,7 +6,7 @@ import Message from "./components/Message";
 import DocumentTypeSelector from "./components/DocumentTypeSelector";
 import PrivacyPage from "./components/PrivacyPage";
 import AboutPage from "./components/AboutPage";
-import { clearSession, pollStatus } from "./utils/api";
+import { clearSession, watchStatus } from "./utils/api";
 
 function App() {
   const [currentPage, setCurrentPage] = useState("main");
@@ -30,34 +30,35 @@ function App() {
   };
 
   const startPolling = (taskId, sessionId) => {
-    const interval = setInterval(() => {
-      pollStatus(taskId).then((data) => {
-        if (data.status === "completed") {
-          clearInterval(interval);
-          setUploadResponse("Przetwarzanie zakończone pomyślnie!");
-          // Use the full URL provided by backend
-          if (data.cropped_file_url) {
-            setCroppedUrl(constructUrl(BACKEND_URL, data.cropped_file_url));
-          }
-
-          // Handle biometric information
-          if (data.biometric_warnings && data.biometric_warnings.length > 0) {
-            setBiometricWarnings(data.biometric_warnings);
-          }
-          if (data.biometric_errors && data.biometric_errors.length > 0) {
-            setBiometricErrors(data.biometric_errors);
-          }
-        } else if (data.status === "failed") {
-          clearInterval(interval);
-          setUploadResponse(`Błąd: ${data.error_message || "Wystąpił błąd podczas przetwarzania"}`);
-
-          // Handle biometric errors in failed status
-          if (data.biometric_errors && data.biometric_errors.length > 0) {
-            setBiometricErrors(data.biometric_errors);
-          }
+    const stop = watchStatus(taskId, (data) => {
+      if (data.status === "completed") {
+        stop();
+        setUploadResponse("Przetwarzanie zakończone pomyślnie!");
+        // Use the full URL provided by backend
+        if (data.cropped_file_url) {
+          setCroppedUrl(constructUrl(BACKEND_URL, data.cropped_file_url));
         }
-      });
-    }, 1000);
+
+        // Handle biometric information
+        if (data.biometric_warnings && data.biometric_warnings.length > 0) {
+          setBiometricWarnings(data.biometric_warnings);
+        }
+        if (data.biometric_errors && data.biometric_errors.length > 0) {
+          setBiometricErrors(data.biometric_errors);
+        }
+      } else if (data.status === "failed") {
+        stop();
+        setUploadResponse(`Błąd: ${data.error_message || "Wystąpił błąd podczas przetwarzania"}`);
+
+        // Handle biometric errors in failed status
+        if (data.biometric_errors && data.biometric_errors.length > 0) {
+          setBiometricErrors(data.biometric_errors);
+        }
+      } else if (data.status === "cancelled") {
+        stop();
+        setUploadResponse("Przetwarzanie anulowane");
+      }
+    });
   };
 
   const handleUpload = (data, formData) => {
@@ -9,5 +9,52 @@ export const uploadFile = (formData) =>
 export const pollStatus = (taskId) =>
   fetch(`${BACKEND_URL}/api/status/${taskId}`).then((res) => res.json());
 
+const isFinished = (data) => ["completed", "failed", "cancelled"].includes(data.status);
+
+// Long-poll: backend odpowiada dopiero po zmianie wersji taska (albo po `wait` sekundach)
+const longPollStatus = (taskId, version, wait = 25) =>
+  fetch(`${BACKEND_URL}/api/status/${taskId}?wait=${wait}&version=${version ?? ""}`).then((res) => res.json());
+
+// Obserwuje status taska przez SSE, a bez EventSource lub po zerwaniu strumienia - przez long-poll.
+// onStatus dostaje każdy nowy status; zwraca funkcję zatrzymującą obserwację.
+export const watchStatus = (taskId, onStatus) => {
+  let stopped = false;
+  let source = null;
+
+  const poll = (version) => {
+    if (stopped) return;
+    longPollStatus(taskId, version)
+      .then((data) => {
+        if (stopped) return;
+        if (data.version !== version) onStatus(data);
+        if (!isFinished(data) && data.status !== "error") poll(data.version);
+      })
+      .catch(() => setTimeout(() => poll(version), 1000));
+  };
+
+  if (typeof EventSource === "undefined") {
+    poll(undefined);
+  } else {
+    let version;
+    source = new EventSource(`${BACKEND_URL}/api/status/${taskId}/stream`);
+    source.addEventListener("status", (event) => {
+      const data = JSON.parse(event.data);
+      version = data.version;
+      onStatus(data);
+      if (isFinished(data)) source.close();
+    });
+    source.onerror = () => {
+      // Strumień zamknięty przez serwer (limit czasu) lub błąd sieci - dalej przez long-poll
+      source.close();
+      poll(version);
+    };
+  }
+
+  return () => {
+    stopped = true;
+    if (source) source.close();
+  };
+};
+
 export const clearSession = (sessionId) =>
   navigator.sendBeacon(`${BACKEND_URL}/api/clear`, JSON.stringify({ session_id: sessionId }));